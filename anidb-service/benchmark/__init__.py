@@ -0,0 +1,8 @@
+"""Load benchmarks for anidb-service.
+
+- corpus: reproducible synthetic AniDB documents (tags, relations, titles, mature titles)
+- stub_anidb: a local stand-in for the AniDB HTTP API serving that corpus
+- driver: runs the service against both and reports latency percentiles as JSON
+
+Run ``python -m benchmark --help`` from the anidb-service directory.
+"""
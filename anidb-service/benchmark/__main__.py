@@ -0,0 +1,113 @@
+"""Command line entry point: ``python -m benchmark {run,corpus,stub,compare}``."""
+
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+from benchmark.corpus import Corpus, CorpusConfig
+from benchmark.driver import BenchmarkConfig, compare, format_comparison, run_benchmark
+from benchmark.stub_anidb import create_stub_app
+
+
+def corpus_config(args: argparse.Namespace) -> CorpusConfig:
+    """Build the corpus settings from the shared command line options."""
+    return CorpusConfig(
+        size=args.size,
+        first_aid=args.first_aid,
+        tag_vocabulary=args.tag_vocabulary,
+        tags_per_anime=args.tags_per_anime,
+        tag_skew=args.tag_skew,
+        franchise_ratio=args.franchise_ratio,
+        mean_franchise_size=args.mean_franchise_size,
+        mature_ratio=args.mature_ratio,
+        seed=args.seed,
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Define the sub-commands and their options."""
+    defaults = CorpusConfig()
+    corpus_options = argparse.ArgumentParser(add_help=False)
+    group = corpus_options.add_argument_group("corpus")
+    group.add_argument("--size", type=int, default=defaults.size, help="documents")
+    group.add_argument("--first-aid", type=int, default=defaults.first_aid)
+    group.add_argument("--tag-vocabulary", type=int, default=defaults.tag_vocabulary)
+    group.add_argument("--tags-per-anime", type=float, default=defaults.tags_per_anime)
+    group.add_argument("--tag-skew", type=float, default=defaults.tag_skew, help="Zipf exponent")
+    group.add_argument("--franchise-ratio", type=float, default=defaults.franchise_ratio)
+    group.add_argument("--mean-franchise-size", type=float, default=defaults.mean_franchise_size)
+    group.add_argument("--mature-ratio", type=float, default=defaults.mature_ratio)
+    group.add_argument("--seed", type=int, default=defaults.seed)
+
+    parser = argparse.ArgumentParser(prog="python -m benchmark", description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    bench = BenchmarkConfig()
+    run = commands.add_parser("run", parents=[corpus_options], help="run the load benchmark")
+    run.add_argument("--requests", type=int, default=bench.requests, help="per scenario")
+    run.add_argument("--concurrency", type=int, default=bench.concurrency)
+    run.add_argument("--workers", type=int, default=bench.index_workers, help="indexer processes")
+    run.add_argument("--throttle", type=float, default=bench.throttle_seconds, help="seconds")
+    run.add_argument("--stub-latency", type=float, default=bench.stub_latency, help="seconds")
+    run.add_argument("--stale-ratio", type=float, default=bench.stale_ratio)
+    run.add_argument("--url", help="benchmark a running service instead of an in-process one")
+    run.add_argument("--workdir", type=Path, help="keep the scratch data and database here")
+    run.add_argument("--output", type=Path, help="write the JSON results here")
+
+    write = commands.add_parser("corpus", parents=[corpus_options], help="write the corpus")
+    write.add_argument("output", type=Path, help="directory")
+    write.add_argument("--zip", action="store_true", help="write anidb-seed.zip instead of files")
+
+    stub = commands.add_parser("stub", parents=[corpus_options], help="serve the AniDB stub")
+    stub.add_argument("--host", default="127.0.0.1")
+    stub.add_argument("--port", type=int, default=9001)
+    stub.add_argument("--latency", type=float, default=0.0, help="seconds per response")
+
+    diff = commands.add_parser("compare", help="compare two result files")
+    diff.add_argument("old", type=Path)
+    diff.add_argument("new", type=Path)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run a sub-command; returns the exit status."""
+    args = build_parser().parse_args(argv)
+
+    if args.command == "run":
+        config = BenchmarkConfig(
+            corpus=corpus_config(args),
+            requests=args.requests,
+            concurrency=args.concurrency,
+            index_workers=args.workers,
+            throttle_seconds=args.throttle,
+            stub_latency=args.stub_latency,
+            stale_ratio=args.stale_ratio,
+            url=args.url,
+        )
+        results = asyncio.run(run_benchmark(config, args.workdir))
+        document = json.dumps(results, indent=2)
+        if args.output:
+            args.output.write_text(document + "\n", encoding="utf-8")
+            print(f"💾 Results written to {args.output}")
+        else:
+            print(document)
+    elif args.command == "corpus":
+        path = Corpus(corpus_config(args)).write(args.output, as_zip=args.zip)
+        print(f"📦 Wrote {args.size} documents to {path}")
+    elif args.command == "stub":
+        import uvicorn
+
+        app = create_stub_app(Corpus(corpus_config(args)), args.latency)
+        uvicorn.run(app, host=args.host, port=args.port)
+    else:
+        old = json.loads(args.old.read_text(encoding="utf-8"))
+        new = json.loads(args.new.read_text(encoding="utf-8"))
+        print(format_comparison(compare(old, new)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
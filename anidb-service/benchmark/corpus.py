@@ -0,0 +1,185 @@
+"""Reproducible synthetic AniDB corpus.
+
+Every document is derived from (seed, aid) alone, so the stub AniDB endpoint can
+serve exactly the files written to disk without storing them. Tag popularity
+follows a Zipf distribution and titles are grouped into franchises linked by
+Sequel/Prequel chains with the odd side story, like the real catalogue.
+"""
+
+import random
+import zipfile
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+from xml.sax.saxutils import escape, quoteattr
+
+SYLLABLES = (
+    "ka", "ki", "ku", "ke", "ko", "sa", "shi", "su", "se", "so", "ta", "chi", "tsu",
+    "te", "to", "na", "ni", "nu", "ne", "no", "ha", "hi", "fu", "he", "ho", "ma", "mi",
+    "mu", "me", "mo", "ya", "yu", "yo", "ra", "ri", "ru", "re", "ro", "wa", "n",
+)  # fmt: skip
+WORDS = (
+    "sword", "star", "school", "dragon", "ghost", "steel", "moon", "summer", "shadow",
+    "sky", "heart", "machine", "forest", "city", "night", "spirit", "ocean", "garden",
+    "knight", "witch", "robot", "idol", "detective", "winter", "flame", "crystal",
+)  # fmt: skip
+TAG_STEMS = (
+    "action", "comedy", "drama", "romance", "fantasy", "science fiction", "mecha",
+    "school life", "sports", "music", "mystery", "horror", "slice of life", "space",
+    "magic", "military", "historical", "supernatural", "psychological", "adventure",
+)  # fmt: skip
+TYPES = ("TV Series", "TV Series", "TV Series", "OVA", "Movie", "Web", "TV Special")
+MATURE_TAG = "18 restricted"
+
+
+@dataclass
+class CorpusConfig:
+    """Shape of the synthetic corpus."""
+
+    size: int = 2000
+    first_aid: int = 1
+    tag_vocabulary: int = 400  # distinct tags
+    tags_per_anime: float = 12.0  # mean tags per document
+    tag_skew: float = 1.1  # Zipf exponent of tag popularity
+    franchise_ratio: float = 0.35  # share of titles starting a multi-title franchise
+    mean_franchise_size: float = 3.0
+    mature_ratio: float = 0.03
+    airing_ratio: float = 0.05
+    seed: int = 42
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the settings for the results file."""
+        return asdict(self)
+
+
+class Corpus:
+    """Deterministic synthetic AniDB documents for a range of AIDs."""
+
+    def __init__(self, config: CorpusConfig):
+        self.config = config
+        self.aids = range(config.first_aid, config.first_aid + config.size)
+        self.tag_names = [self._tag_name(i) for i in range(config.tag_vocabulary)]
+        self._tag_weights = [
+            1 / (rank + 1) ** config.tag_skew for rank in range(len(self.tag_names))
+        ]
+        self.relations = self._plan_franchises()
+
+    def _tag_name(self, index: int) -> str:
+        stem = TAG_STEMS[index % len(TAG_STEMS)]
+        round_ = index // len(TAG_STEMS)
+        return stem if round_ == 0 else f"{stem} {WORDS[round_ % len(WORDS)]} {round_}"
+
+    def _plan_franchises(self) -> Dict[int, List[Tuple[int, str]]]:
+        """Link runs of consecutive AIDs into franchises; returns aid -> [(related_aid, type)]."""
+        rng = random.Random(f"{self.config.seed}:franchises")
+        relations: Dict[int, List[Tuple[int, str]]] = {aid: [] for aid in self.aids}
+        aids = list(self.aids)
+        i = 0
+        while i < len(aids):
+            size = 1
+            if rng.random() < self.config.franchise_ratio:
+                size = 2 + int(rng.expovariate(1 / max(self.config.mean_franchise_size - 2, 0.1)))
+            members = aids[i : i + size]
+            for prev, nxt in zip(members, members[1:]):
+                relations[prev].append((nxt, "Sequel"))
+                relations[nxt].append((prev, "Prequel"))
+            if len(members) > 2 and rng.random() < 0.3:
+                side = members[-1]
+                relations[members[0]].append((side, "Side Story"))
+                relations[side].append((members[0], "Parent Story"))
+            i += size
+        return relations
+
+    def tag_ids(self, count: int) -> List[int]:
+        """Most popular tag ids first (ids are 1-based positions in tag_names)."""
+        return list(range(1, min(count, len(self.tag_names)) + 1))
+
+    def document(self, aid: int) -> str:
+        """Return the AniDB XML document of an AID (AIDs outside the corpus have no relations)."""
+        config = self.config
+        rng = random.Random(f"{config.seed}:{aid}")
+        main_title = " ".join(
+            "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+            for _ in range(rng.randint(1, 3))
+        )
+        english = " ".join(rng.choice(WORDS).capitalize() for _ in range(rng.randint(1, 3)))
+        titles = [
+            ("x-jat", "main", main_title),
+            ("en", "official", english),
+            ("ja", "official", f"{main_title}（{aid}）"),
+        ]
+        titles += [("en", "synonym", f"{english} {n + 2}") for n in range(rng.randint(0, 2))]
+
+        year = rng.randint(1980, 2026)
+        start = f"{year}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        end = "" if rng.random() < config.airing_ratio else f"{year + rng.randint(0, 1)}-12-20"
+
+        count = max(1, min(len(self.tag_names), int(rng.gauss(config.tags_per_anime, 4))))
+        chosen = set()
+        while len(chosen) < count:
+            chosen.update(rng.choices(range(len(self.tag_names)), self._tag_weights, k=count))
+        tags = [
+            (index + 1, self.tag_names[index], rng.choice(range(0, 700, 100)))
+            for index in sorted(chosen)[:count]
+        ]
+        if rng.random() < config.mature_ratio:
+            tags.append((len(self.tag_names) + 1, MATURE_TAG, 600))
+
+        lines = [
+            f'<anime id="{aid}" restricted="{"true" if tags[-1][1] == MATURE_TAG else "false"}">'
+        ]
+        lines.append(f"<type>{rng.choice(TYPES)}</type>")
+        lines.append(f"<episodecount>{rng.choice((1, 12, 13, 24, 26, 50))}</episodecount>")
+        lines.append(f"<startdate>{start}</startdate>")
+        if end:
+            lines.append(f"<enddate>{end}</enddate>")
+        lines.append("<titles>")
+        lines += [
+            f'<title xml:lang="{lang}" type="{kind}">{escape(title)}</title>'
+            for lang, kind, title in titles
+        ]
+        lines.append("</titles>")
+        related = self.relations.get(aid, [])
+        if related:
+            lines.append("<relatedanime>")
+            lines += [
+                f"<anime id={quoteattr(str(rid))} type={quoteattr(kind)}>Related {rid}</anime>"
+                for rid, kind in related
+            ]
+            lines.append("</relatedanime>")
+        lines.append(
+            f'<ratings><permanent count="{rng.randint(10, 20000)}">{rng.uniform(3, 9.5):.2f}'
+            f'</permanent><temporary count="{rng.randint(10, 20000)}">{rng.uniform(3, 9.5):.2f}'
+            "</temporary></ratings>"
+        )
+        lines.append("<tags>")
+        lines += [
+            f'<tag id="{tag_id}" weight="{weight}"><name>{escape(name)}</name>'
+            f"<description>Synthetic tag {tag_id}.</description></tag>"
+            for tag_id, name, weight in tags
+        ]
+        lines.append("</tags>")
+        lines.append(f"<description>{escape(' '.join(rng.choices(WORDS, k=60)))}.</description>")
+        lines.append("</anime>")
+        return "\n".join(lines)
+
+    def documents(self) -> Iterator[Tuple[int, str]]:
+        """Yield (aid, document) for every AID of the corpus."""
+        for aid in self.aids:
+            yield aid, self.document(aid)
+
+    def write(self, directory: Path, as_zip: bool = False) -> Path:
+        """Write the corpus as seed files (AnimeDoc_{aid}.xml), optionally zipped.
+
+        Returns the directory, or the zip file (``directory/anidb-seed.zip``).
+        """
+        directory.mkdir(parents=True, exist_ok=True)
+        if as_zip:
+            zip_path = directory / "anidb-seed.zip"
+            with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
+                for aid, document in self.documents():
+                    zf.writestr(f"AnimeDoc_{aid}.xml", document)
+            return zip_path
+        for aid, document in self.documents():
+            (directory / f"AnimeDoc_{aid}.xml").write_text(document, encoding="utf-8")
+        return directory
@@ -0,0 +1,321 @@
+"""Async load driver.
+
+Each scenario sends a fixed list of requests through a number of concurrent
+clients and records per-request latency, status codes and the X-Cache outcome.
+By default the service runs in-process: the synthetic corpus is written as seed
+files and timed through bulk_index, then the app's lifespan is started against
+a scratch directory with the AniDB client pointed at the stub, and requests go
+through httpx's ASGI transport. With ``url`` an already running service is
+driven over HTTP instead (seed indexing and the stale scenario need the
+database and are skipped).
+"""
+
+import asyncio
+import math
+import platform
+import random
+import tempfile
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+from benchmark.corpus import Corpus, CorpusConfig
+from benchmark.stub_anidb import create_stub_app
+from indexer import INDEX_WORKERS, bulk_index
+
+SERVICE_URL = "http://anidb-service"
+STUB_URL = "http://anidb-stub/httpapi"  # only reachable through the stub's ASGI transport
+COMPARED_METRICS = ("p50", "p95", "p99", "throughput_rps")
+
+
+@dataclass
+class BenchmarkConfig:
+    """What to run and how hard."""
+
+    corpus: CorpusConfig = field(default_factory=CorpusConfig)
+    requests: int = 500  # per scenario
+    concurrency: int = 16
+    index_workers: int = INDEX_WORKERS  # bulk_index parser processes
+    throttle_seconds: float = 4.0  # worker throttle between stub fetches
+    stub_latency: float = 0.05  # seconds added to every stub response
+    stale_ratio: float = 0.1  # share of the corpus made stale for the stale scenario
+    url: Optional[str] = None  # drive a running service instead of an in-process one
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the settings for the results file."""
+        return asdict(self)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an ascending list (0.0 when empty)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(
+    latencies: List[float], seconds: float, statuses: Counter, cache: Counter
+) -> Dict[str, Any]:
+    """Reduce raw per-request latencies (seconds) to the reported figures."""
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "seconds": round(seconds, 4),
+        "throughput_rps": round(len(values) / seconds, 2) if seconds > 0 else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(values, 50) * 1000, 3),
+            "p95": round(percentile(values, 95) * 1000, 3),
+            "p99": round(percentile(values, 99) * 1000, 3),
+            "mean": round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+            "max": round(values[-1] * 1000, 3) if values else 0.0,
+        },
+        "status": dict(sorted(statuses.items())),
+        "cache": dict(sorted(cache.items())),
+    }
+
+
+async def run_scenario(
+    client: httpx.AsyncClient, paths: List[str], concurrency: int
+) -> Dict[str, Any]:
+    """Send every path once, from ``concurrency`` clients pulling off a shared list."""
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    cache: Counter = Counter()
+    remaining = iter(paths)
+
+    async def client_loop() -> None:
+        for path in remaining:
+            started = time.perf_counter()
+            try:
+                response = await client.get(path)
+            except httpx.HTTPError:
+                statuses["error"] += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            statuses[str(response.status_code)] += 1
+            if "X-Cache" in response.headers:
+                cache[response.headers["X-Cache"]] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(max(1, min(concurrency, len(paths))))))
+    return summarize(latencies, time.perf_counter() - started, statuses, cache)
+
+
+def plan_requests(corpus: Corpus, config: BenchmarkConfig) -> Dict[str, List[str]]:
+    """Build the request list of every scenario, reproducibly from the corpus seed."""
+    rng = random.Random(f"{corpus.config.seed}:requests")
+    count = config.requests
+    # Against a running service nothing can be backdated, so there is no stale scenario
+    stale = stale_aids(corpus, config) if config.url is None else []
+    fresh = sorted(set(corpus.aids) - set(stale))
+    hit_aids = rng.choices(fresh, k=count)
+    first_missing = corpus.aids.stop
+    popular = corpus.tag_names[:20]
+    tag_ids = corpus.tag_ids(50)
+
+    plans = {
+        "anime_hit": [f"/anime/{aid}" for aid in hit_aids],
+        "anime_hit_mature": [f"/anime/{aid}?mature=true" for aid in hit_aids],
+    }
+    if stale:
+        plans["anime_stale"] = [f"/anime/{rng.choice(stale)}" for _ in range(count)]
+        plans["anime_stale_mature"] = [
+            f"/anime/{rng.choice(stale)}?mature=true" for _ in range(count)
+        ]
+    plans["anime_miss"] = [f"/anime/{aid}" for aid in range(first_missing, first_missing + count)]
+    plans["search_tags"] = [
+        "/search/tags?tags=" + ",".join(rng.sample(popular, rng.randint(1, 2)))
+        for _ in range(count)
+    ]
+    plans["tag_by_id"] = [f"/tags/{rng.choice(tag_ids)}" for _ in range(count)]
+    plans["tags_page"] = ["/tags" for _ in range(count)]
+    return plans
+
+
+def stale_aids(corpus: Corpus, config: BenchmarkConfig) -> List[int]:
+    """AIDs whose last_updated is backdated for the stale scenarios."""
+    rng = random.Random(f"{corpus.config.seed}:stale")
+    size = max(1, int(len(corpus.aids) * config.stale_ratio))
+    return sorted(rng.sample(list(corpus.aids), min(size, len(corpus.aids))))
+
+
+async def index_seed_corpus(corpus: Corpus, workers: int) -> Dict[str, Any]:
+    """Write the corpus as seed files into main.XML_DIR and time indexing them."""
+    import main
+
+    corpus.write(main.XML_DIR)
+    await main.init_database()
+    files = sorted(main.XML_DIR.glob("*.xml"))
+    summary = await bulk_index(
+        files,
+        lambda: main.db_connection(write=True),
+        workers=workers,
+        progress_every=len(files) + 1,
+        exclusive=True,  # before the service is serving, like seed_db.py
+    )
+    return {
+        "files": summary.total,
+        "indexed": summary.indexed,
+        "failed": summary.failed,
+        "seconds": round(summary.seconds, 4),
+        "files_per_sec": round(summary.files_per_sec, 2),
+    }
+
+
+async def backdate(aids: List[int], days: int) -> None:
+    """Make cached entries look ``days`` old so lookups serve them as stale."""
+    import main
+
+    last_updated = (datetime.now() - timedelta(days=days)).isoformat()
+    async with main.db_connection(write=True) as db:
+        await db.executemany(
+            "UPDATE anime SET last_updated = ? WHERE aid = ?",
+            [(last_updated, aid) for aid in aids],
+        )
+        await db.commit()
+
+
+@asynccontextmanager
+async def in_process_service(
+    corpus: Corpus, config: BenchmarkConfig, workdir: Path
+) -> AsyncIterator[Dict[str, Any]]:
+    """Run the service against a scratch directory and the stub; yields run state.
+
+    The yielded dict holds ``client`` (talking to the app), ``stub`` (the stub app)
+    and ``seed_indexing`` (bulk_index figures). Module globals are restored on exit.
+    main is imported here rather than at the top: it reads its configuration from
+    the environment when first imported.
+    """
+    import main
+
+    overrides = {
+        "XML_DIR": workdir / "data",
+        "DB_PATH": workdir / "anidb.db",
+        "SEED_DATA_DIR": workdir / "seed_data",
+        "THROTTLE_SECONDS": config.throttle_seconds,
+        "ANIDB_API_URL": STUB_URL,
+    }
+    saved = {name: getattr(main, name) for name in overrides}
+    saved_limit = main.api_budget.limit
+    stub = create_stub_app(corpus, config.stub_latency)
+    try:
+        for name, value in overrides.items():
+            setattr(main, name, value)
+        main.api_budget.limit = 1_000_000  # the stub has no daily limit
+        main.response_cache.clear()
+        seed_indexing = await index_seed_corpus(corpus, config.index_workers)
+
+        async with main.lifespan(main.app):
+            # Fetches go to the stub; lifespan shutdown closes this client
+            await main.http_client.aclose()
+            main.http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=stub))
+            async with httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=main.app), base_url=SERVICE_URL
+            ) as client:
+                yield {"client": client, "stub": stub, "seed_indexing": seed_indexing}
+    finally:
+        for name, value in saved.items():
+            setattr(main, name, value)
+        main.api_budget.limit = saved_limit
+        main.response_cache.clear()
+
+
+async def run_benchmark(config: BenchmarkConfig, workdir: Optional[Path] = None) -> Dict[str, Any]:
+    """Run every scenario and return the results document."""
+    corpus = Corpus(config.corpus)
+    plans = plan_requests(corpus, config)
+    results: Dict[str, Any] = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "target": config.url or "in-process",
+            "config": config.to_dict(),
+        },
+        "seed_indexing": None,
+        "scenarios": {},
+    }
+
+    async def run_all(client: httpx.AsyncClient) -> None:
+        for name, paths in plans.items():
+            print(f"🏁 {name}: {len(paths)} requests, concurrency {config.concurrency}...")
+            summary = await run_scenario(client, paths, config.concurrency)
+            latency = summary["latency_ms"]
+            print(
+                f"   p50 {latency['p50']:.1f}ms  p95 {latency['p95']:.1f}ms  "
+                f"p99 {latency['p99']:.1f}ms  {summary['throughput_rps']:.0f} req/s"
+            )
+            results["scenarios"][name] = summary
+
+    if config.url is not None:
+        async with httpx.AsyncClient(base_url=config.url, timeout=60) as client:
+            await run_all(client)
+        return results
+
+    with tempfile.TemporaryDirectory(prefix="anidb-bench-") as scratch:
+        async with in_process_service(corpus, config, workdir or Path(scratch)) as service:
+            results["seed_indexing"] = service["seed_indexing"]
+            print(
+                f"📚 Seed indexing: {service['seed_indexing']['files']} files, "
+                f"{service['seed_indexing']['files_per_sec']:.0f} files/sec"
+            )
+            await backdate(stale_aids(corpus, config), days=365)
+            await run_all(service["client"])
+            results["meta"]["stub_requests"] = service["stub"].state.requests
+    return results
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Pair up the figures two result documents have in common.
+
+    Returns rows of scenario, metric, old, new and change_pct (new relative to old).
+    """
+    rows = []
+
+    def add(scenario: str, metric: str, before: float, after: float) -> None:
+        change = round((after - before) / before * 100, 1) if before else None
+        rows.append(
+            {
+                "scenario": scenario,
+                "metric": metric,
+                "old": before,
+                "new": after,
+                "change_pct": change,
+            }
+        )
+
+    if old.get("seed_indexing") and new.get("seed_indexing"):
+        add(
+            "seed_indexing",
+            "files_per_sec",
+            old["seed_indexing"]["files_per_sec"],
+            new["seed_indexing"]["files_per_sec"],
+        )
+    for name, after in new.get("scenarios", {}).items():
+        before = old.get("scenarios", {}).get(name)
+        if before is None:
+            continue
+        for metric in COMPARED_METRICS:
+            if metric == "throughput_rps":
+                add(name, metric, before[metric], after[metric])
+            else:
+                add(name, f"{metric}_ms", before["latency_ms"][metric], after["latency_ms"][metric])
+    return rows
+
+
+def format_comparison(rows: List[Dict[str, Any]]) -> str:
+    """Render compare() rows as a fixed-width table."""
+    lines = [f"{'scenario':<20} {'metric':<15} {'old':>12} {'new':>12} {'change':>9}"]
+    for row in rows:
+        change = "n/a" if row["change_pct"] is None else f"{row['change_pct']:+.1f}%"
+        lines.append(
+            f"{row['scenario']:<20} {row['metric']:<15} "
+            f"{row['old']:>12.2f} {row['new']:>12.2f} {change:>9}"
+        )
+    return "\n".join(lines)
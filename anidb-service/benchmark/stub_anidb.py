@@ -0,0 +1,33 @@
+"""Local stand-in for the AniDB HTTP API.
+
+Serves ``GET /httpapi?request=anime&aid=N`` from a synthetic corpus so cache
+misses and refreshes can be load tested without touching (or being banned by)
+the real API. Point the service at it with ANIDB_API_URL.
+"""
+
+import asyncio
+
+from benchmark.corpus import Corpus
+from fastapi import FastAPI
+from fastapi.responses import Response
+
+CLIENT_ERROR = '<error code="302">client version missing or invalid</error>'
+
+
+def create_stub_app(corpus: Corpus, latency: float = 0.0) -> FastAPI:
+    """Build the stub app; ``latency`` seconds are added to every response."""
+    app = FastAPI(title="AniDB API stub")
+    app.state.requests = 0
+
+    @app.get("/httpapi")
+    async def httpapi(request: str = "", aid: int = 0) -> Response:
+        """Answer an HTTP API request like AniDB does: XML, errors as <error> documents."""
+        app.state.requests += 1
+        if latency > 0:
+            await asyncio.sleep(latency)
+        if request != "anime" or aid <= 0:
+            return Response(CLIENT_ERROR, media_type="text/xml")
+        # AIDs past the end of the corpus are still answered, without relations
+        return Response(corpus.document(aid), media_type="text/xml")
+
+    return app
@@ -1,12 +1,943 @@
 """Common utilities shared between main.py and seed_db.py."""
 
+import asyncio
+import calendar
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+import xml.etree.ElementTree as ET
 import zipfile
+import zlib
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
 from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Set, Tuple, Union
+
+import aiosqlite
+
+# Tag and category names that mark a title as mature/18+
+MATURE_KEYWORDS = ("18 restricted", "hentai", "pornography", "adult")
+
+
+def is_mature_tag(name: str) -> bool:
+    """Whether a tag marks its title as mature: its name is a keyword (any case)."""
+    return name.strip().lower() in MATURE_KEYWORDS
+
+
+def is_mature_category(name: str) -> bool:
+    """Whether a category marks its title as mature: its name contains a keyword."""
+    folded = name.strip().lower()
+    return any(keyword in folded for keyword in MATURE_KEYWORDS)
+
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS anime (
+    aid INTEGER PRIMARY KEY,
+    last_updated TEXT NOT NULL,
+    is_mature INTEGER NOT NULL DEFAULT 0,
+    mature_categories TEXT,
+    start_date TEXT,  -- AniDB <startdate>/<enddate>, used for airing-aware refresh
+    end_date TEXT,
+    record_json TEXT  -- compact structured record served by /anime/{aid}.json
+);
+CREATE TABLE IF NOT EXISTS tags (
+    aid INTEGER NOT NULL,
+    tag_id INTEGER,
+    name TEXT NOT NULL,
+    weight INTEGER DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS tag_dict (
+    tag_id INTEGER PRIMARY KEY,  -- AniDB tag id; negative for tags that came without one
+    name TEXT NOT NULL,
+    name_folded TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS anime_tags (
+    tag_id INTEGER NOT NULL,
+    weight INTEGER NOT NULL DEFAULT 0,
+    aid INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tag_stats (
+    tag_id INTEGER PRIMARY KEY,  -- tag_dict id
+    anime_count INTEGER NOT NULL,  -- distinct anime carrying the tag
+    link_count INTEGER NOT NULL,  -- anime_tags rows, the denominator of the average weight
+    weight_sum INTEGER NOT NULL,
+    version INTEGER NOT NULL  -- time.time_ns() of the last change
+);
+CREATE TABLE IF NOT EXISTS relations (
+    aid INTEGER NOT NULL,
+    related_aid INTEGER NOT NULL,
+    type TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS anime_titles (
+    id INTEGER PRIMARY KEY,
+    aid INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    lang TEXT,  -- xml:lang, e.g. "en", "ja", "x-jat"
+    type TEXT  -- main, official, synonym or short
+);
+-- Full-text index over anime_titles, kept in step by the triggers below
+CREATE VIRTUAL TABLE IF NOT EXISTS anime_titles_fts USING fts5(
+    title,
+    content = 'anime_titles',
+    content_rowid = 'id',
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+CREATE TRIGGER IF NOT EXISTS anime_titles_ai AFTER INSERT ON anime_titles BEGIN
+    INSERT INTO anime_titles_fts (rowid, title) VALUES (new.id, new.title);
+END;
+CREATE TRIGGER IF NOT EXISTS anime_titles_ad AFTER DELETE ON anime_titles BEGIN
+    INSERT INTO anime_titles_fts (anime_titles_fts, rowid, title)
+    VALUES ('delete', old.id, old.title);
+END;
+CREATE TABLE IF NOT EXISTS franchise_members (
+    aid INTEGER PRIMARY KEY,  -- every AID with at least one relation, indexed or not
+    franchise_id INTEGER NOT NULL  -- smallest AID of the connected component
+);
+CREATE TABLE IF NOT EXISTS xml_blobs (
+    aid INTEGER PRIMARY KEY,
+    data BLOB NOT NULL,  -- gzip-compressed AniDB document
+    size INTEGER NOT NULL,  -- uncompressed size in bytes
+    version INTEGER NOT NULL  -- time.time_ns() when stored
+);
+CREATE TABLE IF NOT EXISTS api_usage_hourly (
+    hour TEXT PRIMARY KEY,  -- start of the hour, ISO format
+    requests INTEGER NOT NULL DEFAULT 0,
+    failures INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS anime_demand (
+    aid INTEGER PRIMARY KEY,
+    log2_score REAL NOT NULL,  -- log2 of the decayed request count, pre-scaled to a fixed epoch
+    last_requested TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS update_jobs (
+    aid INTEGER PRIMARY KEY,
+    priority INTEGER NOT NULL,  -- 0 interactive miss, 1 stale refresh, 2 speculative
+    enqueued_at TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    claimed_by TEXT  -- worker id of the lease holder processing this job
+);
+CREATE TABLE IF NOT EXISTS worker_lease (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leader_tasks (
+    name TEXT PRIMARY KEY,  -- one-off startup work done by the worker lease holder
+    owner TEXT NOT NULL,  -- worker id of the lease holder that finished it
+    finished_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS document_sources (
+    aid INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,  -- 'seed' (extracted from the seed zip) or 'api' (fetched)
+    data_time REAL NOT NULL,  -- when the document was fetched from AniDB (seed: member time)
+    member TEXT,  -- seed copies: zip member file name, CRC32 and size
+    crc INTEGER,
+    size INTEGER
+);
+CREATE TABLE IF NOT EXISTS anime_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,  -- change feed cursor, never reused
+    aid INTEGER NOT NULL,
+    changed_at TEXT NOT NULL,
+    content_hash TEXT NOT NULL  -- SHA-256 of the cached XML document
+);
+CREATE TABLE IF NOT EXISTS api_logs (
+    timestamp TEXT NOT NULL,
+    aid INTEGER,
+    success INTEGER DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_anime_changes_changed_at ON anime_changes(changed_at);
+CREATE INDEX IF NOT EXISTS idx_tags_aid ON tags(aid);
+CREATE INDEX IF NOT EXISTS idx_tags_tag_id ON tags(tag_id);
+CREATE INDEX IF NOT EXISTS idx_tag_dict_name_folded ON tag_dict(name_folded);
+CREATE INDEX IF NOT EXISTS idx_anime_tags_tag_weight_aid ON anime_tags(tag_id, weight DESC, aid);
+CREATE INDEX IF NOT EXISTS idx_anime_tags_aid ON anime_tags(aid);
+CREATE INDEX IF NOT EXISTS idx_tag_stats_count_weight
+    ON tag_stats(anime_count DESC, CAST(weight_sum AS REAL) / link_count DESC, tag_id);
+CREATE INDEX IF NOT EXISTS idx_anime_titles_aid ON anime_titles(aid);
+CREATE INDEX IF NOT EXISTS idx_relations_aid ON relations(aid);
+CREATE INDEX IF NOT EXISTS idx_relations_related_aid ON relations(related_aid);
+CREATE INDEX IF NOT EXISTS idx_franchise_members_franchise ON franchise_members(franchise_id);
+CREATE INDEX IF NOT EXISTS idx_api_logs_timestamp ON api_logs(timestamp);
+CREATE INDEX IF NOT EXISTS idx_update_jobs_order ON update_jobs(priority, enqueued_at);
+CREATE INDEX IF NOT EXISTS idx_anime_demand_score ON anime_demand(log2_score DESC);
+"""
+
+
+async def _column_names(db: aiosqlite.Connection, table: str) -> List[str]:
+    cursor = await db.execute(f"PRAGMA table_info({table})")
+    return [row[1] for row in await cursor.fetchall()]
+
+
+async def _table_names(db: aiosqlite.Connection) -> Set[str]:
+    cursor = await db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    return {row[0] for row in await cursor.fetchall()}
+
+
+async def migrate_schema(db: aiosqlite.Connection, existing_tables: Set[str]) -> None:
+    """Bring a database created by an older release up to SCHEMA_SQL.
+
+    Idempotent: each step checks whether it has already been applied.
+    ``existing_tables`` are the tables present before SCHEMA_SQL ran.
+    """
+    anime_columns = await _column_names(db, "anime")
+    if "is_mature" not in anime_columns:
+        print("🔧 Migrating: adding anime.is_mature and backfilling from tags...")
+        await db.execute("ALTER TABLE anime ADD COLUMN is_mature INTEGER NOT NULL DEFAULT 0")
+        await db.execute("ALTER TABLE anime ADD COLUMN mature_categories TEXT")
+        placeholders = ",".join("?" * len(MATURE_KEYWORDS))
+        await db.execute(
+            f"""
+            UPDATE anime
+            SET is_mature = 1,
+                mature_categories = (
+                    SELECT GROUP_CONCAT(DISTINCT LOWER(t.name))
+                    FROM tags t
+                    WHERE t.aid = anime.aid AND LOWER(t.name) IN ({placeholders})
+                )
+            WHERE aid IN (SELECT aid FROM tags WHERE LOWER(name) IN ({placeholders}))
+            """,
+            (*MATURE_KEYWORDS, *MATURE_KEYWORDS),
+        )
+
+    if "start_date" not in anime_columns:
+        # Filled in as titles are re-fetched or re-indexed
+        print("🔧 Migrating: adding anime.start_date/end_date...")
+        await db.execute("ALTER TABLE anime ADD COLUMN start_date TEXT")
+        await db.execute("ALTER TABLE anime ADD COLUMN end_date TEXT")
+
+    if "record_json" not in anime_columns:
+        # Built from the XML on first request, or when titles are re-indexed
+        print("🔧 Migrating: adding anime.record_json...")
+        await db.execute("ALTER TABLE anime ADD COLUMN record_json TEXT")
+
+    if "anime_tags" not in existing_tables and "tags" in existing_tables:
+        print("🔧 Migrating: building tag_dict/anime_tags from tags...")
+        cursor = await db.execute("SELECT aid, tag_id, name, weight FROM tags")
+        rows = await cursor.fetchall()
+        by_aid: Dict[int, List[Tuple[int, str, int]]] = {}
+        for aid, tag_id, name, weight in rows:
+            by_aid.setdefault(aid, []).append((tag_id or 0, name, weight or 0))
+        for aid, tags in by_aid.items():
+            await _store_tag_links(db, aid, tags, incremental=False)
+
+    if "franchise_members" not in existing_tables and "relations" in existing_tables:
+        print("🔧 Migrating: building franchise_members from relations...")
+        await rebuild_franchises(db)
+
+    if "tag_stats" not in existing_tables and existing_tables & {"anime_tags", "tags"}:
+        print("🔧 Migrating: building tag_stats from anime_tags...")
+        await rebuild_tag_stats(db)
+
+    # Superseded by idx_tag_stats_count_weight (ties broken by average weight)
+    await db.execute("DROP INDEX IF EXISTS idx_tag_stats_count")
+
+    if "anime_titles" not in existing_tables and "anime" in existing_tables:
+        # Rows indexed before record_json existed get their titles when re-indexed
+        print("🔧 Migrating: building anime_titles from stored records...")
+        await db.execute(
+            """
+            INSERT INTO anime_titles (aid, title, lang, type)
+            SELECT a.aid, json_extract(t.value, '$.title'), json_extract(t.value, '$.lang'),
+                   json_extract(t.value, '$.type')
+            FROM anime a, json_each(a.record_json, '$.titles') t
+            WHERE a.record_json IS NOT NULL
+            """
+        )
+
+    if "api_usage_hourly" not in existing_tables and "api_logs" in existing_tables:
+        print("🔧 Migrating: rolling up api_logs into api_usage_hourly...")
+        await db.execute(
+            """
+            INSERT INTO api_usage_hourly (hour, requests, failures)
+            SELECT SUBSTR(timestamp, 1, 13) || ':00:00', COUNT(*), SUM(success = 0)
+            FROM api_logs
+            GROUP BY 1
+            """
+        )
+
+
+async def create_schema(db: aiosqlite.Connection) -> None:
+    """Create missing tables and indexes and migrate older layouts."""
+    existing_tables = await _table_names(db)
+    await db.executescript(SCHEMA_SQL)
+    await migrate_schema(db, existing_tables)
+    await db.commit()
+
+
+def fold_tag_name(name: str) -> str:
+    """Case-fold a tag name for dictionary lookups."""
+    return name.strip().casefold()
+
+
+def aid_from_filename(path: Path) -> int:
+    """Return the AID encoded in a cached XML filename ("123.xml" or "AnimeDoc_123.xml")."""
+    stem = path.stem
+    return int(stem.split("_")[1] if "_" in stem else stem)
+
+
+def atomic_write_text(path: Path, text: str) -> None:
+    """Write a file so readers see either the old or the new content, never a partial one.
+
+    The text goes to a hidden temporary file in the same directory (which never
+    matches ``*.xml``), is flushed to disk, and is then renamed over ``path``.
+    """
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+class AnimeRecord(NamedTuple):
+    """Indexable metadata extracted from one AniDB anime document."""
+
+    tags: List[Tuple[int, str, int]]  # (tag_id, name, weight)
+    relations: List[Tuple[int, str]]  # (related_aid, type)
+    mature_markers: List[str]
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    record_json: Optional[str] = None  # JSON object keyed by RECORD_SECTIONS
+    titles: List[Tuple[str, Optional[str], Optional[str]]] = []  # (title, lang, type)
+    content_hash: Optional[str] = None  # SHA-256 of the document bytes, if streamed
+
+
+# Sections of the structured record, selectable with /anime/{aid}.json?fields=
+RECORD_SECTIONS = (
+    "titles",
+    "type",
+    "episodecount",
+    "startdate",
+    "enddate",
+    "ratings",
+    "tags",
+    "categories",
+    "relations",
+)
+
+XML_LANG = "{http://www.w3.org/XML/1998/namespace}lang"
+
+
+def _text(element: Optional[ET.Element]) -> Optional[str]:
+    text = element.text.strip() if element is not None and element.text else ""
+    return text or None
+
+
+def _int_or_none(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class NotAnimeDocument(ValueError):
+    """A well-formed document whose root is not <anime>, such as an AniDB <error>."""
+
+    def __init__(self, tag: str, message: str):
+        super().__init__(f"<{tag}> document: {message}")
+        self.tag = tag
+        self.message = message
+
+
+class _AnimeExtractor:
+    """Collects what is indexed from the end events of an anime document's elements.
+
+    Fed either by a walk over a parsed tree or by a streaming parse; it only reads
+    an element (and, for <tag> and <category>, its <name> child) when that element
+    ends, so the streaming parse can drop every subtree once it has been seen.
+    """
+
+    def __init__(self, markers_only: bool = False):
+        self.markers_only = markers_only
+        self.tags: List[Tuple[int, str, int]] = []
+        self.tag_parents: List[Optional[int]] = []
+        self.categories: List[Dict[str, Any]] = []
+        self.relations: List[Tuple[int, str]] = []
+        self.related_titles: Dict[str, Optional[str]] = {}
+        self.titles: List[Tuple[str, Optional[str], Optional[str]]] = []
+        self.fields: Dict[str, Optional[str]] = {}
+        self.ratings: Dict[str, Dict[str, Any]] = {}
+        self.markers: Set[str] = set()
+
+    def end(self, elem: ET.Element, parent: Optional[str], depth: int) -> None:
+        """Handle one finished element (``depth`` 0 is the document root)."""
+        tag = elem.tag
+        if tag == "tag":
+            name = elem.findtext("name")
+            if name and is_mature_tag(name):
+                self.markers.add(name.strip().lower())
+            if name and not self.markers_only:
+                self.tags.append((int(elem.get("id") or "0"), name, int(elem.get("weight", 0))))
+                self.tag_parents.append(_int_or_none(elem.get("parentid")))
+        elif tag == "category":
+            folded = (elem.findtext("name") or "").strip().lower()
+            if is_mature_category(folded):
+                self.markers.add(folded)
+            name = _text(elem.find("name"))
+            if name and not self.markers_only:
+                self.categories.append({"name": name, "weight": _int_or_none(elem.get("weight"))})
+        elif self.markers_only:
+            return
+        elif parent == "relatedanime" and tag == "anime":
+            related = elem.get("id")
+            if related:
+                self.related_titles[related] = _text(elem)
+                if elem.get("type"):
+                    self.relations.append((int(related), elem.get("type") or ""))
+        elif depth == 1 and tag in ("type", "episodecount", "startdate", "enddate"):
+            self.fields.setdefault(tag, _text(elem))
+        elif depth == 2 and parent == "titles" and tag == "title":
+            if elem.text and elem.text.strip():
+                self.titles.append((elem.text.strip(), elem.get(XML_LANG), elem.get("type")))
+        elif depth == 2 and parent == "ratings":
+            try:
+                self.ratings[tag] = {
+                    "value": float(elem.text or ""),
+                    "count": _int_or_none(elem.get("count")),
+                }
+            except ValueError:
+                pass
+
+    def structured_record(self) -> Dict[str, Any]:
+        """Compact summary of the document with one key per RECORD_SECTIONS entry.
+
+        Mature tags and categories are kept; the API strips them per request.
+        """
+        return {
+            "titles": [
+                {"title": title, "type": kind, "lang": lang} for title, lang, kind in self.titles
+            ],
+            "type": self.fields.get("type"),
+            "episodecount": _int_or_none(self.fields.get("episodecount")),
+            "startdate": self.fields.get("startdate"),
+            "enddate": self.fields.get("enddate"),
+            "ratings": self.ratings,
+            "tags": [
+                {"id": tag_id, "name": name, "weight": weight, "parent_id": parent_id}
+                for (tag_id, name, weight), parent_id in zip(self.tags, self.tag_parents)
+            ],
+            "categories": self.categories,
+            "relations": [
+                {"aid": aid, "type": rel_type, "title": self.related_titles.get(str(aid))}
+                for aid, rel_type in self.relations
+            ],
+        }
+
+    def record(self) -> AnimeRecord:
+        """The AnimeRecord of everything seen."""
+        return AnimeRecord(
+            self.tags,
+            self.relations,
+            sorted(self.markers),
+            self.fields.get("startdate"),
+            self.fields.get("enddate"),
+            json.dumps(self.structured_record(), separators=(",", ":")),
+            self.titles,
+        )
+
+
+def _walk_tree(
+    extractor: _AnimeExtractor, elem: ET.Element, parent: Optional[str] = None, depth: int = 0
+) -> None:
+    for child in elem:
+        _walk_tree(extractor, child, elem.tag, depth + 1)
+    extractor.end(elem, parent, depth)
+
+
+# Bytes (or characters) handed to the pull parser at a time
+_STREAM_CHUNK = 16 * 1024
+# Children of these elements are read when the element itself ends
+_KEEP_CHILDREN = ("tag", "category")
+
+
+class _NotAnimeRoot(Exception):
+    def __init__(self, root: ET.Element):
+        super().__init__(root.tag)
+        self.tag = root.tag
+
+
+def _stream_document(source: Union[str, bytes, Path], extractor: _AnimeExtractor) -> str:
+    """Parse a document incrementally, feeding end events to the extractor.
+
+    A finished element is removed from its parent right after the extractor has
+    seen it, so memory is bounded by the largest <tag>/<category> plus the open
+    ancestors, not by the document. Returns the SHA-256 of the document (text is
+    hashed as UTF-8). Raises NotAnimeDocument if the root is not <anime> and
+    ET.ParseError on malformed XML.
+    """
+    parser = ET.XMLPullParser(events=("start", "end"))
+    digest = hashlib.sha256()
+    stack: List[ET.Element] = []
+
+    def drain() -> None:
+        for event, elem in parser.read_events():
+            if event == "start":
+                if not stack and elem.tag != "anime":
+                    raise _NotAnimeRoot(elem)
+                stack.append(elem)
+                continue
+            stack.pop()
+            if not stack:
+                continue  # the root: its end means the document is complete
+            parent = stack[-1]
+            extractor.end(elem, parent.tag, len(stack))
+            if parent.tag not in _KEEP_CHILDREN:
+                parent.remove(elem)
+
+    try:
+        if isinstance(source, Path):
+            with open(source, "rb") as f:
+                while chunk := f.read(_STREAM_CHUNK):
+                    digest.update(chunk)
+                    parser.feed(chunk)
+                    drain()
+        else:
+            for offset in range(0, len(source), _STREAM_CHUNK):
+                piece = source[offset : offset + _STREAM_CHUNK]
+                digest.update(piece.encode("utf-8") if isinstance(piece, str) else piece)
+                parser.feed(piece)
+                drain()
+        parser.close()
+        drain()
+        return digest.hexdigest()
+    except _NotAnimeRoot as e:
+        # Error documents are tiny: finish parsing to report their message
+        root = ET.fromstring(source.read_bytes() if isinstance(source, Path) else source)
+        raise NotAnimeDocument(e.tag, (root.text or "").strip()[:200]) from None
+
+
+def extract_anime(root: ET.Element) -> AnimeRecord:
+    """Extract everything indexed from a parsed anime document.
+
+    That is tags, relations, mature markers, air dates, the structured record and
+    the titles for full-text search.
+    """
+    extractor = _AnimeExtractor()
+    _walk_tree(extractor, root)
+    return extractor.record()
+
+
+def extract_anime_stream(source: Union[str, bytes, Path]) -> AnimeRecord:
+    """Extract what extract_anime() does in one streaming pass over text or a file.
+
+    No tree of the whole document is built, which keeps episode, character and
+    description subtrees out of memory. The record carries the document's hash.
+    """
+    extractor = _AnimeExtractor()
+    content_hash = _stream_document(source, extractor)
+    return extractor.record()._replace(content_hash=content_hash)
+
+
+def scan_mature_markers(source: Union[str, bytes, Path]) -> List[str]:
+    """Mature tag/category names of a document (see find_mature_markers), streamed."""
+    extractor = _AnimeExtractor(markers_only=True)
+    _stream_document(source, extractor)
+    return sorted(extractor.markers)
+
+
+class TagDictionary:
+    """In-memory mirror of tag_dict so bulk indexing avoids a query per tag.
+
+    resolve() assigns ids exactly like the per-document path; new or renamed
+    entries are buffered until flush() writes them in one executemany.
+    """
+
+    def __init__(self, rows: List[Tuple[int, str, str]]):
+        self.names: Dict[int, str] = {}
+        self.synthetic: Dict[str, int] = {}
+        self.min_id = 0
+        self._pending: Dict[int, Tuple[str, str]] = {}
+        for tag_id, name, folded in rows:
+            self.names[tag_id] = name
+            if tag_id < 0:
+                self.synthetic[folded] = tag_id
+                self.min_id = min(self.min_id, tag_id)
+
+    @classmethod
+    async def load(cls, db: aiosqlite.Connection) -> "TagDictionary":
+        """Read the current tag_dict table."""
+        cursor = await db.execute("SELECT tag_id, name, name_folded FROM tag_dict")
+        return cls(list(await cursor.fetchall()))
+
+    def resolve(self, tag_id: int, name: str) -> int:
+        """Return the dictionary id for a tag, buffering any tag_dict change."""
+        folded = fold_tag_name(name)
+        if tag_id <= 0:
+            existing = self.synthetic.get(folded)
+            if existing is not None:
+                return existing
+            self.min_id -= 1
+            tag_id = self.min_id
+            self.synthetic[folded] = tag_id
+        elif self.names.get(tag_id) == name:
+            return tag_id
+        self.names[tag_id] = name
+        self._pending[tag_id] = (name, folded)
+        return tag_id
+
+    async def flush(self, db: aiosqlite.Connection) -> None:
+        """Write buffered tag_dict entries (caller commits)."""
+        if not self._pending:
+            return
+        await db.executemany(
+            """
+            INSERT INTO tag_dict (tag_id, name, name_folded) VALUES (?, ?, ?)
+            ON CONFLICT(tag_id) DO UPDATE SET
+                name = excluded.name, name_folded = excluded.name_folded
+            """,
+            [(tag_id, name, folded) for tag_id, (name, folded) in self._pending.items()],
+        )
+        self._pending.clear()
+
+
+async def _resolve_tag_ids(
+    db: aiosqlite.Connection,
+    tags: List[Tuple[int, str, int]],
+    tag_dict: Optional[TagDictionary] = None,
+) -> List[Tuple[int, int]]:
+    """Upsert tags into tag_dict and return (tag_id, weight) pairs.
+
+    Tags without an AniDB id share one synthetic negative id per folded name.
+    """
+    if tag_dict is not None:
+        return [(tag_dict.resolve(tag_id, name), weight) for tag_id, name, weight in tags]
+
+    resolved = []
+    for tag_id, name, weight in tags:
+        folded = fold_tag_name(name)
+        if tag_id <= 0:
+            cursor = await db.execute(
+                "SELECT tag_id FROM tag_dict WHERE name_folded = ? AND tag_id < 0", (folded,)
+            )
+            row = await cursor.fetchone()
+            if row:
+                tag_id = row[0]
+            else:
+                cursor = await db.execute("SELECT MIN(0, COALESCE(MIN(tag_id), 0)) FROM tag_dict")
+                tag_id = (await cursor.fetchone())[0] - 1
+                await db.execute(
+                    "INSERT INTO tag_dict (tag_id, name, name_folded) VALUES (?, ?, ?)",
+                    (tag_id, name, folded),
+                )
+        else:
+            await db.execute(
+                """
+                INSERT INTO tag_dict (tag_id, name, name_folded) VALUES (?, ?, ?)
+                ON CONFLICT(tag_id) DO UPDATE SET
+                    name = excluded.name, name_folded = excluded.name_folded
+                WHERE name != excluded.name
+                """,
+                (tag_id, name, folded),
+            )
+        resolved.append((tag_id, weight))
+    return resolved
+
+
+async def _adjust_tag_stats(db: aiosqlite.Connection, aid: int, sign: int) -> None:
+    """Add (sign=1) or subtract (sign=-1) one anime's anime_tags rows to/from tag_stats."""
+    await db.execute(
+        """
+        INSERT INTO tag_stats (tag_id, anime_count, link_count, weight_sum, version)
+        SELECT tag_id, ?, ? * COUNT(*), ? * SUM(weight), ?
+        FROM anime_tags WHERE aid = ? GROUP BY tag_id
+        ON CONFLICT(tag_id) DO UPDATE SET
+            anime_count = anime_count + excluded.anime_count,
+            link_count = link_count + excluded.link_count,
+            weight_sum = weight_sum + excluded.weight_sum,
+            version = excluded.version
+        """,
+        (sign, sign, sign, time.time_ns(), aid),
+    )
+
+
+async def _store_tag_links(
+    db: aiosqlite.Connection,
+    aid: int,
+    tags: List[Tuple[int, str, int]],
+    tag_dict: Optional[TagDictionary] = None,
+    replace: bool = True,
+    incremental: bool = True,
+) -> None:
+    """Replace the integer-keyed anime_tags rows of one anime.
+
+    With ``incremental`` tag_stats is kept in step by subtracting the old rows and
+    adding the new ones.
+    """
+    if replace:
+        if incremental:
+            await _adjust_tag_stats(db, aid, -1)
+        await db.execute("DELETE FROM anime_tags WHERE aid = ?", (aid,))
+    links = await _resolve_tag_ids(db, tags, tag_dict)
+    if links:
+        await db.executemany(
+            "INSERT INTO anime_tags (tag_id, weight, aid) VALUES (?, ?, ?)",
+            [(tag_id, weight, aid) for tag_id, weight in links],
+        )
+    if incremental:
+        await _adjust_tag_stats(db, aid, 1)
+        await db.execute("DELETE FROM tag_stats WHERE anime_count <= 0")
+
+
+async def rebuild_tag_stats(db: aiosqlite.Connection) -> None:
+    """Recompute tag_stats from anime_tags in one pass (caller commits)."""
+    await db.execute("DELETE FROM tag_stats")
+    await db.execute(
+        """
+        INSERT INTO tag_stats (tag_id, anime_count, link_count, weight_sum, version)
+        SELECT tag_id, COUNT(DISTINCT aid), COUNT(*), SUM(weight), ?
+        FROM anime_tags GROUP BY tag_id
+        """,
+        (time.time_ns(),),
+    )
+
+
+async def store_anime_record(
+    db: aiosqlite.Connection,
+    aid: int,
+    record: AnimeRecord,
+    tag_dict: Optional[TagDictionary] = None,
+    replace: bool = True,
+    incremental: bool = True,
+    feed: bool = True,
+) -> None:
+    """Replace all indexed metadata of one anime (caller commits).
+
+    Writes the raw tags and relations rows, the normalized tag_dict/anime_tags
+    layout used by searches, the titles behind the full-text index, and the anime
+    master record with its mature flag. Records with a content hash are also
+    appended to the anime_changes feed, unless ``feed`` is false: a load of the
+    whole database is the feed's starting point, not tens of thousands of changes.
+    ``replace=False`` skips the per-anime deletes when the tables are known to be
+    empty for this AID (bulk loads into a fresh database). Bulk loads covering
+    the whole database also pass ``incremental=False`` and call
+    rebuild_franchises() and rebuild_tag_stats() once at the end instead of
+    maintaining them per document.
+    """
+    # Clear old metadata
+    if replace:
+        await db.execute("DELETE FROM tags WHERE aid = ?", (aid,))
+        await db.execute("DELETE FROM relations WHERE aid = ?", (aid,))
+        await db.execute("DELETE FROM anime_titles WHERE aid = ?", (aid,))
+
+    # Index Tags
+    if record.tags:
+        await db.executemany(
+            "INSERT INTO tags VALUES (?, ?, ?, ?)",
+            [(aid, tag_id, name, weight) for tag_id, name, weight in record.tags],
+        )
+    await _store_tag_links(db, aid, record.tags, tag_dict, replace, incremental)
+
+    # Index Relations
+    if record.relations:
+        await db.executemany(
+            "INSERT INTO relations VALUES (?, ?, ?)",
+            [(aid, related_aid, rel_type) for related_aid, rel_type in record.relations],
+        )
+    if incremental:
+        await refresh_franchise(db, aid)
+
+    # Index Titles (the anime_titles_fts triggers follow)
+    if record.titles:
+        await db.executemany(
+            "INSERT INTO anime_titles (aid, title, lang, type) VALUES (?, ?, ?, ?)",
+            [(aid, title, lang, kind) for title, lang, kind in record.titles],
+        )
+
+    # Update Master Record, materializing the mature flag for search filters
+    await db.execute(
+        """
+        INSERT INTO anime (
+            aid, last_updated, is_mature, mature_categories, start_date, end_date, record_json
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(aid) DO UPDATE SET
+            last_updated = excluded.last_updated,
+            is_mature = excluded.is_mature,
+            mature_categories = excluded.mature_categories,
+            start_date = excluded.start_date,
+            end_date = excluded.end_date,
+            record_json = excluded.record_json
+        """,
+        (
+            aid,
+            datetime.now().isoformat(),
+            1 if record.mature_markers else 0,
+            ",".join(record.mature_markers) or None,
+            record.start_date,
+            record.end_date,
+            record.record_json,
+        ),
+    )
+
+    # Append to the change feed (see GET /changes)
+    if feed and record.content_hash is not None:
+        await db.execute(
+            "INSERT INTO anime_changes (aid, changed_at, content_hash) VALUES (?, ?, ?)",
+            (aid, datetime.now().isoformat(), record.content_hash),
+        )
+
+
+async def store_anime(db: aiosqlite.Connection, aid: int, root: ET.Element) -> None:
+    """Replace all indexed metadata of one parsed anime document (caller commits)."""
+    await store_anime_record(db, aid, extract_anime(root))
+
+
+# Bound on the AIDs bound to one IN (...) query while walking the relation graph
+_FRANCHISE_QUERY_CHUNK = 500
+
+
+async def _connected_aids(db: aiosqlite.Connection, start: int) -> Set[int]:
+    """Every AID reachable from ``start`` through relations, in either direction."""
+    seen = {start}
+    frontier = [start]
+    while frontier:
+        found: Set[int] = set()
+        for i in range(0, len(frontier), _FRANCHISE_QUERY_CHUNK):
+            chunk = frontier[i : i + _FRANCHISE_QUERY_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            cursor = await db.execute(
+                f"SELECT related_aid FROM relations WHERE aid IN ({placeholders}) "
+                f"UNION SELECT aid FROM relations WHERE related_aid IN ({placeholders})",
+                chunk + chunk,
+            )
+            found.update(row[0] for row in await cursor.fetchall())
+        frontier = list(found - seen)
+        seen.update(frontier)
+    return seen
+
+
+async def refresh_franchise(db: aiosqlite.Connection, aid: int) -> None:
+    """Recompute the franchise of one AID after its relations changed (caller commits).
+
+    New relations may merge franchises, removed ones may split the old franchise,
+    so the components of the AID and of every former member are walked again.
+    Only the affected franchises are touched.
+    """
+    cursor = await db.execute(
+        "SELECT aid FROM franchise_members WHERE franchise_id = "
+        "(SELECT franchise_id FROM franchise_members WHERE aid = ?)",
+        (aid,),
+    )
+    pending = {aid} | {row[0] for row in await cursor.fetchall()}
+    # Walk from the AID itself first; any former member left over split off
+    start = aid
+    while True:
+        component = await _connected_aids(db, start)
+        pending -= component
+        if len(component) > 1:
+            franchise_id = min(component)
+            await db.executemany(
+                """
+                INSERT INTO franchise_members (aid, franchise_id) VALUES (?, ?)
+                ON CONFLICT(aid) DO UPDATE SET franchise_id = excluded.franchise_id
+                """,
+                [(member, franchise_id) for member in component],
+            )
+        else:
+            await db.execute("DELETE FROM franchise_members WHERE aid = ?", (start,))
+        if not pending:
+            return
+        start = pending.pop()
+
+
+async def rebuild_franchises(db: aiosqlite.Connection) -> None:
+    """Recompute every franchise from the relations table in one pass (caller commits)."""
+    parent: Dict[int, int] = {}
+
+    def find(aid: int) -> int:
+        root = parent.setdefault(aid, aid)
+        while root != parent[root]:
+            root = parent[root]
+        while parent[aid] != root:  # path compression
+            parent[aid], aid = root, parent[aid]
+        return root
+
+    cursor = await db.execute("SELECT aid, related_aid FROM relations")
+    for aid, related_aid in await cursor.fetchall():
+        a, b = find(aid), find(related_aid)
+        if a != b:
+            # The smaller AID becomes the root, so roots are franchise ids
+            parent[max(a, b)] = min(a, b)
+
+    members = [(aid, find(aid)) for aid in list(parent)]
+    sizes = Counter(franchise_id for _, franchise_id in members)
+    await db.execute("DELETE FROM franchise_members")
+    # A title only related to itself is not a franchise
+    await db.executemany(
+        "INSERT INTO franchise_members (aid, franchise_id) VALUES (?, ?)",
+        [(aid, franchise_id) for aid, franchise_id in members if sizes[franchise_id] > 1],
+    )
+
+
+def compress_xml(xml_text: str) -> Tuple[bytes, int]:
+    """Gzip a document for the blob store; returns (data, uncompressed size).
+
+    The gzip header carries no timestamp, so the stored bytes can be sent as-is
+    with ``Content-Encoding: gzip`` and the same document always compresses the same.
+    """
+    raw = xml_text.encode("utf-8")
+    return gzip.compress(raw, compresslevel=6, mtime=0), len(raw)
+
+
+def decompress_xml(data: bytes) -> str:
+    """Inverse of compress_xml."""
+    return gzip.decompress(data).decode("utf-8")
+
+
+async def store_xml_blob(db: aiosqlite.Connection, aid: int, data: bytes, size: int) -> None:
+    """Insert or replace the compressed document of one anime (caller commits)."""
+    await db.execute(
+        """
+        INSERT INTO xml_blobs (aid, data, size, version) VALUES (?, ?, ?, ?)
+        ON CONFLICT(aid) DO UPDATE SET
+            data = excluded.data, size = excluded.size, version = excluded.version
+        """,
+        (aid, data, size, time.time_ns()),
+    )
+
+
+def find_mature_markers(root: ET.Element) -> List[str]:
+    """Return the sorted mature tag/category names found in an AniDB anime document.
+
+    Tags match a keyword exactly (case-insensitive); categories match if their name
+    contains a keyword, mirroring what the mature filter strips from responses.
+    """
+    extractor = _AnimeExtractor(markers_only=True)
+    _walk_tree(extractor, root)
+    return sorted(extractor.markers)
+
+
+def find_seed_zip(seed_data_dir: Path) -> Optional[Path]:
+    """The seed archive of a seed data directory (the first zip by name), if any."""
+    zip_files = sorted(seed_data_dir.glob("*.zip")) if seed_data_dir.exists() else []
+    return zip_files[0] if zip_files else None
+
+
+def member_mtime(info: zipfile.ZipInfo) -> float:
+    """Modification time recorded for a zip member, as a timestamp.
+
+    The zip stores a wall-clock time without a zone; it is read as UTC, so a
+    snapshot stamped on one host compares the same on a host in another zone.
+    """
+    return float(calendar.timegm(info.date_time + (0, 0, 0)))
 
 
 def extract_seed_data(xml_dir: Path, seed_data_dir: Path) -> None:
     """Extract seed data from zip file if data directory is empty.
 
+    Extracted files keep the modification time recorded in the archive, so they
+    compare as older than a seed snapshot built from the same archive.
+
     Args:
         xml_dir: Directory where XML files should be extracted
         seed_data_dir: Directory containing seed data zip files
@@ -21,13 +952,11 @@ def extract_seed_data(xml_dir: Path, seed_data_dir: Path) -> None:
         print("⚠️ Seed data directory not found, skipping seed extraction")
         return
 
-    zip_files = list(seed_data_dir.glob("*.zip"))
-    if not zip_files:
+    zip_file = find_seed_zip(seed_data_dir)
+    if zip_file is None:
         print("⚠️ No zip files found in seed_data directory")
         return
 
-    # Use the first zip file found
-    zip_file = zip_files[0]
     print(f"📦 Extracting seed data from {zip_file.name}...")
 
     try:
@@ -36,12 +965,12 @@ def extract_seed_data(xml_dir: Path, seed_data_dir: Path) -> None:
 
         with zipfile.ZipFile(zip_file, "r") as zip_ref:
             # Extract all XML files to data directory
-            xml_files = [f for f in zip_ref.namelist() if f.endswith(".xml")]
-            for xml_file in xml_files:
+            xml_files = [info for info in zip_ref.infolist() if info.filename.endswith(".xml")]
+            for info in xml_files:
                 # Extract to data directory
-                zip_ref.extract(xml_file, xml_dir)
+                zip_ref.extract(info, xml_dir)
                 # Move from subdirectory if needed
-                extracted_path = xml_dir / xml_file
+                extracted_path = final_path = xml_dir / info.filename
                 if extracted_path.parent != xml_dir:
                     final_path = xml_dir / extracted_path.name
                     extracted_path.rename(final_path)
@@ -51,7 +980,340 @@ def extract_seed_data(xml_dir: Path, seed_data_dir: Path) -> None:
                     except OSError:
                         # Directory not empty or other OS-related error; safe to ignore
                         pass
+                mtime = member_mtime(info)
+                os.utime(final_path, (mtime, mtime))
 
             print(f"✅ Extracted {len(xml_files)} XML files to {xml_dir}")
     except Exception as e:
         print(f"❌ Error extracting seed data: {e}")
+
+
+# Runs a blocking call off the event loop: asyncio.to_thread, or main.run_blocking
+BlockingRunner = Callable[..., Awaitable[Any]]
+
+
+@dataclass
+class SeedSyncResult:
+    """Outcome of an incremental seed sync."""
+
+    extracted: List[Path] = field(default_factory=list)  # new or changed, need indexing
+    unchanged: int = 0
+    kept: int = 0  # a fresher copy (usually fetched from the API) was kept
+
+
+async def record_api_document(db: aiosqlite.Connection, aid: int) -> None:
+    """Record that the document of an AID was just fetched from AniDB (not committed)."""
+    await db.execute(
+        """
+        INSERT INTO document_sources (aid, source, data_time) VALUES (?, 'api', ?)
+        ON CONFLICT(aid) DO UPDATE SET
+            source = 'api', data_time = excluded.data_time, member = NULL, crc = NULL, size = NULL
+        """,
+        (aid, time.time()),
+    )
+
+
+def _file_crc32(path: Path) -> int:
+    crc = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 16):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def _current_document_time(
+    xml_dir: Path, aid: int, blob_times: Dict[int, float]
+) -> Optional[float]:
+    """Modification time of the document held for an AID, if any (files or blob store)."""
+    times = [
+        path.stat().st_mtime
+        for path in (xml_dir / f"{aid}.xml", xml_dir / f"AnimeDoc_{aid}.xml")
+        if path.exists()
+    ]
+    if aid in blob_times:
+        times.append(blob_times[aid])
+    return max(times) if times else None
+
+
+def _newer_copy(xml_dir: Path, aid: int, target: Path, mtime: float) -> Optional[float]:
+    """Modification time of the AID's file under the other name, if newer than ``mtime``."""
+    for other in (xml_dir / f"{aid}.xml", xml_dir / f"AnimeDoc_{aid}.xml"):
+        if other != target and other.exists() and other.stat().st_mtime > mtime:
+            return other.stat().st_mtime
+    return None
+
+
+async def sync_seed_data(
+    db: aiosqlite.Connection,
+    xml_dir: Path,
+    seed_data_dir: Path,
+    blob_store: bool = False,
+    run_blocking: BlockingRunner = asyncio.to_thread,
+) -> SeedSyncResult:
+    """Bring the cached documents up to date with the seed zip, member by member.
+
+    Each XML member's CRC32 and size (read from the zip's central directory) are
+    compared with the document_sources manifest; only new and changed members are
+    extracted, with their archived modification time. A document the manifest
+    records as fetched from the API (or, without an entry, any document) is only
+    replaced by a member that is newer than it, so fresher data never loses to an
+    older seed copy. A current seed copy without an entry (extracted by an older
+    release) is recognised by its CRC and adopted without rewriting it when it is
+    the newest copy of its AID; a fresher copy is recorded as fetched from the API,
+    as is any file found newer than the member under the other name.
+
+    With ``blob_store``, a seed copy that has been moved into the blob store counts
+    as present although its loose file is gone. The zip and the files are read
+    and written through ``run_blocking``, off the event loop. Returns the
+    extracted files, which the caller indexes.
+    """
+    zip_path = await run_blocking(find_seed_zip, seed_data_dir)
+    if zip_path is None:
+        return SeedSyncResult()
+
+    cursor = await db.execute(
+        "SELECT aid, source, data_time, member, crc, size FROM document_sources"
+    )
+    sources = {row[0]: row[1:] for row in await cursor.fetchall()}
+    cursor = await db.execute("SELECT aid, version FROM xml_blobs")
+    blob_times = {aid: version / 1e9 for aid, version in await cursor.fetchall()}
+
+    result, manifest = await run_blocking(
+        _sync_seed_files, zip_path, xml_dir, sources, blob_times, blob_store
+    )
+    await db.executemany(
+        """
+        INSERT INTO document_sources (aid, source, data_time, member, crc, size)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(aid) DO UPDATE SET
+            source = excluded.source, data_time = excluded.data_time,
+            member = excluded.member, crc = excluded.crc, size = excluded.size
+        """,
+        manifest,
+    )
+    await db.commit()
+    print(
+        f"🌱 Seed sync from {zip_path.name}: {len(result.extracted)} extracted, "
+        f"{result.unchanged} unchanged, {result.kept} kept (fresher copy)"
+    )
+    return result
+
+
+def _sync_seed_files(
+    zip_path: Path,
+    xml_dir: Path,
+    sources: Dict[int, Tuple[Any, ...]],
+    blob_times: Dict[int, float],
+    blob_store: bool,
+) -> Tuple[SeedSyncResult, List[Tuple[Any, ...]]]:
+    """Compare the zip with the manifest and extract what changed (blocking).
+
+    Returns the outcome and the document_sources rows to upsert.
+    """
+    result = SeedSyncResult()
+    xml_dir.mkdir(parents=True, exist_ok=True)
+    manifest = []
+    with zipfile.ZipFile(zip_path) as zf:
+        for info in zf.infolist():
+            if not info.filename.endswith(".xml") or info.is_dir():
+                continue
+            name = Path(info.filename).name
+            target = xml_dir / name
+            try:
+                aid = aid_from_filename(target)
+            except (IndexError, ValueError):
+                # No AID to track: extracted once, like a first seed extraction
+                if not target.exists():
+                    _extract_member(zf, info, target)
+                    result.extracted.append(target)
+                continue
+            mtime = member_mtime(info)
+            entry = ("seed", mtime, name, info.CRC, info.file_size)
+            known = sources.get(aid)
+            if known is not None and known[0] == "seed":
+                # Our own copy: replaced when the member changed (or the file is gone)
+                if known[2:] == entry[2:] and (blob_store or target.exists()):
+                    result.unchanged += 1
+                    continue
+            elif known is not None:
+                # Fetched from the API: only a newer seed copy replaces it
+                if mtime <= known[1]:
+                    result.kept += 1
+                    continue
+            else:
+                current = _current_document_time(xml_dir, aid, blob_times)
+                if current is not None:
+                    if (
+                        target.exists()
+                        and target.stat().st_mtime >= current
+                        and (target.stat().st_size, _file_crc32(target))
+                        == (info.file_size, info.CRC)
+                    ):
+                        # The newest copy is this very member: adopt it as ours
+                        manifest.append((aid, *entry))
+                        result.unchanged += 1
+                        continue
+                    if mtime <= current:
+                        # Remembered as fetched, so later boots don't stat and CRC it again
+                        manifest.append((aid, "api", current, None, None, None))
+                        result.kept += 1
+                        continue
+
+            newer = _newer_copy(xml_dir, aid, target, mtime)
+            if newer is not None:
+                # A fresher copy under the other name that the manifest didn't know about
+                manifest.append((aid, "api", newer, None, None, None))
+                result.kept += 1
+                continue
+            _extract_member(zf, info, target)
+            # The seed copy is the newest: don't let an older copy under the other name win
+            for other in (xml_dir / f"{aid}.xml", xml_dir / f"AnimeDoc_{aid}.xml"):
+                if other != target:
+                    other.unlink(missing_ok=True)
+            manifest.append((aid, *entry))
+            result.extracted.append(target)
+
+    return result, manifest
+
+
+def _extract_member(zf: zipfile.ZipFile, info: zipfile.ZipInfo, target: Path) -> None:
+    """Write one zip member to ``target`` atomically, with its archived mtime."""
+    tmp = target.with_name(f".{target.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with zf.open(info) as src, open(tmp, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        mtime = member_mtime(info)
+        os.utime(tmp, (mtime, mtime))
+        os.replace(tmp, target)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+# Bump when snapshots become incompatible; snapshots of another format are ignored
+SNAPSHOT_FORMAT = "1"
+
+# Per-deployment state that is never shipped in a snapshot
+SNAPSHOT_EXCLUDED_TABLES = (
+    "api_logs",
+    "api_usage_hourly",
+    "anime_changes",
+    "anime_demand",
+    "document_sources",
+    "leader_tasks",
+    "update_jobs",
+    "worker_lease",
+)
+
+
+def seed_snapshot_path(zip_path: Path) -> Path:
+    """Where the snapshot of a seed archive lives: next to it, named after it."""
+    return zip_path.with_suffix(".db")
+
+
+def seed_fingerprint(zip_path: Path) -> str:
+    """Identify a seed archive by its XML members' names, CRC32s and sizes.
+
+    Read from the zip's central directory, so it costs no decompression.
+    """
+    digest = hashlib.sha256()
+    with zipfile.ZipFile(zip_path) as zf:
+        for info in sorted(zf.infolist(), key=lambda info: info.filename):
+            if info.filename.endswith(".xml"):
+                digest.update(f"{info.filename}\0{info.CRC}\0{info.file_size}\n".encode())
+    return digest.hexdigest()
+
+
+async def write_seed_snapshot(
+    db: aiosqlite.Connection, zip_path: Path, indexed_through: float
+) -> Path:
+    """Write a compacted copy of an indexed database next to its seed archive.
+
+    The copy is made with VACUUM INTO, stripped of per-deployment state and
+    stamped with the snapshot format, the archive fingerprint and the newest
+    modification time of the files indexed into it (``indexed_through``). It
+    replaces any previous snapshot atomically.
+    """
+    path = seed_snapshot_path(zip_path)
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        await db.execute("VACUUM INTO ?", (str(tmp),))
+        async with aiosqlite.connect(tmp) as snapshot:
+            await snapshot.execute("PRAGMA journal_mode=DELETE")
+            for table in SNAPSHOT_EXCLUDED_TABLES:
+                await snapshot.execute(f"DELETE FROM {table}")
+            # A restored replica starts its change feed at cursor 0
+            await snapshot.execute("DELETE FROM sqlite_sequence WHERE name = 'anime_changes'")
+            await snapshot.execute(
+                "CREATE TABLE seed_snapshot (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+            await snapshot.executemany(
+                "INSERT INTO seed_snapshot (key, value) VALUES (?, ?)",
+                [
+                    ("format", SNAPSHOT_FORMAT),
+                    ("seed", seed_fingerprint(zip_path)),
+                    ("indexed_through", repr(indexed_through)),
+                    ("built_at", datetime.now().isoformat()),
+                ],
+            )
+            await snapshot.commit()
+            await snapshot.execute("VACUUM")
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return path
+
+
+async def read_seed_snapshot(path: Path) -> Optional[Dict[str, str]]:
+    """The stamp of a snapshot, or None if it is missing or not a snapshot."""
+    if not path.is_file():
+        return None
+    try:
+        async with aiosqlite.connect(f"file:{path}?mode=ro", uri=True) as db:
+            cursor = await db.execute("SELECT key, value FROM seed_snapshot")
+            return {key: value for key, value in await cursor.fetchall()}
+    except aiosqlite.Error:
+        return None
+
+
+async def restore_seed_snapshot(
+    db_path: Path, seed_data_dir: Path, run_blocking: BlockingRunner = asyncio.to_thread
+) -> Optional[float]:
+    """Install the seed snapshot as the database of a fresh volume.
+
+    Only when ``db_path`` does not exist yet and the snapshot was built from the
+    seed archive now present. The snapshot is copied in one sequential read and
+    renamed into place, through ``run_blocking``. Returns the snapshot's
+    ``indexed_through`` time (XML files modified after it still need indexing),
+    or None if nothing was restored.
+    """
+    if db_path.exists():
+        return None
+    zip_path = await run_blocking(find_seed_zip, seed_data_dir)
+    if zip_path is None:
+        return None
+    snapshot = seed_snapshot_path(zip_path)
+    stamp = await read_seed_snapshot(snapshot)
+    if stamp is None:
+        return None
+    fingerprint = await run_blocking(seed_fingerprint, zip_path)
+    if stamp.get("format") != SNAPSHOT_FORMAT or stamp.get("seed") != fingerprint:
+        print(f"⚠️ Ignoring {snapshot.name}: not built from {zip_path.name} by this release")
+        return None
+
+    print(f"📦 Restoring database from seed snapshot {snapshot.name}...")
+    await run_blocking(_install_snapshot, snapshot, db_path)
+    return float(stamp["indexed_through"])
+
+
+def _install_snapshot(snapshot: Path, db_path: Path) -> None:
+    """Copy a snapshot to a temporary file and rename it to ``db_path`` (blocking)."""
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = db_path.with_name(f".{db_path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        shutil.copyfile(snapshot, tmp)
+        os.replace(tmp, db_path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
@@ -0,0 +1,298 @@
+"""Bulk indexing pipeline shared by seed_db.py and main.py.
+
+XML files are parsed into AnimeRecord tuples by a pool of worker processes while a
+single writer connection inserts them in large transactions. Franchise membership
+and tag statistics are recomputed in one pass for loads into an empty database and
+loads by the only writer; a service load into a populated database (usually a few
+changed seed documents) maintains them per document instead, touching only the
+affected franchises. When the caller is the only writer (seed_db.py) and the
+database is empty, secondary indexes
+are dropped for the load and rebuilt once at the end; the service loads alongside
+its worker and live queries, so it keeps them and never overwrites a record written
+after its load started.
+With ``move_to_blob_store`` the workers also gzip each document, which is stored in
+the xml_blobs table and its loose file removed once the batch has committed.
+"""
+
+import asyncio
+import math
+import multiprocessing
+import os
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncContextManager, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+
+import aiosqlite
+from common import (
+    SCHEMA_SQL,
+    AnimeRecord,
+    TagDictionary,
+    aid_from_filename,
+    compress_xml,
+    extract_anime_stream,
+    rebuild_franchises,
+    rebuild_tag_stats,
+    store_anime_record,
+    store_xml_blob,
+)
+
+INDEX_WORKERS = int(os.getenv("INDEX_WORKERS", str(min(4, os.cpu_count() or 1))))
+INDEX_BATCH_SIZE = int(os.getenv("INDEX_BATCH_SIZE", "500"))
+
+# Secondary indexes dropped while bulk loading into an empty database
+DEFERRED_INDEXES = (
+    "idx_tags_aid",
+    "idx_tags_tag_id",
+    "idx_relations_aid",
+    "idx_anime_titles_aid",
+    "idx_relations_related_aid",
+    "idx_anime_tags_tag_weight_aid",
+    "idx_anime_tags_aid",
+)
+
+# (gzip data, uncompressed size) as produced by compress_xml
+XmlBlob = Tuple[bytes, int]
+# (file name, aid, record, error, blob) - exactly one of record/error is set;
+# blob is only produced when compression was requested
+ParsedFile = Tuple[str, int, Optional[AnimeRecord], Optional[str], Optional[XmlBlob]]
+WriterFactory = Callable[[], AsyncContextManager[aiosqlite.Connection]]
+
+
+@dataclass
+class BulkIndexResult:
+    """Outcome of a bulk indexing run."""
+
+    indexed: int = 0
+    failed: int = 0
+    skipped: int = 0  # written by someone else while the load ran
+    total: int = 0
+    seconds: float = 0.0
+
+    @property
+    def files_per_sec(self) -> float:
+        """Throughput over the whole run."""
+        return (self.indexed + self.failed) / self.seconds if self.seconds > 0 else 0.0
+
+
+def parse_anime_file(path: str, compress: bool = False) -> ParsedFile:
+    """Read and parse one cached XML file; errors are returned, not raised."""
+    name = os.path.basename(path)
+    try:
+        aid = aid_from_filename(Path(path))
+    except (IndexError, ValueError):
+        return name, 0, None, "Unrecognised file name", None
+    try:
+        if not compress:
+            # Stream the file: only the indexed elements are ever held in memory
+            return name, aid, extract_anime_stream(Path(path)), None, None
+        with open(path, encoding="utf-8") as f:
+            xml_text = f.read()
+        return name, aid, extract_anime_stream(xml_text), None, compress_xml(xml_text)
+    except ET.ParseError as e:
+        return name, aid, None, f"XML Parse Error: {e}", None
+    except Exception as e:
+        return name, aid, None, f"{type(e).__name__}: {e}", None
+
+
+def parse_anime_files(paths: List[str], compress: bool = False) -> List[ParsedFile]:
+    """Parse a chunk of files (process pool entry point)."""
+    return [parse_anime_file(path, compress) for path in paths]
+
+
+def select_latest_files(files: List[Path]) -> List[Path]:
+    """Keep one file per AID, preferring API-fetched "{aid}.xml" over seed "AnimeDoc_{aid}.xml".
+
+    Files whose name does not encode an AID are kept so they are reported as failures.
+    """
+    by_aid: Dict[int, Path] = {}
+    unknown: List[Path] = []
+    for path in files:
+        try:
+            aid = aid_from_filename(path)
+        except (IndexError, ValueError):
+            unknown.append(path)
+            continue
+        current = by_aid.get(aid)
+        if current is None or current.name.startswith("AnimeDoc_"):
+            by_aid[aid] = path
+    return list(by_aid.values()) + unknown
+
+
+def single_connection(db: aiosqlite.Connection) -> WriterFactory:
+    """Adapt an already open connection to the writer factory bulk_index expects."""
+
+    @asynccontextmanager
+    async def writer() -> AsyncIterator[aiosqlite.Connection]:
+        yield db
+
+    return writer
+
+
+async def _database_is_empty(db: aiosqlite.Connection) -> bool:
+    cursor = await db.execute("SELECT EXISTS (SELECT 1 FROM anime)")
+    row = await cursor.fetchone()
+    return not (row and row[0])
+
+
+def _remove_loose_files(directory: Path, aid: int) -> None:
+    """Delete both naming variants of an AID's XML file once it lives in the blob store."""
+    for name in (f"{aid}.xml", f"AnimeDoc_{aid}.xml"):
+        (directory / name).unlink(missing_ok=True)
+
+
+async def _parsed_chunks(
+    chunks: List[List[str]], workers: int, compress: bool = False
+) -> AsyncIterator[List[ParsedFile]]:
+    """Yield parsed chunks as they complete, keeping at most 2 * workers chunks in flight."""
+    if workers <= 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            yield await asyncio.to_thread(parse_anime_files, chunk, compress)
+        return
+
+    loop = asyncio.get_running_loop()
+    # spawn: never fork a process that is running an event loop and SQLite threads
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    ) as pool:
+        pending = set()
+        remaining = iter(chunks)
+        for chunk in remaining:
+            pending.add(loop.run_in_executor(pool, parse_anime_files, chunk, compress))
+            if len(pending) >= workers * 2:
+                break
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                next_chunk = next(remaining, None)
+                if next_chunk is not None:
+                    pending.add(loop.run_in_executor(pool, parse_anime_files, next_chunk, compress))
+                yield future.result()
+
+
+async def bulk_index(
+    files: List[Path],
+    writer: WriterFactory,
+    workers: int = INDEX_WORKERS,
+    batch_size: int = INDEX_BATCH_SIZE,
+    progress_every: int = 100,
+    move_to_blob_store: bool = False,
+    exclusive: bool = False,
+) -> BulkIndexResult:
+    """Index many XML files: parse in parallel, write through one connection in batches.
+
+    Args:
+        files: Cached XML files ("{aid}.xml" or "AnimeDoc_{aid}.xml")
+        writer: Factory returning an async context manager that yields the writer
+            connection; entered once per batch so other writers can interleave
+        workers: Parser processes (1 parses in a thread instead)
+        batch_size: Files per write transaction
+        progress_every: Print progress after roughly this many files
+        move_to_blob_store: Also store each document compressed in xml_blobs and
+            delete its loose file(s) after the batch commits
+        exclusive: Nothing else reads or writes the database during the load; an
+            empty database is then loaded without secondary indexes or per-AID deletes.
+            Exclusive loads and loads into an empty database rebuild franchises and
+            tag statistics once at the end and add nothing to the change feed;
+            other loads keep them up and record each document as a change
+    """
+    started = time.monotonic()
+    # Records stored after this (by the API worker) are newer than any file here
+    load_started_at = datetime.now().isoformat()
+    files = select_latest_files(files)
+    result = BulkIndexResult(total=len(files))
+    if not files:
+        return result
+
+    async with writer() as db:
+        empty = await _database_is_empty(db)
+        fresh = exclusive and empty
+        if fresh:
+            for index_name in DEFERRED_INDEXES:
+                await db.execute(f"DROP INDEX IF EXISTS {index_name}")
+            await db.commit()
+        tag_dict = await TagDictionary.load(db)
+
+    # Several chunks per worker keeps every process busy until the end of the run
+    chunk_size = max(1, min(batch_size, math.ceil(len(files) / max(1, workers * 4))))
+    chunks = [
+        [str(path) for path in files[i : i + chunk_size]] for i in range(0, len(files), chunk_size)
+    ]
+    paths_by_name = {path.name: path for path in files}
+    # Whole-table rebuilds only pay off when the load is (nearly) the whole database
+    rebuild = exclusive or empty
+
+    batch: List[Tuple[int, AnimeRecord, Optional[XmlBlob], Path]] = []
+    next_progress = progress_every
+
+    async def write_batch() -> None:
+        async with writer() as db:
+            newer: Set[int] = set()
+            if not fresh:
+                placeholders = ",".join("?" * len(batch))
+                cursor = await db.execute(
+                    f"SELECT aid FROM anime WHERE aid IN ({placeholders}) AND last_updated >= ?",
+                    [aid for aid, _, _, _ in batch] + [load_started_at],
+                )
+                newer = {row[0] for row in await cursor.fetchall()}
+            for aid, record, blob, _ in batch:
+                if aid in newer:
+                    continue
+                await store_anime_record(
+                    db,
+                    aid,
+                    record,
+                    tag_dict,
+                    replace=not fresh,
+                    incremental=not rebuild,
+                    feed=not rebuild,
+                )
+                if blob is not None:
+                    await store_xml_blob(db, aid, *blob)
+            await tag_dict.flush(db)
+            await db.commit()
+        if move_to_blob_store:
+            for aid, _, _, path in batch:
+                _remove_loose_files(path.parent, aid)
+        result.indexed += len(batch) - len(newer)
+        result.skipped += len(newer)
+        batch.clear()
+
+    try:
+        async for parsed in _parsed_chunks(chunks, workers, move_to_blob_store):
+            for name, aid, record, error, blob in parsed:
+                if record is None:
+                    print(f"❌ Failed to index {name}: {error}")
+                    result.failed += 1
+                    continue
+                batch.append((aid, record, blob, paths_by_name[name]))
+                if len(batch) >= batch_size:
+                    await write_batch()
+
+            done = result.indexed + result.failed + result.skipped + len(batch)
+            if done >= next_progress and done < result.total:
+                rate = done / max(time.monotonic() - started, 1e-9)
+                print(f"💾 Progress: {done}/{result.total} parsed ({rate:.0f} files/sec)...")
+                next_progress = done + progress_every
+        if batch:
+            await write_batch()
+        if rebuild:
+            # One pass each instead of maintaining the derived tables per document
+            async with writer() as db:
+                await rebuild_franchises(db)
+                await rebuild_tag_stats(db)
+                await db.commit()
+    finally:
+        if fresh:
+            # Rebuild the deferred indexes in one pass each
+            async with writer() as db:
+                await db.executescript(SCHEMA_SQL)
+                await db.execute("PRAGMA optimize")
+                await db.commit()
+
+    result.seconds = time.monotonic() - started
+    return result
@@ -1,18 +1,66 @@
 """AniDB Mirror Service - FastAPI-based caching service for AniDB anime metadata."""
 
 import asyncio
+import hashlib
+import html
+import json
+import math
 import os
+import re
+import socket
+import time
+import uuid
 import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+    cast,
+)
 
 import aiosqlite
 import httpx
-from common import extract_seed_data
+from common import (
+    RECORD_SECTIONS,
+    AnimeRecord,
+    NotAnimeDocument,
+    SeedSyncResult,
+    atomic_write_text,
+    compress_xml,
+    create_schema,
+    decompress_xml,
+    extract_anime_stream,
+    fold_tag_name,
+    is_mature_category,
+    is_mature_tag,
+    record_api_document,
+    restore_seed_snapshot,
+    scan_mature_markers,
+    store_anime_record,
+    store_xml_blob,
+    sync_seed_data,
+)
 from fastapi import FastAPI, HTTPException, Request, status
-from fastapi.responses import Response
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from indexer import bulk_index
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from metrics import Registry
+from pydantic import BaseModel
 
 # --- CONFIG ---
 XML_DIR = Path(os.getenv("XML_DIR", "/app/data"))
@@ -20,90 +68,298 @@ DB_PATH = Path(os.getenv("DB_PATH", "/app/database/anidb.db"))
 SEED_DATA_DIR = Path(os.getenv("SEED_DATA_DIR", "/app/seed_data"))
 DAILY_LIMIT = int(os.getenv("DAILY_LIMIT", "200"))
 THROTTLE_SECONDS = int(os.getenv("THROTTLE_SECONDS", "4"))
+API_LOG_RETENTION_DAYS = int(os.getenv("API_LOG_RETENTION_DAYS", "30"))  # raw api_logs rows
 UPDATE_THRESHOLD = timedelta(days=int(os.getenv("UPDATE_THRESHOLD_DAYS", "14")))
+# Titles that are currently airing change often, so they go stale sooner
+AIRING_UPDATE_THRESHOLD = timedelta(days=int(os.getenv("AIRING_UPDATE_THRESHOLD_DAYS", "2")))
 ROOT_PATH = os.getenv("ROOT_PATH", "")  # Set to /anidb-service for path-based routing
 
+# Where fetched XML is kept: "files" (loose {aid}.xml files in XML_DIR) or "blob"
+# (gzip-compressed rows in the xml_blobs table; loose files are moved in on startup)
+XML_STORE = os.getenv("XML_STORE", "files").lower()
+
+# SQLite connection pool tuning
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))  # long-lived read connections
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # bytes
+SQLITE_CACHE_KB = int(os.getenv("SQLITE_CACHE_KB", "16384"))  # page cache per connection
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+# In-memory cache of rendered /anime/{aid} bodies
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# File I/O and XML parsing/filtering run in a bounded thread pool, off the event loop
+BLOCKING_WORKERS = int(os.getenv("BLOCKING_WORKERS", "4"))  # max concurrent blocking jobs
+
+# Most AIDs accepted by one POST /anime/batch request
+BATCH_MAX_AIDS = int(os.getenv("BATCH_MAX_AIDS", "1000"))
+
+# GET /anime/{aid}?wait=N parks a miss until the worker has fetched the AID
+WAIT_MAX_SECONDS = float(os.getenv("WAIT_MAX_SECONDS", "60"))  # cap on wait
+WAIT_CHECK_SECONDS = float(os.getenv("WAIT_CHECK_SECONDS", "1"))  # cross-process check interval
+
+# Change feed of cache writes (GET /changes, GET /events)
+CHANGES_RETENTION_DAYS = int(os.getenv("CHANGES_RETENTION_DAYS", "30"))
+CHANGES_PAGE_MAX = int(os.getenv("CHANGES_PAGE_MAX", "1000"))  # most changes per response
+EVENTS_POLL_SECONDS = float(os.getenv("EVENTS_POLL_SECONDS", "1"))  # other processes' writes
+EVENTS_KEEPALIVE_SECONDS = float(os.getenv("EVENTS_KEEPALIVE_SECONDS", "15"))
+EVENTS_BUFFER = int(os.getenv("EVENTS_BUFFER", "1000"))  # events a slow subscriber may lag
+
+# Durable update queue shared by all worker processes
+QUEUE_LEASE_SECONDS = int(os.getenv("QUEUE_LEASE_SECONDS", "30"))  # leader election lease
+QUEUE_POLL_SECONDS = float(os.getenv("QUEUE_POLL_SECONDS", "2"))  # idle poll interval
+QUEUE_MAX_ATTEMPTS = int(os.getenv("QUEUE_MAX_ATTEMPTS", "3"))  # before a job is dropped
+
+# Demand-weighted refresh planner
+DEMAND_HALF_LIFE_HOURS = float(os.getenv("DEMAND_HALF_LIFE_HOURS", "72"))
+PLANNER_INTERVAL_SECONDS = int(os.getenv("PLANNER_INTERVAL_SECONDS", "300"))
+PLANNER_RESERVE = int(os.getenv("PLANNER_RESERVE", "50"))  # budget kept for cache misses
+PLANNER_BATCH_SIZE = int(os.getenv("PLANNER_BATCH_SIZE", "20"))  # max jobs queued per run
+PLANNER_LOOKAHEAD = timedelta(hours=int(os.getenv("PLANNER_LOOKAHEAD_HOURS", "24")))
+
 # AniDB API Configuration
+ANIDB_API_URL = os.getenv("ANIDB_API_URL", "http://api.anidb.net:9001/httpapi")
 ANIDB_CLIENT = os.getenv("ANIDB_CLIENT", "kometa")
 ANIDB_VERSION = os.getenv("ANIDB_VERSION", "1")
 ANIDB_PROTO_VER = os.getenv("ANIDB_PROTO_VER", "1")
 ANIDB_USERNAME = os.getenv("ANIDB_USERNAME", "")  # For accessing mature content
 ANIDB_PASSWORD = os.getenv("ANIDB_PASSWORD", "")  # For accessing mature content
+ANIDB_CONNECT_TIMEOUT = float(os.getenv("ANIDB_CONNECT_TIMEOUT", "10"))  # seconds
+ANIDB_READ_TIMEOUT = float(os.getenv("ANIDB_READ_TIMEOUT", "30"))  # seconds
+ANIDB_KEEPALIVE_SECONDS = float(os.getenv("ANIDB_KEEPALIVE_SECONDS", "60"))  # idle connection
+
+# Update queue priorities (lower is served first)
+PRIORITY_INTERACTIVE = 0  # cache miss a client is waiting on
+PRIORITY_REFRESH = 1  # stale entry served while refreshing
+PRIORITY_SPECULATIVE = 2  # prefetch nobody asked for yet
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_REFRESH: "refresh",
+    PRIORITY_SPECULATIVE: "speculative",
+}
 
 # Global state
-update_queue: Optional[asyncio.Queue] = None
-pending_aids: set = set()
+update_queue: Optional["UpdateQueue"] = None
 worker_task: Optional[asyncio.Task] = None
 rate_limit_until: Optional[datetime] = None  # set when AniDB returns 429
+http_client: Optional[httpx.AsyncClient] = None  # shared AniDB client, created in lifespan
+db_pool: Optional["SQLitePool"] = None  # created in lifespan
+# With XML_STORE=blob: loose files may still await the move into the blob store
+loose_xml_files = True
+# Threads start on first use; queued jobs wait for one of the BLOCKING_WORKERS
+blocking_pool = ThreadPoolExecutor(
+    max_workers=BLOCKING_WORKERS, thread_name_prefix="anidb-blocking"
+)
 
+T = TypeVar("T")
+
+# Prometheus metrics served at /metrics
+metrics = Registry()
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    "anidb_http_request_duration_seconds",
+    "Time to respond to an HTTP request, by route template.",
+    ("method", "route", "status"),
+)
+CACHE_LOOKUPS = metrics.counter(
+    "anidb_cache_lookups_total",
+    "Anime lookups by endpoint and outcome (hit, stale, miss).",
+    ("endpoint", "result"),
+)
+MATURE_FILTER_SECONDS = metrics.histogram(
+    "anidb_mature_filter_duration_seconds", "Time spent filtering mature tags out of a document."
+)
+QUEUE_DEPTH = metrics.gauge("anidb_queue_depth", "Queued update jobs.", ("priority",))
+QUEUE_WAIT_SECONDS = metrics.histogram(
+    "anidb_queue_wait_seconds",
+    "Time from enqueueing a job to the worker claiming it.",
+    ("priority",),
+    buckets=(1, 5, 15, 60, 300, 900, 3600, 4 * 3600, 12 * 3600, 86400),
+)
+WORKER_STAGE_SECONDS = metrics.histogram(
+    "anidb_worker_stage_duration_seconds",
+    "Time the worker spends per job in each stage (fetch, write, index).",
+    ("stage",),
+)
+WORKER_JOBS = metrics.counter(
+    "anidb_worker_jobs_total",
+    "Jobs finished by the worker, by outcome "
+    "(cached, failed, dropped, rate_limited, abandoned).",
+    ("outcome",),
+)
+API_REQUESTS = metrics.counter(
+    "anidb_api_requests_total", "Requests sent to the AniDB API.", ("success",)
+)
+API_BUDGET_USED = metrics.gauge(
+    "anidb_api_budget_used", "AniDB requests counted in the sliding 24h window."
+)
+API_BUDGET_LIMIT = metrics.gauge("anidb_api_budget_limit", "AniDB requests allowed per 24h.")
+SQLITE_LOCK_WAIT_SECONDS = metrics.histogram(
+    "anidb_sqlite_lock_wait_seconds",
+    "Time spent waiting for a pooled connection (the single writer or a free reader).",
+    ("connection",),
+)
+BLOCKING_QUEUE_WAIT_SECONDS = metrics.histogram(
+    "anidb_blocking_queue_wait_seconds",
+    "Time blocking jobs (file I/O, XML parsing) waited for a free pool thread.",
+)
 
-async def init_database() -> None:
-    """Initialize database with required tables."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.executescript(
-            """
-            CREATE TABLE IF NOT EXISTS anime (
-                aid INTEGER PRIMARY KEY,
-                last_updated TEXT NOT NULL
-            );
-            CREATE TABLE IF NOT EXISTS tags (
-                aid INTEGER NOT NULL,
-                tag_id INTEGER,
-                name TEXT NOT NULL,
-                weight INTEGER DEFAULT 0
-            );
-            CREATE TABLE IF NOT EXISTS relations (
-                aid INTEGER NOT NULL,
-                related_aid INTEGER NOT NULL,
-                type TEXT NOT NULL
-            );
-            CREATE TABLE IF NOT EXISTS api_logs (
-                timestamp TEXT NOT NULL,
-                aid INTEGER,
-                success INTEGER DEFAULT 1
-            );
-            CREATE INDEX IF NOT EXISTS idx_tags_aid ON tags(aid);
-            CREATE INDEX IF NOT EXISTS idx_tags_tag_id ON tags(tag_id);
-            CREATE INDEX IF NOT EXISTS idx_relations_aid ON relations(aid);
-            CREATE INDEX IF NOT EXISTS idx_api_logs_timestamp ON api_logs(timestamp);
-        """
-        )
-        await db.commit()
 
+async def run_blocking(fn: Callable[..., T], *args: Any) -> T:
+    """Run file I/O or XML work in blocking_pool so the event loop keeps serving.
+
+    At most BLOCKING_WORKERS jobs run at once; the others wait their turn.
+    """
+    submitted = time.perf_counter()
+    started = 0.0
+
+    def call() -> T:
+        nonlocal started
+        started = time.perf_counter()
+        return fn(*args)
 
-async def index_xml_to_db(aid: int, xml_text: str) -> None:
-    """Parse XML and store metadata in database."""
     try:
-        root = ET.fromstring(xml_text)
+        return await asyncio.get_running_loop().run_in_executor(blocking_pool, call)
+    finally:
+        if started:
+            BLOCKING_QUEUE_WAIT_SECONDS.observe(started - submitted)
 
-        async with aiosqlite.connect(DB_PATH) as db:
-            # Clear old metadata
-            await db.execute("DELETE FROM tags WHERE aid = ?", (aid,))
-            await db.execute("DELETE FROM relations WHERE aid = ?", (aid,))
-
-            # Index Tags
-            tags = [
-                (aid, int(t.get("id") or "0"), t.findtext("name"), int(t.get("weight", 0)))
-                for t in root.findall(".//tag")
-                if t.findtext("name")
-            ]
-            if tags:
-                await db.executemany("INSERT INTO tags VALUES (?, ?, ?, ?)", tags)
-
-            # Index Relations
-            rels = [
-                (aid, int(r.get("id") or "0"), r.get("type") or "")
-                for r in root.findall(".//relatedanime/anime")
-                if r.get("id") and r.get("type")
-            ]
-            if rels:
-                await db.executemany("INSERT INTO relations VALUES (?, ?, ?)", rels)
-
-            # Update Master Record
-            await db.execute(
-                "INSERT OR REPLACE INTO anime VALUES (?, ?)",
-                (aid, datetime.now().isoformat()),
-            )
+
+async def _open_connection(path: Path, readonly: bool) -> aiosqlite.Connection:
+    """Open an aiosqlite connection with the service's tuned pragmas applied."""
+    db = await aiosqlite.connect(path)
+    try:
+        await db.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+        await db.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_KB}")
+        await db.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+        if readonly:
+            await db.execute("PRAGMA query_only = ON")
+        else:
+            await db.execute("PRAGMA synchronous = NORMAL")
+    except Exception:
+        await db.close()
+        raise
+    return db
+
+
+class SQLitePool:
+    """Long-lived SQLite connections: a set of query-only readers and a single writer.
+
+    The database runs in WAL mode, so readers never block the writer (or each other).
+    Writes are serialized through one connection guarded by a lock, matching SQLite's
+    single-writer model. The pool belongs to the event loop of the lifespan that
+    opened it.
+    """
+
+    def __init__(self, path: Path, size: int = DB_POOL_SIZE):
+        self.path = path
+        self.size = max(1, size)
+        self._readers: asyncio.Queue = asyncio.Queue()
+        self._open_readers: List[aiosqlite.Connection] = []
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._write_lock = asyncio.Lock()
+
+    async def open(self) -> None:
+        """Open the writer and reader connections."""
+        self._writer = await _open_connection(self.path, readonly=False)
+        self._readers = asyncio.Queue()
+        self._open_readers = []
+        for _ in range(self.size):
+            conn = await _open_connection(self.path, readonly=True)
+            self._open_readers.append(conn)
+            self._readers.put_nowait(conn)
+
+    async def close(self) -> None:
+        """Close every connection owned by the pool."""
+        readers, self._open_readers = self._open_readers, []
+        for conn in readers:
+            await conn.close()
+        if self._writer is not None:
+            await self._writer.close()
+            self._writer = None
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Borrow a query-only connection."""
+        with SQLITE_LOCK_WAIT_SECONDS.time("reader"):
+            conn = await self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put_nowait(conn)
+
+    @asynccontextmanager
+    async def writer(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Hold the single writer connection; rolls back if the block raises."""
+        started = time.perf_counter()
+        async with self._write_lock:
+            SQLITE_LOCK_WAIT_SECONDS.observe(time.perf_counter() - started, "writer")
+            if self._writer is None:
+                raise RuntimeError("Connection pool is closed")
+            try:
+                yield self._writer
+            except BaseException:
+                await self._writer.rollback()
+                raise
+
+
+@asynccontextmanager
+async def db_connection(write: bool = False) -> AsyncIterator[aiosqlite.Connection]:
+    """Yield a database connection from the lifespan pool.
+
+    Falls back to a one-off connection outside the app lifespan (scripts, tests
+    calling helpers directly).
+    """
+    pool = db_pool
+    if pool is not None:
+        async with pool.writer() if write else pool.reader() as db:
+            yield db
+        return
+
+    async with aiosqlite.connect(DB_PATH) as db:
+        yield db
+
+
+async def init_database() -> None:
+    """Initialize database with required tables and load the AniDB request budget."""
+    async with aiosqlite.connect(DB_PATH) as db:
+        await db.execute("PRAGMA journal_mode = WAL")
+        await create_schema(db)
+        await api_budget.load(db)
+
+
+def _prepare_document(
+    xml_text: str, record: Optional[AnimeRecord], compress: bool
+) -> Tuple[AnimeRecord, Optional[Tuple[bytes, int]]]:
+    """Extract the index record of a document and optionally compress it (blocking)."""
+    if record is None:
+        record = extract_anime_stream(xml_text)
+    return record, compress_xml(xml_text) if compress else None
+
+
+async def index_xml_to_db(
+    aid: int,
+    xml_text: str,
+    store_blob: bool = False,
+    record: Optional[AnimeRecord] = None,
+    fetched: bool = False,
+) -> None:
+    """Parse XML and store metadata in database.
+
+    With ``store_blob`` the compressed document is written to the blob store in the
+    same transaction, so the metadata and the served XML never disagree. ``record``
+    skips extraction when the caller already holds it. Extraction (a streaming
+    parse) and compression run in the blocking pool. ``fetched`` records the
+    document as just fetched from AniDB, so seed syncs never replace it with an
+    older copy.
+    """
+    try:
+        record, blob = await run_blocking(_prepare_document, xml_text, record, store_blob)
+
+        async with db_connection(write=True) as db:
+            await store_anime_record(db, aid, record)
+            if blob is not None:
+                await store_xml_blob(db, aid, *blob)
+            if fetched:
+                await record_api_document(db, aid)
             await db.commit()
     except ET.ParseError as e:
         print(f"❌ XML Parse Error for AID {aid}: {e}")
@@ -113,51 +369,944 @@ async def index_xml_to_db(aid: int, xml_text: str) -> None:
         raise
 
 
+class ApiBudget:
+    """Sliding 24h window of AniDB requests, kept as hourly buckets in memory.
+
+    Each request is counted in the bucket of the hour it was made and a bucket
+    leaves the window once the hour 24h after it has passed, so the window errs on
+    the safe side by up to an hour. At most 25 buckets exist, so every answer is
+    constant time however large api_logs grows. Buckets are persisted in the
+    api_usage_hourly rollup and reloaded from it on startup or when another process
+    may have spent budget.
+    """
+
+    WINDOW = timedelta(hours=24)
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._buckets: "OrderedDict[datetime, int]" = OrderedDict()
+        self._used = 0
+        self.pruned_hour: Optional[datetime] = None
+
+    @staticmethod
+    def hour_of(moment: datetime) -> datetime:
+        """Start of the hour bucket a moment falls in."""
+        return moment.replace(minute=0, second=0, microsecond=0)
+
+    def _expire(self, now: datetime) -> None:
+        oldest = self.hour_of(now) - self.WINDOW
+        while self._buckets:
+            hour, count = next(iter(self._buckets.items()))
+            if hour >= oldest:
+                break
+            self._buckets.popitem(last=False)
+            self._used -= count
+
+    async def load(self, db: aiosqlite.Connection) -> None:
+        """Replace the in-memory buckets with the rollup rows still inside the window."""
+        oldest = self.hour_of(datetime.now()) - self.WINDOW
+        cursor = await db.execute(
+            "SELECT hour, requests FROM api_usage_hourly WHERE hour >= ? ORDER BY hour",
+            (oldest.isoformat(),),
+        )
+        self._buckets = OrderedDict(
+            (datetime.fromisoformat(hour), requests) for hour, requests in await cursor.fetchall()
+        )
+        self._used = sum(self._buckets.values())
+
+    def record(self, moment: Optional[datetime] = None) -> None:
+        """Count one request."""
+        moment = moment or datetime.now()
+        self._expire(moment)
+        hour = self.hour_of(moment)
+        self._buckets[hour] = self._buckets.get(hour, 0) + 1
+        self._used += 1
+
+    def used(self, now: Optional[datetime] = None) -> int:
+        """Requests counted in the current window."""
+        self._expire(now or datetime.now())
+        return self._used
+
+    def remaining(self, now: Optional[datetime] = None) -> int:
+        """Requests still allowed in the current window."""
+        return max(0, self.limit - self.used(now))
+
+    def slot_at(self, n: int, now: Optional[datetime] = None) -> Optional[datetime]:
+        """When the n-th request from now becomes allowed, or None if it is allowed now.
+
+        Requests beyond what the current window frees up are paced at ``limit`` per
+        further 24 hours.
+        """
+        now = now or datetime.now()
+        over = self.used(now) - self.limit + n
+        if over <= 0:
+            return None
+        for hour, count in self._buckets.items():
+            over -= count
+            if over <= 0:
+                return hour + self.WINDOW + timedelta(hours=1)
+        if self.limit <= 0:
+            return None  # nothing will ever free up
+        return (
+            self.hour_of(now)
+            + timedelta(hours=1)
+            + self.WINDOW * (1 + math.ceil(over / self.limit))
+        )
+
+    def next_slot_at(self, now: Optional[datetime] = None) -> Optional[datetime]:
+        """When the next request becomes allowed, or None if one is allowed now."""
+        return self.slot_at(1, now)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the budget for /stats."""
+        next_slot = self.next_slot_at()
+        return {
+            "limit": self.limit,
+            "used": self._used,
+            "remaining": self.remaining(),
+            "next_slot_at": next_slot.isoformat() if next_slot else None,
+        }
+
+
+api_budget = ApiBudget(DAILY_LIMIT)
+
+
 async def check_daily_limit() -> bool:
     """Check if we've hit the daily API request limit."""
-    # Ensure DB directory exists
-    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-
-    async with aiosqlite.connect(DB_PATH) as db:
-        cutoff = (datetime.now() - timedelta(hours=24)).isoformat()
-        cursor = await db.execute("SELECT COUNT(*) FROM api_logs WHERE timestamp > ?", (cutoff,))
-        result = await cursor.fetchone()
-        count = result[0] if result else 0
-        return count < DAILY_LIMIT
+    return api_budget.remaining() > 0
 
 
 async def log_api_request(aid: int, success: bool = True) -> None:
-    """Log API request for rate limiting tracking."""
+    """Log API request for rate limiting tracking.
+
+    Updates the hourly rollup with the raw log row and, once per hour, drops raw
+    rows older than API_LOG_RETENTION_DAYS.
+    """
     # Ensure DB directory exists
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
 
-    async with aiosqlite.connect(DB_PATH) as db:
+    now = datetime.now()
+    hour = ApiBudget.hour_of(now)
+    async with db_connection(write=True) as db:
         await db.execute(
             "INSERT INTO api_logs VALUES (?, ?, ?)",
-            (datetime.now().isoformat(), aid, 1 if success else 0),
+            (now.isoformat(), aid, 1 if success else 0),
+        )
+        await db.execute(
+            """
+            INSERT INTO api_usage_hourly (hour, requests, failures) VALUES (?, 1, ?)
+            ON CONFLICT(hour) DO UPDATE SET
+                requests = requests + 1, failures = failures + excluded.failures
+            """,
+            (hour.isoformat(), 0 if success else 1),
         )
+        if api_budget.pruned_hour != hour:
+            cutoff = (now - timedelta(days=API_LOG_RETENTION_DAYS)).isoformat()
+            await db.execute("DELETE FROM api_logs WHERE timestamp < ?", (cutoff,))
         await db.commit()
+    api_budget.pruned_hour = hour
+    api_budget.record(now)
+    API_REQUESTS.inc(str(success).lower())
+
+
+class QueuedJob(NamedTuple):
+    """A claimed update_jobs row."""
+
+    aid: int
+    priority: int
+    attempts: int  # including the current one
+
+
+class UpdateQueue:
+    """Durable, deduplicated priority queue of AIDs to fetch from AniDB.
+
+    Jobs live in the update_jobs table, so they survive restarts and are shared by
+    every uvicorn worker process. Any process may enqueue; only the holder of the
+    "anidb_worker" lease claims jobs, so a single process talks to AniDB against
+    the shared daily budget. The leader runs one job at a time and renews the lease
+    while it does (see keep_lease), so any claimed row it finds when claiming the
+    next job was orphaned, by a previous lease holder or by a failed release, and
+    is claimable again.
+    """
+
+    LEASE_NAME = "anidb_worker"
+
+    def __init__(self, worker_id: Optional[str] = None):
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+        self._wakeup = asyncio.Event()
+
+    async def put(self, aid: int, priority: int = PRIORITY_INTERACTIVE) -> None:
+        """Enqueue an AID; an already queued AID keeps its place but may gain priority.
+
+        Concurrent puts of the same job in this process share one call, and no write
+        transaction is started when any process already queued the AID at this
+        priority or higher; the upsert stays the atomic guard against races.
+        """
+
+        async def put_once() -> None:
+            async with db_connection() as db:
+                cursor = await db.execute("SELECT priority FROM update_jobs WHERE aid = ?", (aid,))
+                row = await cursor.fetchone()
+            if row is None or row[0] > priority:
+                await self.put_many([(aid, priority)])
+
+        await single_flight.do(("enqueue", aid, priority), put_once)
+
+    async def put_many(self, jobs: List[Tuple[int, int]]) -> None:
+        """Enqueue (aid, priority) pairs in one transaction, with put's semantics."""
+        if not jobs:
+            return
+        enqueued_at = datetime.now().isoformat()
+        async with db_connection(write=True) as db:
+            await db.executemany(
+                """
+                INSERT INTO update_jobs (aid, priority, enqueued_at) VALUES (?, ?, ?)
+                ON CONFLICT(aid) DO UPDATE SET priority = excluded.priority
+                WHERE excluded.priority < update_jobs.priority
+                """,
+                [(aid, priority, enqueued_at) for aid, priority in jobs],
+            )
+            await db.commit()
+        self._wakeup.set()
+
+    async def positions(self, aids: List[int]) -> Dict[int, int]:
+        """1-based place in the fetch order of each queued AID (claimed jobs included)."""
+        if not aids:
+            return {}
+        placeholders = ",".join("?" * len(aids))
+        async with db_connection() as db:
+            # Ties on enqueued_at are claimed in rowid (= aid) order
+            cursor = await db.execute(
+                f"""
+                SELECT aid, position FROM (
+                    SELECT aid, ROW_NUMBER() OVER (ORDER BY priority, enqueued_at, aid) AS position
+                    FROM update_jobs
+                )
+                WHERE aid IN ({placeholders})
+                """,
+                aids,
+            )
+            return dict(await cursor.fetchall())
+
+    async def renew_lease(self) -> bool:
+        """Take or extend the worker lease; returns True while this process holds it."""
+        now = datetime.now()
+        expires_at = (now + timedelta(seconds=QUEUE_LEASE_SECONDS)).isoformat()
+        async with db_connection(write=True) as db:
+            await db.execute(
+                """
+                INSERT INTO worker_lease (name, owner, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET
+                    owner = excluded.owner, expires_at = excluded.expires_at
+                WHERE worker_lease.owner = excluded.owner OR worker_lease.expires_at < ?
+                """,
+                (self.LEASE_NAME, self.worker_id, expires_at, now.isoformat()),
+            )
+            await db.commit()
+            cursor = await db.execute(
+                "SELECT owner FROM worker_lease WHERE name = ?", (self.LEASE_NAME,)
+            )
+            row = await cursor.fetchone()
+            leader = bool(row and row[0] == self.worker_id)
+            if leader and not self.is_leader:
+                # Pick up the budget spent by the previous lease holder
+                await api_budget.load(db)
+        if leader != self.is_leader:
+            print(
+                f"👑 Update queue leadership {'acquired' if leader else 'lost'} ({self.worker_id})"
+            )
+            self.is_leader = leader
+        return leader
+
+    async def finish_task(self, name: str) -> None:
+        """Record that this process finished a one-off task as the lease holder."""
+        async with db_connection(write=True) as db:
+            await db.execute(
+                """
+                INSERT INTO leader_tasks (name, owner, finished_at) VALUES (?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET
+                    owner = excluded.owner, finished_at = excluded.finished_at
+                """,
+                (name, self.worker_id, datetime.now().isoformat()),
+            )
+            await db.commit()
+
+    async def leader_finished(self, name: str) -> bool:
+        """Whether the current lease holder has finished a one-off task.
+
+        A task finished by an earlier lease holder doesn't count: a new leader
+        runs it again.
+        """
+        async with db_connection() as db:
+            cursor = await db.execute(
+                """
+                SELECT 1 FROM leader_tasks
+                JOIN worker_lease ON worker_lease.owner = leader_tasks.owner
+                WHERE leader_tasks.name = ? AND worker_lease.name = ?
+                """,
+                (name, self.LEASE_NAME),
+            )
+            return await cursor.fetchone() is not None
+
+    async def claim(self) -> Optional[QueuedJob]:
+        """Atomically claim the next job: highest priority first, then oldest.
+
+        Only called by the leader between jobs, so its own earlier claims are
+        orphaned. A job claimed by another worker is skipped while that worker
+        still holds a live lease.
+        """
+        async with db_connection(write=True) as db:
+            cursor = await db.execute(
+                """
+                UPDATE update_jobs
+                SET claimed_by = ?, attempts = attempts + 1
+                WHERE aid = (
+                    SELECT aid FROM update_jobs
+                    WHERE claimed_by IS NULL OR claimed_by = ? OR NOT EXISTS (
+                        SELECT 1 FROM worker_lease
+                        WHERE name = ? AND owner = update_jobs.claimed_by AND expires_at >= ?
+                    )
+                    ORDER BY priority, enqueued_at
+                    LIMIT 1
+                )
+                RETURNING aid, priority, attempts, enqueued_at
+                """,
+                (self.worker_id, self.worker_id, self.LEASE_NAME, datetime.now().isoformat()),
+            )
+            row = await cursor.fetchone()
+            await db.commit()
+        if row is None:
+            return None
+        aid, priority, attempts, enqueued_at = row
+        waited = (datetime.now() - datetime.fromisoformat(enqueued_at)).total_seconds()
+        QUEUE_WAIT_SECONDS.observe(max(0.0, waited), PRIORITY_NAMES.get(priority, str(priority)))
+        return QueuedJob(aid, priority, attempts)
+
+    async def get(self) -> QueuedJob:
+        """Wait until this process is the leader and a job is available, then claim it."""
+        while True:
+            self._wakeup.clear()
+            if await self.renew_lease():
+                job = await self.claim()
+                if job is not None:
+                    return job
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), QUEUE_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def hold_lease(self, seconds: float) -> None:
+        """Sleep while keeping the lease, so no other process fetches during a back-off."""
+        deadline = asyncio.get_running_loop().time() + seconds
+        while True:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                return
+            await self.renew_lease()
+            await asyncio.sleep(min(remaining, QUEUE_LEASE_SECONDS / 3))
+
+    @asynccontextmanager
+    async def keep_lease(self) -> AsyncIterator[asyncio.Event]:
+        """Renew the lease in the background while a claimed job runs.
+
+        A fetch may take longer than QUEUE_LEASE_SECONDS (connect and read timeouts
+        plus the throttle); without renewing, another process would take the lease
+        and fetch the same AID again. Yields an event that is set once a renewal
+        finds the lease taken over (e.g. after a stall), so the job's result can be
+        dropped instead of stored.
+        """
+        lost = asyncio.Event()
+
+        async def heartbeat() -> None:
+            while True:
+                await asyncio.sleep(QUEUE_LEASE_SECONDS / 3)
+                try:
+                    if not await self.renew_lease():
+                        lost.set()
+                except Exception as e:
+                    print(f"⚠️ Could not renew the update queue lease: {e}")
+
+        task = asyncio.create_task(heartbeat())
+        try:
+            yield lost
+        finally:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def complete(self, aid: int) -> None:
+        """Remove a finished job."""
+        async with db_connection(write=True) as db:
+            await db.execute("DELETE FROM update_jobs WHERE aid = ?", (aid,))
+            await db.commit()
+
+    async def release(self, aid: int) -> None:
+        """Return a claimed job to the queue untouched (e.g. AniDB asked us to back off)."""
+        async with db_connection(write=True) as db:
+            await db.execute(
+                "UPDATE update_jobs SET claimed_by = NULL, attempts = MAX(attempts - 1, 0) "
+                "WHERE aid = ?",
+                (aid,),
+            )
+            await db.commit()
+
+    async def fail(self, job: QueuedJob) -> bool:
+        """Requeue a failed job behind its peers, or drop it after QUEUE_MAX_ATTEMPTS.
+
+        Returns True if the job was requeued.
+        """
+        async with db_connection(write=True) as db:
+            if job.attempts >= QUEUE_MAX_ATTEMPTS:
+                await db.execute("DELETE FROM update_jobs WHERE aid = ?", (job.aid,))
+            else:
+                await db.execute(
+                    "UPDATE update_jobs SET claimed_by = NULL, enqueued_at = ? WHERE aid = ?",
+                    (datetime.now().isoformat(), job.aid),
+                )
+            await db.commit()
+        return job.attempts < QUEUE_MAX_ATTEMPTS
+
+    async def depth(self) -> Dict[str, int]:
+        """Number of queued jobs per priority name."""
+        async with db_connection() as db:
+            cursor = await db.execute(
+                "SELECT priority, COUNT(*) FROM update_jobs GROUP BY priority"
+            )
+            counts = dict(await cursor.fetchall())
+        return {name: counts.get(priority, 0) for priority, name in PRIORITY_NAMES.items()}
+
+
+def is_airing(start_date: Optional[str], end_date: Optional[str], today: str) -> bool:
+    """Whether a title has started and not yet ended (AniDB dates compare as ISO strings)."""
+    return bool(start_date) and start_date <= today and (not end_date or end_date >= today)
+
+
+def effective_ttl(start_date: Optional[str], end_date: Optional[str]) -> timedelta:
+    """How long an indexed title stays fresh."""
+    if is_airing(start_date, end_date, datetime.now().date().isoformat()):
+        return AIRING_UPDATE_THRESHOLD
+    return UPDATE_THRESHOLD
+
+
+def _log2_add(a: float, b: float) -> float:
+    """log2(2**a + 2**b) without overflowing."""
+    high, low = max(a, b), min(a, b)
+    return high + math.log2(1.0 + 2.0 ** (low - high))
+
+
+class DemandTracker:
+    """Exponentially decayed /anime request counts per AID.
+
+    A request at time t adds 2**(t / half-life) to an AID's score, i.e. every score
+    is pre-scaled to a fixed epoch. Older requests therefore weigh less without any
+    row ever being rewritten, and ordering by the stored value orders by current
+    demand. Scores are kept as log2 so they never overflow. Requests are counted in
+    memory and flushed to anime_demand in one transaction.
+    """
+
+    EPOCH = datetime(2026, 1, 1)
+
+    def __init__(self, half_life_hours: float):
+        self.half_life_hours = half_life_hours
+        self._pending: Dict[int, Tuple[float, datetime]] = {}
+
+    def log2_weight(self, moment: datetime) -> float:
+        """log2 of the weight a request made at ``moment`` adds."""
+        return (moment - self.EPOCH).total_seconds() / 3600 / self.half_life_hours
+
+    def score(self, log2_score: float, now: Optional[datetime] = None) -> float:
+        """Decayed request count as of ``now``."""
+        return 2.0 ** (log2_score - self.log2_weight(now or datetime.now()))
+
+    def record(self, aid: int, moment: Optional[datetime] = None) -> None:
+        """Count one request for an AID."""
+        moment = moment or datetime.now()
+        weight = self.log2_weight(moment)
+        pending = self._pending.get(aid)
+        self._pending[aid] = (_log2_add(pending[0], weight) if pending else weight, moment)
+
+    async def flush(self) -> int:
+        """Write buffered requests to anime_demand; returns the number of AIDs updated."""
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, {}
+        try:
+            async with db_connection(write=True) as db:
+                placeholders = ",".join("?" * len(pending))
+                cursor = await db.execute(
+                    f"SELECT aid, log2_score FROM anime_demand WHERE aid IN ({placeholders})",
+                    list(pending),
+                )
+                stored = dict(await cursor.fetchall())
+                await db.executemany(
+                    """
+                    INSERT INTO anime_demand (aid, log2_score, last_requested) VALUES (?, ?, ?)
+                    ON CONFLICT(aid) DO UPDATE SET
+                        log2_score = excluded.log2_score,
+                        last_requested = excluded.last_requested
+                    """,
+                    [
+                        (
+                            aid,
+                            _log2_add(stored[aid], weight) if aid in stored else weight,
+                            moment.isoformat(),
+                        )
+                        for aid, (weight, moment) in pending.items()
+                    ],
+                )
+                await db.commit()
+        except Exception:
+            # Keep the counts for the next flush
+            for aid, (weight, moment) in pending.items():
+                current = self._pending.get(aid)
+                self._pending[aid] = (
+                    (_log2_add(current[0], weight), current[1]) if current else (weight, moment)
+                )
+            raise
+        return len(pending)
+
+
+demand_tracker = DemandTracker(DEMAND_HALF_LIFE_HOURS)
+
+
+class RefreshPlanner:
+    """Spends spare AniDB budget refreshing the most requested stale titles.
+
+    A title is a candidate once it is stale, or will be within PLANNER_LOOKAHEAD,
+    under its effective TTL (shorter while airing). Candidates are queued as
+    speculative jobs, so cache misses and client-triggered refreshes still go first,
+    and PLANNER_RESERVE requests of the daily budget are never planned.
+    """
+
+    def __init__(self) -> None:
+        self.last_run: Optional[datetime] = None
+        self.last_queued = 0
+
+    async def spare_budget(self) -> int:
+        """Requests the planner may queue right now."""
+        queued = sum((await update_queue.depth()).values()) if update_queue else 0
+        spare = api_budget.remaining() - PLANNER_RESERVE - queued
+        return max(0, min(PLANNER_BATCH_SIZE, spare))
+
+    async def candidates(self, limit: int) -> List[Dict[str, Any]]:
+        """Stale or soon stale, not yet queued titles, most requested first."""
+        now = datetime.now()
+        today = now.date().isoformat()
+        async with db_connection() as db:
+            cursor = await db.execute(
+                """
+                SELECT a.aid, d.log2_score, a.last_updated, a.start_date, a.end_date
+                FROM anime_demand d
+                JOIN anime a ON a.aid = d.aid
+                LEFT JOIN update_jobs j ON j.aid = d.aid
+                WHERE j.aid IS NULL
+                AND a.last_updated < CASE
+                    WHEN a.start_date <= ? AND (a.end_date IS NULL OR a.end_date >= ?) THEN ?
+                    ELSE ?
+                END
+                ORDER BY d.log2_score DESC
+                LIMIT ?
+                """,
+                (
+                    today,
+                    today,
+                    (now - AIRING_UPDATE_THRESHOLD + PLANNER_LOOKAHEAD).isoformat(),
+                    (now - UPDATE_THRESHOLD + PLANNER_LOOKAHEAD).isoformat(),
+                    limit,
+                ),
+            )
+            rows = await cursor.fetchall()
+
+        plan = []
+        for aid, log2_score, last_updated, start_date, end_date in rows:
+            due_at = datetime.fromisoformat(last_updated) + effective_ttl(start_date, end_date)
+            plan.append(
+                {
+                    "aid": aid,
+                    "demand": round(demand_tracker.score(log2_score, now), 3),
+                    "airing": is_airing(start_date, end_date, today),
+                    "last_updated": last_updated,
+                    "stale_at": due_at.isoformat(),
+                }
+            )
+        return plan
+
+    async def run(self) -> int:
+        """Queue the next batch of planned refreshes; returns how many were queued."""
+        self.last_run = datetime.now()
+        self.last_queued = 0
+        spare = await self.spare_budget()
+        if spare > 0:
+            for item in await self.candidates(spare):
+                await update_queue.put(item["aid"], PRIORITY_SPECULATIVE)
+                self.last_queued += 1
+        return self.last_queued
+
+    async def stats(self, preview: int = 10) -> Dict[str, Any]:
+        """Return the planner state and the upcoming schedule for /stats."""
+        return {
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+            "last_queued": self.last_queued,
+            "spare_budget": await self.spare_budget(),
+            "schedule": await self.candidates(preview),
+        }
+
+
+refresh_planner = RefreshPlanner()
+
+
+async def refresh_planner_loop() -> None:
+    """Flush demand counters and, on the lease holder, prune the change feed and plan
+    refreshes periodically."""
+    while True:
+        await asyncio.sleep(PLANNER_INTERVAL_SECONDS)
+        try:
+            await demand_tracker.flush()
+            if update_queue is not None and update_queue.is_leader:
+                await change_feed.prune()
+                queued = await refresh_planner.run()
+                if queued:
+                    print(f"🗓️ Refresh planner queued {queued} titles")
+        except Exception as e:
+            print(f"❌ Refresh planner error: {e}")
+
+
+class ResponseCache:
+    """Byte-bounded LRU of rendered /anime/{aid} bodies, one entry per mature variant.
+
+    Entries are keyed by (aid, mature) and remember the (mtime_ns, size) of the XML
+    file they were rendered from, so a file rewritten on disk is never served stale
+    even if nobody called invalidate().
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[int, bool], Tuple[Tuple[int, int], bytes]]" = (
+            OrderedDict()
+        )
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, aid: int, mature: bool, version: Tuple[int, int]) -> Optional[bytes]:
+        """Return the cached body if it was rendered from this file version."""
+        key = (aid, mature)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != version:
+            if entry is not None:
+                self._drop(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, aid: int, mature: bool, version: Tuple[int, int], body: bytes) -> None:
+        """Store a rendered body, evicting least recently used entries to stay in budget."""
+        if len(body) > self.max_bytes:
+            return
+        key = (aid, mature)
+        self._drop(key)
+        self._entries[key] = (version, body)
+        self.size_bytes += len(body)
+        while self.size_bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self.size_bytes -= len(evicted)
+            self.evictions += 1
+
+    def invalidate(self, aid: int) -> None:
+        """Drop both mature variants of an AID."""
+        self._drop((aid, True))
+        self._drop((aid, False))
+
+    def clear(self) -> None:
+        """Drop every entry (counters are kept)."""
+        self._entries.clear()
+        self.size_bytes = 0
+
+    def _drop(self, key: Tuple[int, bool]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= len(entry[1])
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters for /stats."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self.size_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+response_cache = ResponseCache(RESPONSE_CACHE_MAX_BYTES)
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one execution.
+
+    The first caller starts the work as a task; callers arriving while it runs
+    await the same task and share its result or exception. A caller being
+    cancelled does not cancel the work for the others.
+    """
+
+    def __init__(self) -> None:
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run ``fn()`` unless a call with this key is already running, then await it."""
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # retrieved even if every caller went away
+
+    def stats(self) -> Dict[str, Any]:
+        """Return counters for /stats."""
+        return {
+            "in_flight": len(self._inflight),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+        }
+
+
+single_flight = SingleFlight()
+
+
+class CompletionWaiters:
+    """Requests parked until the update worker has finished with an AID.
+
+    The worker of this process signals notify() as soon as a document is indexed.
+    Jobs finished by the worker of another uvicorn process are noticed by a
+    watcher task that, while anyone is waiting, checks every ``check_seconds``
+    which waited-for AIDs have left update_jobs - one query for all waiters.
+    """
+
+    def __init__(self, check_seconds: float):
+        self.check_seconds = check_seconds
+        self._events: Dict[int, asyncio.Event] = {}
+        self._waiting: Dict[int, int] = {}
+        self._watcher: Optional[asyncio.Task] = None
+
+    async def wait(self, aid: int, timeout: float) -> bool:
+        """Wait until the AID is finished; False if ``timeout`` seconds pass first."""
+        event = self._events.setdefault(aid, asyncio.Event())
+        self._waiting[aid] = self._waiting.get(aid, 0) + 1
+        if self._watcher is None or self._watcher.done():
+            self._watcher = asyncio.create_task(self._watch())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._waiting[aid] -= 1
+            if self._waiting[aid] <= 0:
+                del self._waiting[aid]
+                if self._events.get(aid) is event:
+                    del self._events[aid]
+
+    def notify(self, aid: int) -> None:
+        """Wake every request waiting for the AID."""
+        event = self._events.pop(aid, None)
+        if event is not None:
+            event.set()
+
+    async def _watch(self) -> None:
+        while self._events:
+            await asyncio.sleep(self.check_seconds)
+            aids = list(self._events)
+            if not aids:
+                break
+            try:
+                placeholders = ",".join("?" * len(aids))
+                async with db_connection() as db:
+                    cursor = await db.execute(
+                        f"SELECT aid FROM update_jobs WHERE aid IN ({placeholders})", aids
+                    )
+                    queued = {row[0] for row in await cursor.fetchall()}
+            except Exception as e:
+                print(f"⚠️ Could not check waited-for AIDs: {e}")
+                continue
+            for aid in aids:
+                if aid not in queued:
+                    self.notify(aid)
+
+    def stats(self) -> Dict[str, int]:
+        """Return counters for /stats."""
+        return {"waiting": sum(self._waiting.values()), "aids": len(self._events)}
+
+
+completion_waiters = CompletionWaiters(WAIT_CHECK_SECONDS)
+
+
+class Change(NamedTuple):
+    """One anime_changes row."""
+
+    cursor: int
+    aid: int
+    changed_at: str
+    content_hash: str
+
+
+async def read_changes(since: int, limit: int) -> List[Change]:
+    """Changes after the ``since`` cursor, oldest first."""
+    async with db_connection() as db:
+        cursor = await db.execute(
+            "SELECT seq, aid, changed_at, content_hash FROM anime_changes "
+            "WHERE seq > ? ORDER BY seq LIMIT ?",
+            (since, limit),
+        )
+        return [Change(*row) for row in await cursor.fetchall()]
+
+
+class ChangeFeed:
+    """Fans new anime_changes rows out to the /events subscribers of this process.
+
+    One task per process tails the table while anyone is subscribed: it wakes on
+    notify() after a local write, or every ``poll_seconds`` to pick up writes of
+    the worker in another uvicorn process. A subscriber that falls
+    ``buffer`` events behind is sent None and disconnected; it resumes from its
+    last event id.
+    """
+
+    def __init__(self, poll_seconds: float, buffer: int):
+        self.poll_seconds = poll_seconds
+        self.buffer = buffer
+        self._subscribers: Set["asyncio.Queue[Optional[Change]]"] = set()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._starting = asyncio.Lock()
+        self._last_seen = 0
+        self.pruned_hour: Optional[datetime] = None
+
+    async def subscribe(self) -> "asyncio.Queue[Optional[Change]]":
+        """Register a subscriber; it receives every change committed from now on."""
+        async with self._starting:
+            if self._task is None or self._task.done():
+                self._last_seen = await self.head()
+                self._task = asyncio.create_task(self._run())
+        queue: "asyncio.Queue[Optional[Change]]" = asyncio.Queue(self.buffer)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: "asyncio.Queue[Optional[Change]]") -> None:
+        """Drop a subscriber (the tailing task stops with the last one)."""
+        self._subscribers.discard(queue)
+        self._wakeup.set()
+
+    def notify(self) -> None:
+        """Signal that this process has committed changes."""
+        self._wakeup.set()
+
+    async def head(self) -> int:
+        """Cursor of the newest change ever recorded (0 if none)."""
+        async with db_connection() as db:
+            cursor = await db.execute(
+                "SELECT seq FROM sqlite_sequence WHERE name = 'anime_changes'"
+            )
+            row = await cursor.fetchone()
+        return row[0] if row else 0
+
+    async def _run(self) -> None:
+        while self._subscribers:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if not self._subscribers:
+                break  # woken by the last unsubscribe
+            try:
+                changes = await read_changes(self._last_seen, CHANGES_PAGE_MAX)
+            except Exception as e:
+                print(f"⚠️ Could not read the change feed: {e}")
+                continue
+            for change in changes:
+                for queue in list(self._subscribers):
+                    try:
+                        queue.put_nowait(change)
+                    except asyncio.QueueFull:
+                        # Too far behind: end its stream, it resumes from Last-Event-ID
+                        self._subscribers.discard(queue)
+                        queue.get_nowait()
+                        queue.put_nowait(None)
+                self._last_seen = change.cursor
+            if len(changes) == CHANGES_PAGE_MAX:
+                self._wakeup.set()  # more to read
+
+    async def close(self) -> None:
+        """Stop tailing the table (lifespan shutdown, before the pool closes)."""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def prune(self) -> None:
+        """Delete changes older than CHANGES_RETENTION_DAYS, at most once an hour."""
+        hour = datetime.now().replace(minute=0, second=0, microsecond=0)
+        if self.pruned_hour == hour:
+            return
+        cutoff = (datetime.now() - timedelta(days=CHANGES_RETENTION_DAYS)).isoformat()
+        async with db_connection(write=True) as db:
+            await db.execute("DELETE FROM anime_changes WHERE changed_at < ?", (cutoff,))
+            await db.commit()
+        self.pruned_hour = hour
+
+    def stats(self) -> Dict[str, int]:
+        """Return counters for /stats."""
+        return {"subscribers": len(self._subscribers), "last_seen": self._last_seen}
+
+
+change_feed = ChangeFeed(EVENTS_POLL_SECONDS, EVENTS_BUFFER)
 
 
 def filter_mature_content(xml_text: str) -> str:
-    """Remove mature content elements from XML response."""
+    """Remove mature content elements from XML response.
+
+    A streaming scan finds the mature markers first; documents without any (the
+    vast majority) are returned as they are, without building and re-serializing
+    a tree.
+    """
     try:
+        if not scan_mature_markers(xml_text):
+            return xml_text
         root = ET.fromstring(xml_text)
 
-        # Remove mature tags (18+ restricted content)
-        tags_to_remove = root.findall(".//tag[name='18 restricted']")
-        for tag in tags_to_remove:
-            parent = root.find(".//tag[name='18 restricted']/..")
-            if parent is not None:
-                parent.remove(tag)
+        # Remove mature tags in a single pass over the tree
+        for parent in root.iter():
+            for child in list(parent):
+                if child.tag == "tag" and is_mature_tag(child.findtext("name", "")):
+                    parent.remove(child)
 
         # Remove mature categories
-        mature_keywords = ["hentai", "pornography", "18 restricted", "adult"]
         categories_parent = root.find(".//categories")
         if categories_parent is not None:
             for category in list(categories_parent.findall("category")):
-                name = category.findtext("name", "").lower()
-                if any(keyword in name for keyword in mature_keywords):
+                if is_mature_category(category.findtext("name", "")):
                     categories_parent.remove(category)
 
         return ET.tostring(root, encoding="unicode")
@@ -166,6 +1315,220 @@ def filter_mature_content(xml_text: str) -> str:
         return xml_text  # Return original if filtering fails
 
 
+def filter_mature_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Remove mature tags and categories from a structured record (as filter_mature_content)."""
+    filtered = dict(record)
+    filtered["tags"] = [tag for tag in record.get("tags", []) if not is_mature_tag(tag["name"])]
+    filtered["categories"] = [
+        category
+        for category in record.get("categories", [])
+        if not is_mature_category(category["name"])
+    ]
+    return filtered
+
+
+class XmlSource(NamedTuple):
+    """Where a cached AniDB document lives: a loose file, or the blob store if path is None."""
+
+    path: Optional[Path]
+    version: Tuple[int, int]  # (mtime_ns, size) of the file or (version, size) of the blob
+
+
+def _locate_xml_file(aid: int) -> Optional[XmlSource]:
+    """Find the cached XML file for an AID."""
+    # Check for both naming formats: {aid}.xml and AnimeDoc_{aid}.xml
+    for xml_file in (XML_DIR / f"{aid}.xml", XML_DIR / f"AnimeDoc_{aid}.xml"):
+        try:
+            st = xml_file.stat()
+        except OSError:
+            continue
+        return XmlSource(xml_file, (st.st_mtime_ns, st.st_size))
+    return None
+
+
+def _locate_xml_files(aids: List[int]) -> Dict[int, XmlSource]:
+    """Find the cached XML files of many AIDs (blocking)."""
+    sources = {}
+    for aid in aids:
+        source = _locate_xml_file(aid)
+        if source is not None:
+            sources[aid] = source
+    return sources
+
+
+def probe_xml_files() -> bool:
+    """Whether lookups check for loose XML files (never once the blob store holds all)."""
+    return XML_STORE != "blob" or loose_xml_files
+
+
+async def _locate_xml_blob(db: aiosqlite.Connection, aid: int) -> Optional[XmlSource]:
+    """Find the compressed document for an AID without reading the blob itself."""
+    cursor = await db.execute("SELECT version, size FROM xml_blobs WHERE aid = ?", (aid,))
+    row = await cursor.fetchone()
+    return XmlSource(None, (row[0], row[1])) if row else None
+
+
+async def read_xml_blob(aid: int) -> bytes:
+    """Return the gzip bytes stored for an AID."""
+    async with db_connection() as db:
+        cursor = await db.execute("SELECT data FROM xml_blobs WHERE aid = ?", (aid,))
+        row = await cursor.fetchone()
+    if row is None:
+        raise FileNotFoundError(f"No stored XML for AID {aid}")
+    return bytes(row[0])
+
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows a gzip response (q=0 opts out)."""
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        if coding.strip().lower() in ("gzip", "*"):
+            q = params.replace(" ", "").lower()
+            if not q.startswith("q="):
+                return True
+            try:
+                return float(q[2:]) > 0
+            except ValueError:
+                return False
+    return False
+
+
+def _render_document(
+    path: Optional[Path], blob: Optional[bytes], mature: bool
+) -> Tuple[bytes, float]:
+    """Read a file (or decompress a blob) and apply the mature filter (blocking).
+
+    Returns the body and the seconds spent filtering, for the caller to record on
+    the event loop.
+    """
+    content = path.read_text(encoding="utf-8") if path is not None else decompress_xml(blob)
+    filter_seconds = 0.0
+    if not mature:
+        started = time.perf_counter()
+        content = filter_mature_content(content)
+        filter_seconds = time.perf_counter() - started
+    return content.encode("utf-8"), filter_seconds
+
+
+async def render_anime_xml(aid: int, source: XmlSource, mature: bool) -> bytes:
+    """Return the response body for an AID, rendering and caching it on a miss.
+
+    Concurrent misses for the same variant share one read and one filter pass.
+    """
+
+    async def render() -> bytes:
+        blob = await read_xml_blob(aid) if source.path is None else None
+        body, filter_seconds = await run_blocking(_render_document, source.path, blob, mature)
+        if not mature:
+            MATURE_FILTER_SECONDS.observe(filter_seconds)
+        response_cache.put(aid, mature, source.version, body)
+        return body
+
+    body = response_cache.get(aid, mature, source.version)
+    if body is None:
+        body = await single_flight.do(("render", aid, mature, source.version), render)
+    return body
+
+
+def anime_etag(
+    aid: int, last_updated: str, mature: bool, gzip_passthrough: bool, variant: str = ""
+) -> str:
+    """Strong ETag of one /anime/{aid} representation, derived from the anime row only.
+
+    ``variant`` distinguishes other representations of the same row (e.g. JSON fields).
+    """
+    key = f"{aid}:{last_updated}:{int(mature)}" + (f":{variant}" if variant else "")
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).hexdigest()
+    return f'"{aid}-{digest}{"-gz" if gzip_passthrough else ""}"'
+
+
+def _not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    """Evaluate If-None-Match, or If-Modified-Since when no If-None-Match was sent."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        # If-None-Match uses weak comparison
+        return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        # HTTP dates have one second resolution
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+async def anime_xml_response(
+    request: Request,
+    aid: int,
+    source: XmlSource,
+    mature: bool,
+    is_mature: bool,
+    headers: Dict[str, str],
+    last_updated: Optional[str] = None,
+) -> Response:
+    """Build the /anime/{aid} response, passing blob-store bytes through when possible.
+
+    When the anime row is known (``last_updated``), ETag/Last-Modified are set and a
+    matching conditional request is answered with 304 before any XML is read.
+    """
+    headers["X-Mature-Filter"] = "disabled" if mature else "enabled"
+    gzip_passthrough = False
+    if source.path is None:
+        headers["Vary"] = "Accept-Encoding"
+        # Nothing would be filtered out, so the stored gzip bytes are the response body
+        gzip_passthrough = _accepts_gzip(request.headers.get("accept-encoding", "")) and (
+            mature or not is_mature
+        )
+
+    if last_updated is not None:
+        # Stored timestamps are naive local time
+        last_modified = datetime.fromisoformat(last_updated).astimezone(timezone.utc)
+        headers["ETag"] = anime_etag(aid, last_updated, mature, gzip_passthrough)
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+        if _not_modified(request, headers["ETag"], last_modified):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if gzip_passthrough:
+        headers["Content-Encoding"] = "gzip"
+        return Response(
+            content=await read_xml_blob(aid), media_type="application/xml", headers=headers
+        )
+    return Response(
+        content=await render_anime_xml(aid, source, mature),
+        media_type="application/xml",
+        headers=headers,
+    )
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Build the AniDB HTTP client: keep-alive connections, gzip transfer, tuned timeouts."""
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(ANIDB_READ_TIMEOUT, connect=ANIDB_CONNECT_TIMEOUT),
+        # Requests are strictly sequential, so one warm connection is all we need
+        limits=httpx.Limits(
+            max_connections=2,
+            max_keepalive_connections=1,
+            keepalive_expiry=ANIDB_KEEPALIVE_SECONDS,
+        ),
+        headers={"Accept-Encoding": "gzip"},
+    )
+
+
+def parse_anidb_response(aid: int, xml_text: str) -> AnimeRecord:
+    """Extract the index record of a fetched document, rejecting an <error> document."""
+    try:
+        return extract_anime_stream(xml_text)
+    except NotAnimeDocument as e:
+        raise ValueError(f"AniDB returned <{e.tag}> for AID {aid}: {e.message}") from None
+
+
 async def fetch_from_anidb(aid: int) -> str:
     """Fetch anime metadata from AniDB API with proper throttling."""
     if not await check_daily_limit():
@@ -174,7 +1537,7 @@ async def fetch_from_anidb(aid: int) -> str:
             detail="Daily API limit reached. Try again tomorrow.",
         )
 
-    url = "http://api.anidb.net:9001/httpapi"
+    url = ANIDB_API_URL
     params = {
         "request": "anime",
         "client": ANIDB_CLIENT,
@@ -189,20 +1552,24 @@ async def fetch_from_anidb(aid: int) -> str:
         params["pass"] = ANIDB_PASSWORD
 
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(url, params=params)
-            response.raise_for_status()
-
-            # Check for AniDB error responses
-            if "banned" in response.text.lower():
-                await log_api_request(aid, success=False)
-                raise HTTPException(
-                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                    detail="AniDB API access temporarily banned",
-                )
+        if http_client is not None:
+            response = await http_client.get(url, params=params)
+        else:
+            # Outside the app lifespan (scripts, tests): one-off client
+            async with create_http_client() as client:
+                response = await client.get(url, params=params)
+        response.raise_for_status()
+
+        # Check for AniDB error responses
+        if "banned" in response.text.lower():
+            await log_api_request(aid, success=False)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="AniDB API access temporarily banned",
+            )
 
-            await log_api_request(aid, success=True)
-            return str(response.text)
+        await log_api_request(aid, success=True)
+        return str(response.text)
 
     except httpx.HTTPStatusError as e:
         await log_api_request(aid, success=False)
@@ -223,13 +1590,29 @@ async def fetch_from_anidb(aid: int) -> str:
         )
 
 
+def estimate_fetch_eta(position: int, now: Optional[datetime] = None) -> datetime:
+    """Estimate when the job at a 1-based queue position will have been fetched.
+
+    Each fetch before it takes THROTTLE_SECONDS; it also cannot start before a 429
+    back-off ends or before the daily budget has room for that many requests.
+    """
+    now = now or datetime.now()
+    eta = now + timedelta(seconds=position * THROTTLE_SECONDS)
+    slot = api_budget.slot_at(position, now)
+    if slot is not None and slot > eta:
+        eta = slot
+    if rate_limit_until is not None and rate_limit_until > eta:
+        eta = rate_limit_until
+    return eta
+
+
 async def anidb_worker() -> None:
     """Background worker that processes the update queue with throttling."""
     global rate_limit_until
     print("🚀 AniDB worker started")
 
     while True:
-        aid = 0
+        job: Optional[QueuedJob] = None
         try:
             # Honour any active 429 back-off before pulling from the queue
             if rate_limit_until is not None:
@@ -239,117 +1622,213 @@ async def anidb_worker() -> None:
                         f"⏸️ AniDB rate-limited — pausing worker for "
                         f"{delay / 3600:.1f}h (until {rate_limit_until.isoformat()})"
                     )
-                    await asyncio.sleep(delay)
+                    await update_queue.hold_lease(delay)
                 rate_limit_until = None
 
-            aid = await update_queue.get()
+            job = await update_queue.get()
+            # Renewed throughout, so no other process claims the job meanwhile
+            async with update_queue.keep_lease() as lease_lost:
+                aid = job.aid
 
-            if aid in pending_aids:
-                pending_aids.remove(aid)
-
-            print(f"⏳ Processing AID {aid}...")
-
-            # Fetch from AniDB
-            xml_text = await fetch_from_anidb(aid)
+                print(
+                    f"⏳ Processing AID {aid} ({PRIORITY_NAMES.get(job.priority, job.priority)})..."
+                )
 
-            # Save to file
-            xml_file = XML_DIR / f"{aid}.xml"
-            xml_file.write_text(xml_text, encoding="utf-8")
+                # Fetch from AniDB
+                with WORKER_STAGE_SECONDS.time("fetch"):
+                    xml_text = await fetch_from_anidb(aid)
 
-            # Index to database
-            await index_xml_to_db(aid, xml_text)
+                # The mandatory throttle starts with the response; validating, storing and
+                # indexing it happen inside that window instead of before it
+                next_request_at = asyncio.get_running_loop().time() + THROTTLE_SECONDS
 
-            print(f"✅ Cached AID {aid}")
+                # Never cache an <error> document over good data
+                record = await run_blocking(parse_anidb_response, aid, xml_text)
 
-            # Mandatory throttle
-            await asyncio.sleep(THROTTLE_SECONDS)
+                # Another process took the lease meanwhile and may have claimed the job
+                if lease_lost.is_set() or not await update_queue.renew_lease():
+                    WORKER_JOBS.inc("abandoned")
+                    print(f"⚠️ Lost the update queue lease; not storing AID {aid}")
+                    continue
 
-            update_queue.task_done()
+                if XML_STORE == "blob":
+                    # Index and store the compressed document in one transaction
+                    with WORKER_STAGE_SECONDS.time("index"):
+                        await index_xml_to_db(
+                            aid, xml_text, store_blob=True, record=record, fetched=True
+                        )
+                else:
+                    # Save to file
+                    # Atomically: readers never see a half-written document
+                    with WORKER_STAGE_SECONDS.time("write"):
+                        await run_blocking(atomic_write_text, XML_DIR / f"{aid}.xml", xml_text)
+
+                    # Index to database
+                    with WORKER_STAGE_SECONDS.time("index"):
+                        await index_xml_to_db(aid, xml_text, record=record, fetched=True)
+                response_cache.invalidate(aid)
+                await update_queue.complete(aid)
+                completion_waiters.notify(aid)
+                change_feed.notify()
+                WORKER_JOBS.inc("cached")
+
+                print(f"✅ Cached AID {aid}")
+
+                # Mandatory throttle (whatever is left of it)
+                await asyncio.sleep(max(0.0, next_request_at - asyncio.get_running_loop().time()))
         except asyncio.CancelledError:
-            # Worker is being shut down, don't call task_done
+            # Worker is being shut down; a claimed job is picked up again on restart
             break
         except Exception as e:
-            if isinstance(e, HTTPException) and e.status_code == status.HTTP_429_TOO_MANY_REQUESTS:
-                rate_limit_until = datetime.now() + timedelta(hours=24)
-                print(f"🚫 AniDB 429 — suspending requests until {rate_limit_until.isoformat()}")
-                if aid:
-                    pending_aids.add(aid)
-                    await update_queue.put(aid)
-            else:
+            try:
+                if (
+                    isinstance(e, HTTPException)
+                    and e.status_code == status.HTTP_429_TOO_MANY_REQUESTS
+                ):
+                    rate_limit_until = datetime.now() + timedelta(hours=24)
+                    print(
+                        f"🚫 AniDB 429 — suspending requests until {rate_limit_until.isoformat()}"
+                    )
+                    WORKER_JOBS.inc("rate_limited")
+                    if job is not None:
+                        await update_queue.release(job.aid)
+                    continue
+
+                aid = job.aid if job is not None else 0
                 print(f"❌ Worker error for AID {aid}: {e}")
-            update_queue.task_done()
+                if job is not None:
+                    if await update_queue.fail(job):
+                        WORKER_JOBS.inc("failed")
+                    else:
+                        WORKER_JOBS.inc("dropped")
+                        completion_waiters.notify(aid)
+                        print(f"🗑️ Dropping AID {aid} after {job.attempts} failed attempts")
+                # Failed requests still count against AniDB's throttle
+                await asyncio.sleep(THROTTLE_SECONDS)
+            except asyncio.CancelledError:
+                break
+            except Exception as queue_error:
+                print(f"❌ Update queue error: {queue_error}")
+                await asyncio.sleep(QUEUE_POLL_SECONDS)
+
+
+def list_xml_files(directory: Path, modified_after: Optional[float] = None) -> List[Path]:
+    """XML files of a directory, optionally only those modified after a time (blocking)."""
+    if not directory.exists():
+        return []
+    files = list(directory.glob("*.xml"))
+    if modified_after is not None:
+        files = [path for path in files if path.stat().st_mtime > modified_after]
+    return files
+
+
+# leader_tasks name of the startup seed sync, indexing and blob store move
+SEED_TASK = "seed_data"
+
+
+async def maintain_seed_data(snapshot_through: Optional[float]) -> None:
+    """Extract new and changed seed documents and index them.
+
+    Copies fetched from the API since are kept. Everything is indexed when the
+    database is empty, and XML files modified after a restored snapshot was built;
+    with the blob store, every loose file is indexed and moved into it.
+    """
+    try:
+        async with db_connection(write=True) as db:
+            seed_sync = await sync_seed_data(
+                db, XML_DIR, SEED_DATA_DIR, XML_STORE == "blob", run_blocking
+            )
+    except Exception as e:
+        print(f"❌ Error syncing seed data: {e}")
+        seed_sync = SeedSyncResult()
+
+    async with db_connection() as db:
+        cursor = await db.execute("SELECT COUNT(*) FROM anime")
+        result = await cursor.fetchone()
+        count = result[0] if result else 0
+
+    move = XML_STORE == "blob"
+    # Only seed documents the sync extracted, unless everything needs (re)indexing
+    xml_files = seed_sync.extracted
+    if count == 0 or move or snapshot_through is not None:
+        xml_files = await run_blocking(list_xml_files, XML_DIR, None if move else snapshot_through)
+    if not xml_files:
+        return
+    if move:
+        print(f"📦 Moving {len(xml_files)} XML files into the blob store...")
+    else:
+        print(f"📚 Indexing {len(xml_files)} seed files in background...")
+    # Parse in worker processes; write batches through the pool's writer
+    summary = await bulk_index(
+        xml_files, lambda: db_connection(write=True), move_to_blob_store=move
+    )
+    change_feed.notify()
+    print(
+        f"✅ Indexed {summary.indexed} files ({summary.failed} failed, "
+        f"{summary.skipped} newer from AniDB, {summary.files_per_sec:.0f} files/sec)"
+    )
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manage FastAPI lifespan context for startup/shutdown."""
-    global worker_task, update_queue
+    global worker_task, update_queue, db_pool, http_client, loose_xml_files
 
     # Startup
     print("🔧 Initializing AniDB Service...")
     XML_DIR.mkdir(parents=True, exist_ok=True)
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
 
-    # Create the queue in this event loop
-    update_queue = asyncio.Queue()
-
     # Set startup flag for healthcheck
     app.state.starting_up = True
+    # Until the startup move into the blob store has finished
+    loose_xml_files = True
 
-    # Extract seed data if data directory is empty
-    extract_seed_data(XML_DIR, SEED_DATA_DIR)
+    # A fresh volume starts from the prebuilt seed snapshot when one matches the
+    # seed zip; then only XML files modified after it was built need indexing
+    snapshot_through = await restore_seed_snapshot(DB_PATH, SEED_DATA_DIR, run_blocking)
 
-    # Initialize database
+    # Initialize database and open the long-lived connection pool
     await init_database()
+    db_pool = SQLitePool(DB_PATH)
+    await db_pool.open()
+
+    # Jobs persist in the database; this process only gets a handle on them
+    update_queue = UpdateQueue()
+
+    # One keep-alive client for every AniDB request of this process
+    http_client = create_http_client()
 
-    # Start background indexing if database is empty
+    # Sync, index and (with the blob store) move seed data in the background
     async def index_seed_data_background():
-        """Index seed data in background without blocking startup."""
+        """Maintain seed data in the background without blocking startup.
+
+        Every uvicorn process runs this, but only the update queue leader does the
+        work, so no two processes parse the same files or delete loose files while
+        another one reads them. The others keep probing loose files until the
+        leader has finished, and take over if it goes away first.
+        """
+        global loose_xml_files
         try:
-            import gc
-
-            import aiosqlite
-
-            async with aiosqlite.connect(DB_PATH) as db:
-                cursor = await db.execute("SELECT COUNT(*) FROM anime")
-                result = await cursor.fetchone()
-                count = result[0] if result else 0
-
-                if count == 0 and XML_DIR.exists():
-                    xml_files = list(XML_DIR.glob("*.xml"))
-                    if xml_files:
-                        print(f"📚 Indexing {len(xml_files)} seed files in background...")
-                        indexed_count = 0
-                        for xml_file in xml_files:
-                            try:
-                                # Handle both formats: "123.xml" and "AnimeDoc_123.xml"
-                                if "_" in xml_file.stem:
-                                    aid = xml_file.stem.split("_")[1]
-                                else:
-                                    aid = xml_file.stem
-
-                                xml_text = xml_file.read_text(encoding="utf-8")
-                                await index_xml_to_db(int(aid), xml_text)
-                                indexed_count += 1
-
-                                # Commit every 100 files to reduce memory pressure
-                                if indexed_count % 100 == 0:
-                                    await db.commit()
-                                    if len(xml_files) > 100:
-                                        print(
-                                            f"   Progress: {indexed_count}/{len(xml_files)} files indexed..."
-                                        )
-                                    gc.collect()
-                            except Exception as e:
-                                print(f"⚠️ Error indexing {xml_file.name}: {e}")
-                        await db.commit()
-                        print(f"✅ Indexed {indexed_count} files")
+            while not await update_queue.renew_lease():
+                if await update_queue.leader_finished(SEED_TASK):
+                    loose_xml_files = False
+                    return
+                await asyncio.sleep(QUEUE_POLL_SECONDS)
+
+            async with update_queue.keep_lease():
+                await maintain_seed_data(snapshot_through)
+                await update_queue.finish_task(SEED_TASK)
+            # Everything servable is in the blob store now (unparseable files stay)
+            loose_xml_files = False
         except Exception as e:
             print(f"❌ Background indexing failed: {e}")
 
-    # Start background tasks
-    asyncio.create_task(index_seed_data_background())
+    # Start background tasks; the seed indexing task is kept so it can be awaited
+    index_task = asyncio.create_task(index_seed_data_background())
+    app.state.seed_indexing = index_task
     worker_task = asyncio.create_task(anidb_worker())
+    planner_task = asyncio.create_task(refresh_planner_loop())
 
     # Service is ready immediately
     app.state.starting_up = False
@@ -359,12 +1838,59 @@ async def lifespan(app: FastAPI):
 
     # Shutdown
     print("🛑 Shutting down...")
-    if worker_task:
-        worker_task.cancel()
+    # Stop tasks that may hold pooled connections before the pool is closed
+    for task in (index_task, worker_task, planner_task):
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    await change_feed.close()
+    try:
+        await demand_tracker.flush()
+    except Exception as e:
+        print(f"⚠️ Could not save request counts: {e}")
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
+    if db_pool is not None:
+        await db_pool.close()
+        db_pool = None
+
+
+class RequestMetricsMiddleware:
+    """Time every HTTP request into HTTP_REQUEST_SECONDS, labelled by route template.
+
+    Plain ASGI rather than BaseHTTPMiddleware, so streamed responses pass through
+    untouched; the time recorded is until the handler returns.
+    """
+
+    def __init__(self, app: Callable[..., Awaitable[None]]):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message: Dict[str, Any]) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
         try:
-            await worker_task
-        except asyncio.CancelledError:
-            pass
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router records the matched route in the scope; templates keep the
+            # label set bounded (unmatched paths share one label)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started, scope["method"], route, str(status_code)
+            )
 
 
 app = FastAPI(
@@ -376,6 +1902,7 @@ app = FastAPI(
     redoc_url="/redoc" if ROOT_PATH else "/redoc",
     redirect_slashes=False,
 )
+app.add_middleware(RequestMetricsMiddleware)
 
 
 @app.get("/")
@@ -473,32 +2000,69 @@ async def root(request: Request):
     return HTMLResponse(content=html_content)
 
 
+# ORDER BY clauses of the /tags.json sort options
+TAG_SORTS = {
+    "count": "s.anime_count DESC, CAST(s.weight_sum AS REAL) / s.link_count DESC, s.tag_id",
+    "name": "d.name_folded, s.tag_id",
+    "weight": "CAST(s.weight_sum AS REAL) / s.link_count DESC, s.tag_id",
+}
+
+
+async def tag_stats_validators(db: aiosqlite.Connection, variant: str) -> Tuple[str, datetime]:
+    """ETag and Last-Modified of one tag_stats representation, without reading the rows.
+
+    Every change bumps a row's version and removals lower the row count, so the pair
+    identifies the table contents.
+    """
+    cursor = await db.execute("SELECT COUNT(*), COALESCE(MAX(version), 0) FROM tag_stats")
+    count, version = await cursor.fetchone()
+    digest = hashlib.blake2b(f"{count}:{version}:{variant}".encode("utf-8"), digest_size=8)
+    return f'"tags-{digest.hexdigest()}"', datetime.fromtimestamp(version / 1e9, timezone.utc)
+
+
+async def fetch_tag_stats(
+    db: aiosqlite.Connection, sort: str = "count", limit: int = -1, offset: int = 0
+) -> List[Tuple[int, str, int, float]]:
+    """Return (tag_id, name, anime_count, avg_weight) rows of tag_stats (limit -1: all)."""
+    cursor = await db.execute(
+        f"""
+        SELECT s.tag_id, d.name, s.anime_count, CAST(s.weight_sum AS REAL) / s.link_count
+        FROM tag_stats s
+        JOIN tag_dict d ON d.tag_id = s.tag_id
+        ORDER BY {TAG_SORTS[sort]}
+        LIMIT ? OFFSET ?
+        """,
+        (limit, offset),
+    )
+    return list(await cursor.fetchall())
+
+
 @app.get("/tags")
-async def list_tags():
-    """List all known tags with usage statistics."""
+async def list_tags(request: Request) -> Response:
+    """List all known tags with usage statistics (rendered from tag_stats)."""
     from fastapi.responses import HTMLResponse
 
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
-            cursor = await db.execute(
-                """
-                SELECT name, COUNT(DISTINCT aid) as anime_count, AVG(weight) as avg_weight
-                FROM tags
-                GROUP BY LOWER(name)
-                ORDER BY anime_count DESC, avg_weight DESC
-            """
-            )
-            tags = await cursor.fetchall()
-
-        tag_rows = ""
-        for name, count, avg_weight in tags:
-            tag_rows += f"""
+        async with db_connection() as db:
+            etag, last_modified = await tag_stats_validators(db, "html")
+            headers = {
+                "ETag": etag,
+                "Last-Modified": format_datetime(last_modified, usegmt=True),
+            }
+            if _not_modified(request, etag, last_modified):
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+            tags = await fetch_tag_stats(db)
+
+        tag_rows = "".join(
+            f"""
                 <tr>
-                    <td>{name}</td>
+                    <td>{html.escape(name)}</td>
                     <td>{count}</td>
                     <td>{int(avg_weight) if avg_weight else 0}</td>
                 </tr>
             """
+            for _, name, count, avg_weight in tags
+        )
 
         html_content = f"""
         <!DOCTYPE html>
@@ -555,50 +2119,141 @@ async def list_tags():
                 <strong>Total unique tags:</strong> {len(tags)}
             </div>
 
-            <table>
-                <thead>
-                    <tr>
-                        <th>Tag Name</th>
-                        <th>Anime Count</th>
-                        <th>Avg Weight</th>
-                    </tr>
-                </thead>
-                <tbody>
-                    {tag_rows}
-                </tbody>
-            </table>
-        </body>
-        </html>
-        """
-        return HTMLResponse(content=html_content)
+            <table>
+                <thead>
+                    <tr>
+                        <th>Tag Name</th>
+                        <th>Anime Count</th>
+                        <th>Avg Weight</th>
+                    </tr>
+                </thead>
+                <tbody>
+                    {tag_rows}
+                </tbody>
+            </table>
+        </body>
+        </html>
+        """
+        return HTMLResponse(content=html_content, headers=headers)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Database error: {str(e)}"
+        )
+
+
+@app.get("/tags.json")
+async def list_tags_json(
+    request: Request, sort: str = "count", limit: int = 100, offset: int = 0
+) -> Response:
+    """
+    List tags with usage statistics as JSON, one page at a time.
+
+    Served from the tag_stats table, which is kept up to date as anime are
+    indexed. Responses carry ETag/Last-Modified; a matching If-None-Match or
+    If-Modified-Since gets 304.
+
+    Example: /tags.json?sort=name&limit=50&offset=100
+
+    Args:
+        sort: ``count`` (anime count, default), ``name`` or ``weight`` (average weight)
+        limit: Maximum number of results to return (default: 100, max: 1000)
+        offset: Number of results to skip
+    """
+    if sort not in TAG_SORTS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid sort. Must be one of: {', '.join(TAG_SORTS)}.",
+        )
+    if limit <= 0 or limit > 1000:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Limit must be between 1 and 1000.",
+        )
+    if offset < 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Offset must not be negative.",
+        )
+
+    try:
+        async with db_connection() as db:
+            etag, last_modified = await tag_stats_validators(db, f"json:{sort}:{limit}:{offset}")
+            headers = {
+                "ETag": etag,
+                "Last-Modified": format_datetime(last_modified, usegmt=True),
+            }
+            if _not_modified(request, etag, last_modified):
+                return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+            cursor = await db.execute("SELECT COUNT(*) FROM tag_stats")
+            total = (await cursor.fetchone())[0]
+            tags = await fetch_tag_stats(db, sort, limit, offset)
     except Exception as e:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Database error: {str(e)}"
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Database error: {str(e)}",
         )
 
+    return JSONResponse(
+        content={
+            "total": total,
+            "sort": sort,
+            "limit": limit,
+            "offset": offset,
+            "results": [
+                {
+                    "tag_id": tag_id,
+                    "name": name,
+                    "anime_count": count,
+                    "avg_weight": round(avg_weight, 1),
+                }
+                for tag_id, name, count, avg_weight in tags
+            ],
+        },
+        headers=headers,
+    )
+
 
 @app.get("/stats")
 async def get_stats() -> Dict[str, Any]:
     """Public health check endpoint for monitoring."""
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with db_connection() as db:
             cursor = await db.execute("SELECT COUNT(*) FROM anime")
             row = await cursor.fetchone()
             total = row[0] if row else 0
 
-            cutoff = (datetime.now() - timedelta(hours=24)).isoformat()
-            cursor = await db.execute(
-                "SELECT COUNT(*) FROM api_logs WHERE timestamp > ?", (cutoff,)
-            )
-            row = await cursor.fetchone()
-            daily = row[0] if row else 0
+            if update_queue is None or not update_queue.is_leader:
+                # Another process does the fetching; its spend is in the rollup
+                await api_budget.load(db)
+
+            xml_store: Dict[str, Any] = {"backend": XML_STORE}
+            if XML_STORE == "blob":
+                cursor = await db.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0), COALESCE(SUM(size), 0) "
+                    "FROM xml_blobs"
+                )
+                row = await cursor.fetchone()
+                if row:
+                    xml_store.update(
+                        documents=row[0], stored_bytes=row[1], uncompressed_bytes=row[2]
+                    )
+
+        queue_depth = await update_queue.depth()
 
         return {
             "status": "online",
             "cached_anime": total,
-            "api_calls_last_24h": daily,
-            "queue_size": update_queue.qsize(),
+            "api_calls_last_24h": api_budget.used(),
+            "queue_size": sum(queue_depth.values()),
+            "queue_depth": queue_depth,
             "daily_limit": DAILY_LIMIT,
+            "api_budget": api_budget.stats(),
+            "refresh_planner": await refresh_planner.stats(),
+            "response_cache": response_cache.stats(),
+            "single_flight": single_flight.stats(),
+            "long_poll": completion_waiters.stats(),
+            "change_feed": change_feed.stats(),
+            "xml_store": xml_store,
             "rate_limit_until": rate_limit_until.isoformat() if rate_limit_until else None,
         }
     except Exception as e:
@@ -608,102 +2263,376 @@ async def get_stats() -> Dict[str, Any]:
         )
 
 
+@metrics.collector
+async def collect_service_gauges() -> None:
+    """Refresh the queue depth and AniDB budget gauges before a scrape."""
+    if update_queue is not None:
+        for name, count in (await update_queue.depth()).items():
+            QUEUE_DEPTH.set(count, name)
+    if update_queue is None or not update_queue.is_leader:
+        # Another process does the fetching; its spend is in the rollup
+        async with db_connection() as db:
+            await api_budget.load(db)
+    API_BUDGET_USED.set(api_budget.used())
+    API_BUDGET_LIMIT.set(api_budget.limit)
+
+
+@app.get("/metrics")
+async def get_metrics() -> Response:
+    """Prometheus metrics in the text exposition format."""
+    return Response(await metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+def change_entry(change: Change) -> Dict[str, Any]:
+    """JSON form of a change, as served by /changes and /events."""
+    return {
+        "cursor": change.cursor,
+        "aid": change.aid,
+        "changed_at": change.changed_at,
+        "content_hash": change.content_hash,
+    }
+
+
+@app.get("/changes")
+async def get_changes(since: int = 0, limit: int = CHANGES_PAGE_MAX) -> Dict[str, Any]:
+    """
+    Every cache write after a cursor, oldest first.
+
+    Start with ``since=0`` and pass the returned ``next_cursor`` on the next call.
+    ``truncated`` is true when changes after ``since`` have already been pruned
+    (older than CHANGES_RETENTION_DAYS): re-sync everything, then continue from
+    ``next_cursor``.
+
+    Example: /changes?since=1200&limit=500
+    """
+    if since < 0 or limit < 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="since must not be negative and limit must be positive.",
+        )
+    limit = min(limit, CHANGES_PAGE_MAX)
+    changes = await read_changes(since, limit)
+    async with db_connection() as db:
+        cursor = await db.execute("SELECT MIN(seq) FROM anime_changes")
+        oldest = (await cursor.fetchone())[0]
+    head = await change_feed.head()
+    # Cursors are never reused, so a gap before the oldest row means pruned changes
+    first_kept = oldest if oldest is not None else head + 1
+    return {
+        "changes": [change_entry(change) for change in changes],
+        "next_cursor": changes[-1].cursor if changes else since,
+        "has_more": len(changes) == limit,
+        "truncated": since + 1 < first_kept,
+    }
+
+
+@app.get("/events")
+async def get_events(request: Request, since: Optional[int] = None) -> StreamingResponse:
+    """
+    Server-sent event stream of cache writes as they happen.
+
+    Each ``change`` event carries the JSON of a /changes entry, with the cursor as
+    its event id. Reconnecting clients send ``Last-Event-ID`` (or ``since``) and
+    first receive the changes they missed. A comment is sent every
+    EVENTS_KEEPALIVE_SECONDS so proxies keep the connection open.
+
+    Example: curl -N /events
+    """
+    last_event_id = request.headers.get("last-event-id")
+    if since is None and last_event_id is not None:
+        try:
+            since = int(last_event_id)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid Last-Event-ID."
+            )
+    # Subscribe before replaying so nothing committed in between is missed
+    queue = await change_feed.subscribe()
+
+    def event(change: Change) -> bytes:
+        data = json.dumps(change_entry(change))
+        return f"id: {change.cursor}\nevent: change\ndata: {data}\n\n".encode("utf-8")
+
+    async def stream() -> AsyncIterator[bytes]:
+        sent = since
+        try:
+            yield f"retry: {int(EVENTS_POLL_SECONDS * 1000)}\n\n".encode("utf-8")
+            while sent is not None:
+                missed = await read_changes(sent, CHANGES_PAGE_MAX)
+                for change in missed:
+                    yield event(change)
+                    sent = change.cursor
+                if len(missed) < CHANGES_PAGE_MAX:
+                    break
+            while True:
+                try:
+                    change = await asyncio.wait_for(queue.get(), EVENTS_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                if change is None:
+                    break  # fell too far behind; the client reconnects with Last-Event-ID
+                if sent is not None and change.cursor <= sent:
+                    continue  # already sent while replaying
+                yield event(change)
+                sent = change.cursor
+        finally:
+            change_feed.unsubscribe(queue)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def backfill_record_json(aid: int) -> Optional[str]:
+    """Build and store the structured record of a row indexed before it existed."""
+    source = await run_blocking(_locate_xml_file, aid) if probe_xml_files() else None
+    if XML_STORE == "blob":
+        async with db_connection() as db:
+            source = await _locate_xml_blob(db, aid) or source
+    if source is None:
+        return None
+    content = await render_anime_xml(aid, source, mature=True)
+    record, _ = await run_blocking(_prepare_document, content, None, False)
+    record_json = record.record_json
+    async with db_connection(write=True) as db:
+        await db.execute("UPDATE anime SET record_json = ? WHERE aid = ?", (record_json, aid))
+        await db.commit()
+    return record_json
+
+
+class CachedAnime(NamedTuple):
+    """Outcome of the cache lookup shared by concurrent /anime/{aid} requests."""
+
+    source: Optional[XmlSource]  # None: not cached
+    row: Optional[tuple]  # (last_updated, is_mature, start_date, end_date) if indexed
+    stale: bool  # a refresh has been queued
+
+
+async def lookup_anime(aid: int) -> CachedAnime:
+    """Locate the cached document and anime row of an AID; queue a refresh if stale."""
+    source = await run_blocking(_locate_xml_file, aid) if probe_xml_files() else None
+    row = None
+    if source is not None or XML_STORE == "blob":
+        async with db_connection() as db:
+            if XML_STORE == "blob":
+                # Stored blobs win over any loose file not yet moved in
+                source = await _locate_xml_blob(db, aid) or source
+            if source is not None:
+                cursor = await db.execute(
+                    "SELECT last_updated, is_mature, start_date, end_date "
+                    "FROM anime WHERE aid = ?",
+                    (aid,),
+                )
+                row = await cursor.fetchone()
+    if source is None:
+        return CachedAnime(None, None, False)
+
+    stale = row is None or datetime.now() - datetime.fromisoformat(row[0]) >= effective_ttl(
+        row[2], row[3]
+    )
+    if stale:
+        await update_queue.put(aid, PRIORITY_REFRESH)
+    return CachedAnime(source, row, stale)
+
+
+# Must be registered before /anime/{aid}, which would otherwise match "1.json"
+@app.get("/anime/{aid}.json")
+async def get_anime_json(
+    request: Request, aid: int, fields: Optional[str] = None, mature: bool = False
+) -> Response:
+    """
+    Fetch the structured record of an anime as JSON, optionally only some sections.
+
+    The record is extracted when the document is indexed, so this never reads
+    the XML. Freshness, refresh queueing and conditional requests work as for
+    /anime/{aid}.
+
+    Example: /anime/1.json?fields=titles,tags,relations
+
+    Args:
+        aid: AniDB anime ID
+        fields: Comma-separated sections (default: all of RECORD_SECTIONS)
+        mature: Include mature/18+ tags and categories (default: False)
+    """
+    if aid <= 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid AID. Must be a positive integer.",
+        )
+    sections = list(RECORD_SECTIONS)
+    if fields:
+        sections = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+        unknown = [section for section in sections if section not in RECORD_SECTIONS]
+        if unknown or not sections:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid fields. Must be among: {', '.join(RECORD_SECTIONS)}.",
+            )
+
+    demand_tracker.record(aid)
+
+    try:
+        async with db_connection() as db:
+            cursor = await db.execute(
+                "SELECT last_updated, start_date, end_date, record_json FROM anime WHERE aid = ?",
+                (aid,),
+            )
+            row = await cursor.fetchone()
+        record_json = row[3] if row else None
+        if row and record_json is None:
+            record_json = await backfill_record_json(aid)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Database error: {str(e)}",
+        )
+
+    if record_json is None:
+        CACHE_LOOKUPS.inc("anime_json", "miss")
+        try:
+            await update_queue.put(aid, PRIORITY_INTERACTIVE)
+        except Exception as e:
+            print(f"⚠️ Could not queue AID {aid}: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Database error: {str(e)}",
+            )
+        raise HTTPException(
+            status_code=status.HTTP_202_ACCEPTED,
+            detail=f"AID {aid} queued for fetching. Check back in a few moments.",
+        )
+
+    age = datetime.now() - datetime.fromisoformat(row[0])
+    headers = {
+        "X-Cache": "HIT",
+        "X-Age-Days": str(age.days),
+        "X-Mature-Filter": "disabled" if mature else "enabled",
+    }
+    if age >= effective_ttl(row[1], row[2]):
+        await update_queue.put(aid, PRIORITY_REFRESH)
+        headers.update({"X-Cache": "STALE", "X-Status": "Refreshing"})
+    CACHE_LOOKUPS.inc("anime_json", headers["X-Cache"].lower())
+
+    # Stored timestamps are naive local time
+    last_modified = datetime.fromisoformat(row[0]).astimezone(timezone.utc)
+    headers["ETag"] = anime_etag(aid, row[0], mature, False, variant=f"json:{','.join(sections)}")
+    headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    if _not_modified(request, headers["ETag"], last_modified):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    record = json.loads(record_json)
+    if not mature:
+        record = filter_mature_record(record)
+    return JSONResponse(
+        content={"aid": aid, **{section: record.get(section) for section in sections}},
+        headers=headers,
+    )
+
+
+async def serve_cached_anime(
+    request: Request, aid: int, cached: CachedAnime, mature: bool, cache_header: str
+) -> Response:
+    """Serve a located document with its cache headers (``cache_header`` if fresh)."""
+    source = cast(XmlSource, cached.source)
+    row = cached.row
+    if not row:
+        # File exists but no DB entry - treated as stale
+        return await anime_xml_response(
+            request,
+            aid,
+            source,
+            mature,
+            True,  # not indexed yet, so always filter
+            {"X-Cache": "STALE", "X-Status": "Refreshing"},
+        )
+    age = datetime.now() - datetime.fromisoformat(row[0])
+    headers = {"X-Cache": cache_header, "X-Age-Days": str(age.days)}
+    if cached.stale:
+        # Cache exists but is stale - refresh queued, return stale content
+        headers = {"X-Cache": "STALE", "X-Status": "Refreshing", "X-Age-Days": str(age.days)}
+    # Mature filtering applied when requested
+    return await anime_xml_response(
+        request, aid, source, mature, bool(row[1]), headers, last_updated=row[0]
+    )
+
+
 @app.get("/anime/{aid}")
-async def get_anime(aid: int, mature: bool = False) -> Response:
+async def get_anime(request: Request, aid: int, mature: bool = False, wait: float = 0) -> Response:
     """
     Fetch anime metadata by AniDB ID.
 
     Returns cached XML if available and fresh, otherwise queues update.
+    With the blob store, clients sending ``Accept-Encoding: gzip`` receive the
+    stored compressed bytes unchanged whenever no mature filtering is needed.
+    Indexed titles carry ETag/Last-Modified; matching If-None-Match or
+    If-Modified-Since requests get 304 without the XML being read.
 
     Args:
         aid: AniDB anime ID
         mature: Include mature/18+ content (default: False)
+        wait: On a miss, hold the request up to this many seconds (at most
+            WAIT_MAX_SECONDS) for the document to be fetched instead of
+            answering 202 at once
     """
     if aid <= 0:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid AID. Must be a positive integer.",
         )
+    if wait < 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="wait must not be negative.",
+        )
 
-    # Check for both naming formats: {aid}.xml and AnimeDoc_{aid}.xml
-    xml_file = XML_DIR / f"{aid}.xml"
-    if not xml_file.exists():
-        xml_file = XML_DIR / f"AnimeDoc_{aid}.xml"
+    # Feeds the refresh planner
+    demand_tracker.record(aid)
 
-    # Check if cached and fresh
-    if xml_file.exists():
-        try:
-            async with aiosqlite.connect(DB_PATH) as db:
-                cursor = await db.execute("SELECT last_updated FROM anime WHERE aid = ?", (aid,))
-                row = await cursor.fetchone()
+    # Check if cached and fresh; a herd of requests for one AID shares the lookup
+    try:
+        cached = await single_flight.do(("lookup", aid), lambda: lookup_anime(aid))
+        if cached.source is not None:
+            CACHE_LOOKUPS.inc("anime", "stale" if cached.stale else "hit")
+            return await serve_cached_anime(request, aid, cached, mature, "HIT")
+    except Exception as e:
+        print(f"⚠️ Cache check error for AID {aid}: {e}")
 
-                if row:
-                    last_updated = datetime.fromisoformat(row[0])
-                    age = datetime.now() - last_updated
-
-                    if age < UPDATE_THRESHOLD:
-                        # Serve from cache
-                        content = xml_file.read_text(encoding="utf-8")
-
-                        # Filter mature content if requested
-                        if not mature:
-                            content = filter_mature_content(content)
-
-                        return Response(
-                            content=content,
-                            media_type="application/xml",
-                            headers={
-                                "X-Cache": "HIT",
-                                "X-Age-Days": str(age.days),
-                                "X-Mature-Filter": "disabled" if mature else "enabled",
-                            },
-                        )
-                    else:
-                        # Cache exists but is stale - queue for update and return stale content
-                        if aid not in pending_aids:
-                            pending_aids.add(aid)
-                            await update_queue.put(aid)
-
-                        content = xml_file.read_text(encoding="utf-8")
-                        if not mature:
-                            content = filter_mature_content(content)
-
-                        return Response(
-                            content=content,
-                            media_type="application/xml",
-                            headers={
-                                "X-Cache": "STALE",
-                                "X-Status": "Refreshing",
-                                "X-Mature-Filter": "disabled" if mature else "enabled",
-                                "X-Age-Days": str(age.days),
-                            },
-                        )
-                else:
-                    # File exists but no DB entry - treat as stale
-                    if aid not in pending_aids:
-                        pending_aids.add(aid)
-                        await update_queue.put(aid)
-
-                    content = xml_file.read_text(encoding="utf-8")
-                    if not mature:
-                        content = filter_mature_content(content)
-
-                    return Response(
-                        content=content,
-                        media_type="application/xml",
-                        headers={
-                            "X-Cache": "STALE",
-                            "X-Status": "Refreshing",
-                            "X-Mature-Filter": "disabled" if mature else "enabled",
-                        },
-                    )
-        except Exception as e:
-            print(f"⚠️ Cache check error for AID {aid}: {e}")
+    # Queue for update if not in cache; a client is waiting, so it jumps the refreshes
+    CACHE_LOOKUPS.inc("anime", "miss")
+    try:
+        await update_queue.put(aid, PRIORITY_INTERACTIVE)
+    except Exception as e:
+        print(f"⚠️ Could not queue AID {aid}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Database error: {str(e)}",
+        )
 
-    # Queue for update if not in cache
-    if aid not in pending_aids:
-        pending_aids.add(aid)
-        await update_queue.put(aid)
+    if wait > 0:
+        # Park on the worker's completion signal rather than having the client poll
+        if await completion_waiters.wait(aid, min(wait, WAIT_MAX_SECONDS)):
+            # Not coalesced: a shared lookup may have started before the worker committed
+            cached = await lookup_anime(aid)
+            if cached.source is not None:
+                return await serve_cached_anime(request, aid, cached, mature, "MISS")
+
+        position = (await update_queue.positions([aid])).get(aid)
+        detail: Dict[str, Any] = {
+            "detail": f"AID {aid} is not cached yet.",
+            "aid": aid,
+            "queue_position": position,
+        }
+        headers = {}
+        if position is not None:
+            now = datetime.now()
+            eta = estimate_fetch_eta(position, now)
+            detail["eta"] = eta.isoformat()
+            detail["eta_seconds"] = math.ceil((eta - now).total_seconds())
+            headers["Retry-After"] = str(max(1, detail["eta_seconds"]))
+        return JSONResponse(detail, status_code=status.HTTP_202_ACCEPTED, headers=headers)
 
     # No cache available
     raise HTTPException(
@@ -712,6 +2641,227 @@ async def get_anime(aid: int, mature: bool = False) -> Response:
     )
 
 
+class BatchRequest(BaseModel):
+    """Body of POST /anime/batch."""
+
+    aids: List[int]
+    mature: bool = False
+
+
+async def _batch_lookup(aids: List[int]) -> Dict[int, Tuple[XmlSource, Optional[tuple]]]:
+    """Locate the cached document and anime row of many AIDs with one query each."""
+    sources = await run_blocking(_locate_xml_files, aids) if probe_xml_files() else {}
+
+    placeholders = ",".join("?" * len(aids))
+    async with db_connection() as db:
+        if XML_STORE == "blob":
+            # Stored blobs win over any loose file not yet moved in
+            cursor = await db.execute(
+                f"SELECT aid, version, size FROM xml_blobs WHERE aid IN ({placeholders})", aids
+            )
+            for aid, version, size in await cursor.fetchall():
+                sources[aid] = XmlSource(None, (version, size))
+        cursor = await db.execute(
+            "SELECT aid, last_updated, is_mature, start_date, end_date "
+            f"FROM anime WHERE aid IN ({placeholders})",
+            aids,
+        )
+        rows = {row[0]: row[1:] for row in await cursor.fetchall()}
+
+    return {aid: (source, rows.get(aid)) for aid, source in sources.items()}
+
+
+@app.post("/anime/batch")
+async def get_anime_batch(batch: BatchRequest) -> StreamingResponse:
+    """
+    Fetch many AIDs in one request as NDJSON, one line per AID in request order.
+
+    Each line carries the AID and its ``status``:
+    - ``hit``: fresh document in ``xml``
+    - ``stale``: document in ``xml``, refresh queued
+    - ``queued``: not cached, queued for fetching
+    - ``invalid``: not a positive AID
+    - ``error``: the cached document could not be read
+
+    All misses and refreshes are queued in one transaction before streaming starts;
+    queued and stale lines report their ``queue_position`` and an estimated fetch
+    time (``eta``, ``eta_seconds``) from the queue and the remaining AniDB budget.
+    Documents are rendered one at a time while the response streams.
+
+    Args:
+        aids: AniDB anime IDs (at most BATCH_MAX_AIDS; duplicates are answered once)
+        mature: Include mature/18+ content (default: False)
+    """
+    aids = list(dict.fromkeys(batch.aids))
+    if len(aids) > BATCH_MAX_AIDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many AIDs: at most {BATCH_MAX_AIDS} per batch.",
+        )
+    valid = [aid for aid in aids if aid > 0]
+    for aid in valid:
+        demand_tracker.record(aid)
+
+    cached: Dict[int, Tuple[XmlSource, Optional[tuple]]] = {}
+    if valid:
+        try:
+            cached = await _batch_lookup(valid)
+        except Exception as e:
+            print(f"⚠️ Cache check error for batch of {len(valid)} AIDs: {e}")
+
+    fresh = set()
+    jobs = []
+    for aid in valid:
+        source, row = cached.get(aid, (None, None))
+        if source is None:
+            jobs.append((aid, PRIORITY_INTERACTIVE))
+        elif row and datetime.now() - datetime.fromisoformat(row[0]) < effective_ttl(
+            row[2], row[3]
+        ):
+            fresh.add(aid)
+        else:
+            jobs.append((aid, PRIORITY_REFRESH))
+    misses = sum(1 for _, priority in jobs if priority == PRIORITY_INTERACTIVE)
+    CACHE_LOOKUPS.inc("batch", "hit", amount=len(fresh))
+    CACHE_LOOKUPS.inc("batch", "stale", amount=len(jobs) - misses)
+    CACHE_LOOKUPS.inc("batch", "miss", amount=misses)
+
+    try:
+        await update_queue.put_many(jobs)
+        positions = await update_queue.positions([aid for aid, _ in jobs])
+    except Exception as e:
+        print(f"⚠️ Could not queue batch of {len(jobs)} AIDs: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Database error: {str(e)}",
+        )
+
+    now = datetime.now()
+
+    async def lines() -> AsyncIterator[bytes]:
+        for aid in aids:
+            entry: Dict[str, Any] = {"aid": aid}
+            source, row = cached.get(aid, (None, None))
+            if aid <= 0:
+                entry["status"] = "invalid"
+            elif source is None:
+                entry["status"] = "queued"
+            else:
+                entry["status"] = "hit" if aid in fresh else "stale"
+                if row:
+                    entry["last_updated"] = row[0]
+                    entry["age_days"] = (now - datetime.fromisoformat(row[0])).days
+                try:
+                    body = await render_anime_xml(aid, source, batch.mature)
+                    entry["xml"] = body.decode("utf-8")
+                except Exception as e:
+                    entry["status"] = "error"
+                    entry["detail"] = str(e)
+            if aid in positions:
+                eta = estimate_fetch_eta(positions[aid], now)
+                entry["queue_position"] = positions[aid]
+                entry["eta"] = eta.isoformat()
+                entry["eta_seconds"] = math.ceil((eta - now).total_seconds())
+            yield json.dumps(entry).encode("utf-8") + b"\n"
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"X-Mature-Filter": "disabled" if batch.mature else "enabled"},
+    )
+
+
+@app.get("/anime/{aid}/franchise")
+async def get_franchise(aid: int, mature: bool = False) -> Dict[str, Any]:
+    """
+    Get every title connected to an AID through AniDB relations.
+
+    Franchises are the connected components of the relations graph, maintained
+    as documents are indexed, so the whole franchise comes from one lookup.
+    Members are ordered by start date (unknown dates last); ``relations`` lists
+    the typed edges as AniDB reports them (e.g. ``Sequel``, ``Prequel``,
+    ``Side Story``). Members that are not indexed yet have ``cached: false``.
+
+    Example: /anime/1/franchise?mature=true
+
+    Args:
+        aid: AniDB anime ID
+        mature: Include titles flagged mature/18+ (default: False)
+    """
+    if aid <= 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid AID. Must be a positive integer.",
+        )
+
+    try:
+        async with db_connection() as db:
+            cursor = await db.execute(
+                "SELECT franchise_id FROM franchise_members WHERE aid = ?", (aid,)
+            )
+            row = await cursor.fetchone()
+            if row is None:
+                # Titles without relations are a franchise of one
+                cursor = await db.execute(
+                    "SELECT aid, start_date, end_date, 1, is_mature FROM anime WHERE aid = ?",
+                    (aid,),
+                )
+                members = await cursor.fetchall()
+                relations: List[Any] = []
+            else:
+                cursor = await db.execute(
+                    """
+                    SELECT m.aid, a.start_date, a.end_date, a.aid IS NOT NULL, a.is_mature
+                    FROM franchise_members m
+                    LEFT JOIN anime a ON a.aid = m.aid
+                    WHERE m.franchise_id = ?
+                    ORDER BY a.start_date IS NULL, a.start_date, m.aid
+                    """,
+                    (row[0],),
+                )
+                members = await cursor.fetchall()
+                cursor = await db.execute(
+                    """
+                    SELECT r.aid, r.related_aid, r.type
+                    FROM franchise_members m
+                    JOIN relations r ON r.aid = m.aid
+                    WHERE m.franchise_id = ?
+                    ORDER BY r.aid, r.related_aid
+                    """,
+                    (row[0],),
+                )
+                relations = await cursor.fetchall()
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Database error: {str(e)}",
+        )
+
+    if not members:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"AID {aid} is not indexed.",
+        )
+
+    hidden = set() if mature else {member[0] for member in members if member[4]}
+    return {
+        "aid": aid,
+        "franchise_id": row[0] if row else aid,
+        "mature": mature,
+        "count": len(members) - len(hidden),
+        "members": [
+            {"aid": member, "start_date": start, "end_date": end, "cached": bool(cached)}
+            for member, start, end, cached, _ in members
+            if member not in hidden
+        ],
+        "relations": [
+            {"aid": source, "related_aid": target, "type": rel_type}
+            for source, target, rel_type in relations
+            if source not in hidden and target not in hidden
+        ],
+    }
+
+
 @app.get("/search/tags")
 async def search_by_tags(tags: str, min_weight: int = 200, mature: bool = False) -> Dict[str, Any]:
     """
@@ -724,45 +2874,47 @@ async def search_by_tags(tags: str, min_weight: int = 200, mature: bool = False)
         min_weight: Minimum tag weight (default: 200)
         mature: Include mature/18+ content (default: False)
     """
-    tag_list = [t.strip().lower() for t in tags.split(",")]
+    tag_list = [fold_tag_name(t) for t in tags.split(",")]
 
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with db_connection() as db:
+            # Resolve names to tag ids once; the rest is a range scan on the
+            # (tag_id, weight DESC, aid) covering index
             placeholders = ",".join("?" * len(tag_list))
-
-            # Build query with optional mature content exclusion
-            if mature:
-                query = f"""
-                    SELECT aid, COUNT(*) as match_count
-                    FROM tags
-                    WHERE LOWER(name) IN ({placeholders})
-                    AND weight >= ?
-                    GROUP BY aid
-                    ORDER BY match_count DESC
-                    LIMIT 100
-                """
-                cursor = await db.execute(query, (*tag_list, min_weight))
-            else:
-                # Exclude anime with mature tags
-                mature_keywords = ["hentai", "pornography", "18 restricted", "adult"]
-                mature_placeholders = ",".join("?" * len(mature_keywords))
-                query = f"""
-                    SELECT aid, COUNT(*) as match_count
-                    FROM tags
-                    WHERE LOWER(name) IN ({placeholders})
-                    AND weight >= ?
-                    AND aid NOT IN (
-                        SELECT DISTINCT aid
-                        FROM tags
-                        WHERE LOWER(name) IN ({mature_placeholders})
-                    )
-                    GROUP BY aid
-                    ORDER BY match_count DESC
-                    LIMIT 100
-                """
-                cursor = await db.execute(query, (*tag_list, min_weight, *mature_keywords))
-
-            results = await cursor.fetchall()
+            cursor = await db.execute(
+                f"SELECT tag_id FROM tag_dict WHERE name_folded IN ({placeholders})", tag_list
+            )
+            tag_ids = [row[0] for row in await cursor.fetchall()]
+
+            results: List[Any] = []
+            if tag_ids:
+                id_placeholders = ",".join("?" * len(tag_ids))
+
+                # Build query with optional mature content exclusion
+                if mature:
+                    query = f"""
+                        SELECT aid, COUNT(*) as match_count
+                        FROM anime_tags
+                        WHERE tag_id IN ({id_placeholders})
+                        AND weight >= ?
+                        GROUP BY aid
+                        ORDER BY match_count DESC
+                        LIMIT 100
+                    """
+                else:
+                    # Exclude anime flagged as mature at index time
+                    query = f"""
+                        SELECT t.aid, COUNT(*) as match_count
+                        FROM anime_tags t
+                        JOIN anime a ON a.aid = t.aid AND a.is_mature = 0
+                        WHERE t.tag_id IN ({id_placeholders})
+                        AND t.weight >= ?
+                        GROUP BY t.aid
+                        ORDER BY match_count DESC
+                        LIMIT 100
+                    """
+                cursor = await db.execute(query, (*tag_ids, min_weight))
+                results = list(await cursor.fetchall())
 
         return {
             "query": tag_list,
@@ -777,6 +2929,99 @@ async def search_by_tags(tags: str, min_weight: int = 200, mature: bool = False)
         )
 
 
+def fts_title_query(q: str) -> Optional[str]:
+    """Turn free text into an FTS5 query: every word must match, the last as a prefix.
+
+    Words are quoted, so FTS5 operators and punctuation in titles are taken literally.
+    """
+    words = re.findall(r"\w+", q)
+    if not words:
+        return None
+    return " ".join(f'"{word}"' for word in words) + "*"
+
+
+@app.get("/search/titles")
+async def search_titles(
+    q: str, lang: Optional[str] = None, limit: int = 20, mature: bool = False
+) -> Dict[str, Any]:
+    """
+    Search anime by any of their titles (main, official, synonyms, short).
+
+    Matching ignores case and diacritics and treats the last word as a prefix.
+    Results are ranked by relevance (bm25), one per anime, each with the title
+    that matched best.
+
+    Example: /search/titles?q=cowboy%20beb&lang=en&limit=5
+
+    Args:
+        q: Words to search for
+        lang: Only match titles in this language (e.g. en, ja, x-jat)
+        limit: Maximum number of results to return (default: 20, max: 1000)
+        mature: Include mature/18+ content (default: False)
+    """
+    match = fts_title_query(q)
+    if match is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Query must contain at least one word.",
+        )
+    if limit <= 0 or limit > 1000:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Limit must be between 1 and 1000.",
+        )
+
+    conditions = ["anime_titles_fts MATCH ?"]
+    params: List[Any] = [match]
+    if lang:
+        conditions.append("t.lang = ?")
+        params.append(lang)
+    if not mature:
+        # Exclude anime flagged as mature at index time
+        conditions.append("a.is_mature = 0")
+
+    try:
+        async with db_connection() as db:
+            # The bare columns come from the best ranked title of each anime
+            cursor = await db.execute(
+                f"""
+                SELECT t.aid, t.title, t.lang, t.type, MIN(f.rank) AS score
+                FROM anime_titles_fts f
+                JOIN anime_titles t ON t.id = f.rowid
+                JOIN anime a ON a.aid = t.aid
+                WHERE {" AND ".join(conditions)}
+                GROUP BY t.aid
+                ORDER BY score, t.aid
+                LIMIT ?
+                """,
+                (*params, limit),
+            )
+            results = await cursor.fetchall()
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Search error: {str(e)}",
+        )
+
+    return {
+        "query": q,
+        "lang": lang,
+        "limit": limit,
+        "mature": mature,
+        "count": len(results),
+        "results": [
+            {
+                "aid": aid,
+                "title": title,
+                "lang": title_lang,
+                "type": kind,
+                "score": round(-score, 4),
+            }
+            for aid, title, title_lang, kind, score in results
+        ],
+    }
+
+
 @app.get("/tags/{tag_id}")
 async def get_anime_by_tag(tag_id: int, limit: int = 100, mature: bool = False) -> Dict[str, Any]:
     """
@@ -802,11 +3047,9 @@ async def get_anime_by_tag(tag_id: int, limit: int = 100, mature: bool = False)
         )
 
     try:
-        async with aiosqlite.connect(DB_PATH) as db:
+        async with db_connection() as db:
             # First get the tag name
-            cursor = await db.execute(
-                "SELECT DISTINCT name FROM tags WHERE tag_id = ? LIMIT 1", (tag_id,)
-            )
+            cursor = await db.execute("SELECT name FROM tag_dict WHERE tag_id = ?", (tag_id,))
             tag_row = await cursor.fetchone()
             tag_name = tag_row[0] if tag_row else None
 
@@ -814,29 +3057,22 @@ async def get_anime_by_tag(tag_id: int, limit: int = 100, mature: bool = False)
             if mature:
                 query = """
                     SELECT aid, weight
-                    FROM tags
+                    FROM anime_tags
                     WHERE tag_id = ?
                     ORDER BY weight DESC
                     LIMIT ?
                 """
-                cursor = await db.execute(query, (tag_id, limit))
             else:
-                # Exclude anime with mature tags
-                mature_keywords = ["hentai", "pornography", "18 restricted", "adult"]
-                mature_placeholders = ",".join("?" * len(mature_keywords))
-                query = f"""
-                    SELECT aid, weight
-                    FROM tags
-                    WHERE tag_id = ?
-                    AND aid NOT IN (
-                        SELECT DISTINCT aid
-                        FROM tags
-                        WHERE LOWER(name) IN ({mature_placeholders})
-                    )
-                    ORDER BY weight DESC
+                # Exclude anime flagged as mature at index time
+                query = """
+                    SELECT t.aid, t.weight
+                    FROM anime_tags t
+                    JOIN anime a ON a.aid = t.aid AND a.is_mature = 0
+                    WHERE t.tag_id = ?
+                    ORDER BY t.weight DESC
                     LIMIT ?
                 """
-                cursor = await db.execute(query, (tag_id, *mature_keywords, limit))
+            cursor = await db.execute(query, (tag_id, limit))
 
             results = await cursor.fetchall()
 
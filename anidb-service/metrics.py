@@ -0,0 +1,219 @@
+"""Minimal Prometheus metrics rendered in the text exposition format.
+
+Counters, gauges and fixed-bucket histograms keyed by label values. Every update
+happens on the event loop thread, so an update is a dict lookup plus an addition
+(and a bisect for histograms) with no locking - cheap enough to leave on in
+production. Gauges that mirror state held elsewhere (queue depth, budget) are
+refreshed by collectors just before a scrape renders the registry.
+"""
+
+import bisect
+import math
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, Iterator, List, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+Collector = Callable[[], Awaitable[None]]
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds; covers sub-millisecond cache hits up to slow AniDB fetches
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric(ABC):
+    """A metric family: one value (or histogram) per combination of label values."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+
+    def _key(self, values: Sequence[str]) -> LabelValues:
+        if len(values) != len(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {tuple(values)}")
+        return tuple(str(value) for value in values)
+
+    def _label_text(self, values: LabelValues, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+        pairs = list(zip(self.labels, values)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        """Sample lines of this family."""
+
+    def render(self) -> List[str]:
+        """HELP and TYPE lines followed by the samples."""
+        return [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} {self.kind}",
+            *self.samples(),
+        ]
+
+
+class Counter(Metric):
+    """Monotonically increasing total."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        """Add to the total of a label combination."""
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        """Current total of a label combination."""
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        """Sample lines of this family."""
+        return [
+            f"{self.name}{self._label_text(key)} {_format_value(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(Counter):
+    """Value that can go up and down."""
+
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str) -> None:
+        """Replace the value of a label combination."""
+        self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    """Observations counted into cumulative buckets, with their sum and count."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label combination: one count per bucket (non-cumulative), +Inf, sum
+        self._series: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        """Record one observation."""
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        """Observe the wall-clock duration of the block (also when it raises)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def count(self, *labels: str) -> int:
+        """Number of observations of a label combination."""
+        series = self._series.get(self._key(labels))
+        return int(sum(series[:-1])) if series else 0
+
+    def sum(self, *labels: str) -> float:
+        """Sum of the observations of a label combination."""
+        series = self._series.get(self._key(labels))
+        return series[-1] if series else 0.0
+
+    def samples(self) -> List[str]:
+        """Sample lines of this family."""
+        lines = []
+        for key, series in sorted(self._series.items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (math.inf,), series):
+                cumulative += count
+                le = (("le", _format_value(bound)),)
+                lines.append(
+                    f"{self.name}_bucket{self._label_text(key, le)} {_format_value(cumulative)}"
+                )
+            lines.append(f"{self.name}_sum{self._label_text(key)} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{self._label_text(key)} {_format_value(cumulative)}")
+        return lines
+
+
+class Registry:
+    """The metric families of a process and the collectors refreshing them."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Collector] = []
+
+    def _register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        """Create and register a counter."""
+        return self._register(Counter(name, help_text, labels))  # type: ignore[return-value]
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+        """Create and register a gauge."""
+        return self._register(Gauge(name, help_text, labels))  # type: ignore[return-value]
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        """Create and register a histogram."""
+        return self._register(  # type: ignore[return-value]
+            Histogram(name, help_text, labels, buckets)
+        )
+
+    def collector(self, fn: Collector) -> Collector:
+        """Register a coroutine function run before each scrape (usable as a decorator)."""
+        self._collectors.append(fn)
+        return fn
+
+    async def render(self) -> str:
+        """Run the collectors and return every family in the text format.
+
+        A failing collector leaves its gauges at their previous values.
+        """
+        for collect in self._collectors:
+            try:
+                await collect()
+            except Exception as e:
+                print(f"⚠️ Metrics collector {collect.__name__} failed: {e}")
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
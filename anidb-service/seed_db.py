@@ -1,13 +1,21 @@
 """Seed database utility for indexing AniDB XML files."""
 
+import argparse
 import asyncio
 import os
 import xml.etree.ElementTree as ET
-from datetime import datetime
 from pathlib import Path
 
 import aiosqlite
-from common import extract_seed_data
+from common import (
+    create_schema,
+    extract_anime_stream,
+    extract_seed_data,
+    find_seed_zip,
+    store_anime_record,
+    write_seed_snapshot,
+)
+from indexer import bulk_index, single_connection
 
 # Path to your XML files and the database
 XML_DIR = Path(os.getenv("XML_DIR", "./data"))
@@ -18,34 +26,7 @@ SEED_DATA_DIR = Path(os.getenv("SEED_DATA_DIR", "./seed_data"))
 async def index_xml(aid: str, xml_text: str, db: aiosqlite.Connection) -> None:
     """Index a single XML file into the database."""
     try:
-        root = ET.fromstring(xml_text)
-
-        # Clear old metadata
-        await db.execute("DELETE FROM tags WHERE aid = ?", (aid,))
-        await db.execute("DELETE FROM relations WHERE aid = ?", (aid,))
-
-        # Index Tags
-        tags = [
-            (aid, int(t.get("id") or "0"), t.findtext("name"), int(t.get("weight", 0)))
-            for t in root.findall(".//tag")
-            if t.findtext("name")
-        ]
-        if tags:
-            await db.executemany("INSERT INTO tags VALUES (?, ?, ?, ?)", tags)
-
-        # Index Relations
-        rels = [
-            (aid, int(r.get("id") or "0"), r.get("type") or "")
-            for r in root.findall(".//relatedanime")
-            if r.get("id") and r.get("type")
-        ]
-        if rels:
-            await db.executemany("INSERT INTO relations VALUES (?, ?, ?)", rels)
-
-        # Update Master Record
-        await db.execute(
-            "INSERT OR REPLACE INTO anime VALUES (?, ?)", (aid, datetime.now().isoformat())
-        )
+        await store_anime_record(db, int(aid), extract_anime_stream(xml_text))
 
         print(f"✅ Indexed AID: {aid}")
 
@@ -57,8 +38,12 @@ async def index_xml(aid: str, xml_text: str, db: aiosqlite.Connection) -> None:
         print(f"❌ Error indexing AID {aid}: {e}")
 
 
-async def main() -> None:
-    """Index all XML files in the data directory."""
+async def main(snapshot: bool = False) -> None:
+    """Index all XML files in the data directory.
+
+    With ``snapshot`` a compacted copy of the database is also written next to the
+    seed zip, for the service to restore on a fresh volume instead of indexing.
+    """
     # Extract seed data from zip if needed
     extract_seed_data(XML_DIR, SEED_DATA_DIR)
 
@@ -67,36 +52,8 @@ async def main() -> None:
         return
 
     async with aiosqlite.connect(DB_PATH) as db:
-        # Ensure tables exist
-        await db.executescript(
-            """
-            CREATE TABLE IF NOT EXISTS anime (
-                aid INTEGER PRIMARY KEY,
-                last_updated TEXT NOT NULL
-            );
-            CREATE TABLE IF NOT EXISTS tags (
-                aid INTEGER NOT NULL,
-                tag_id INTEGER,
-                name TEXT NOT NULL,
-                weight INTEGER DEFAULT 0
-            );
-            CREATE TABLE IF NOT EXISTS relations (
-                aid INTEGER NOT NULL,
-                related_aid INTEGER NOT NULL,
-                type TEXT NOT NULL
-            );
-            CREATE TABLE IF NOT EXISTS api_logs (
-                timestamp TEXT NOT NULL,
-                aid INTEGER,
-                success INTEGER DEFAULT 1
-            );
-            CREATE INDEX IF NOT EXISTS idx_tags_aid ON tags(aid);
-            CREATE INDEX IF NOT EXISTS idx_tags_tag_id ON tags(tag_id);
-            CREATE INDEX IF NOT EXISTS idx_relations_aid ON relations(aid);
-            CREATE INDEX IF NOT EXISTS idx_api_logs_timestamp ON api_logs(timestamp);
-        """
-        )
-        await db.commit()
+        # Ensure tables exist (and migrate databases from older releases)
+        await create_schema(db)
 
         # Find all XML files
         files = list(XML_DIR.glob("*.xml"))
@@ -107,34 +64,32 @@ async def main() -> None:
 
         print(f"📚 Found {len(files)} files to index...")
 
-        indexed = 0
-        failed = 0
-
-        for xml_file in files:
-            aid = xml_file.stem.split("_")[1]  # Get filename without extension
-
-            try:
-                xml_text = xml_file.read_text(encoding="utf-8")
-                await index_xml(aid, xml_text, db)
-                indexed += 1
-            except Exception as e:
-                print(f"❌ Failed to read {xml_file}: {e}")
-                failed += 1
-
-            # Commit periodically
-            if indexed % 100 == 0:
-                await db.commit()
-                print(f"💾 Progress: {indexed}/{len(files)} indexed...")
-
-        await db.commit()
+        # Nothing else uses the database yet, so an empty one is loaded without indexes
+        result = await bulk_index(files, single_connection(db), exclusive=True)
 
         print("\n" + "=" * 50)
         print("✅ Bulk indexing complete!")
-        print(f"   Indexed: {indexed}")
-        print(f"   Failed:  {failed}")
-        print(f"   Total:   {len(files)}")
+        print(f"   Indexed: {result.indexed}")
+        print(f"   Failed:  {result.failed}")
+        print(f"   Total:   {result.total}")
+        print(f"   Rate:    {result.files_per_sec:.0f} files/sec")
         print("=" * 50)
 
+        if snapshot:
+            zip_path = find_seed_zip(SEED_DATA_DIR)
+            if zip_path is None:
+                print(f"⚠️ No seed zip in {SEED_DATA_DIR}, not writing a snapshot")
+                return
+            indexed_through = max(path.stat().st_mtime for path in files)
+            path = await write_seed_snapshot(db, zip_path, indexed_through)
+            print(f"📸 Wrote seed snapshot {path} ({path.stat().st_size / 1e6:.1f} MB)")
+
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--snapshot",
+        action="store_true",
+        help="also write a database snapshot next to the seed zip for fast cold starts",
+    )
+    asyncio.run(main(snapshot=parser.parse_args().snapshot))
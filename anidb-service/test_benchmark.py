@@ -0,0 +1,198 @@
+"""Tests for the benchmark package (corpus, AniDB stub and load driver)."""
+
+import json
+import xml.etree.ElementTree as ET
+import zipfile
+from collections import Counter
+
+import pytest
+from benchmark.__main__ import main as benchmark_cli
+from benchmark.corpus import MATURE_TAG, Corpus, CorpusConfig
+from benchmark.driver import (
+    BenchmarkConfig,
+    compare,
+    format_comparison,
+    percentile,
+    plan_requests,
+    run_benchmark,
+    stale_aids,
+)
+from benchmark.stub_anidb import create_stub_app
+from common import extract_anime
+from fastapi.testclient import TestClient
+
+# ============================================================================
+# Corpus Tests
+# ============================================================================
+
+
+def test_corpus_is_reproducible_and_parseable():
+    """Test that documents depend only on (seed, aid) and parse like AniDB's."""
+    first = Corpus(CorpusConfig(size=50, seed=7))
+    again = Corpus(CorpusConfig(size=50, seed=7))
+    other = Corpus(CorpusConfig(size=50, seed=8))
+
+    assert first.document(10) == again.document(10)
+    assert first.document(10) != other.document(10)
+
+    record = extract_anime(ET.fromstring(first.document(10)))
+    assert record.tags
+    assert record.titles[0][1:] == ("x-jat", "main")
+
+
+def test_corpus_distributions():
+    """Test tag skew, symmetric franchise relations and the mature share."""
+    corpus = Corpus(CorpusConfig(size=400, mature_ratio=0.1))
+    tag_counts: Counter = Counter()
+    mature = 0
+    for aid, document in corpus.documents():
+        record = extract_anime(ET.fromstring(document))
+        tag_counts.update(tag_id for tag_id, _, _ in record.tags)
+        mature += any(name == MATURE_TAG for _, name, _ in record.tags)
+        for related, kind in record.relations:
+            assert related in corpus.aids
+            assert aid in dict(corpus.relations[related])
+
+    assert tag_counts[1] > tag_counts[50] > 0  # Zipf: the first tags dominate
+    assert 20 <= mature <= 60
+    linked = sum(1 for related in corpus.relations.values() if related)
+    assert 0.2 * 400 < linked < 0.9 * 400
+
+
+def test_corpus_write_files_and_zip(tmp_path):
+    """Test that the corpus is written as seed files or as a seed zip."""
+    corpus = Corpus(CorpusConfig(size=5, first_aid=100))
+
+    directory = corpus.write(tmp_path / "files")
+    zip_path = corpus.write(tmp_path / "zip", as_zip=True)
+
+    assert sorted(p.name for p in directory.glob("*.xml")) == [
+        f"AnimeDoc_{aid}.xml" for aid in range(100, 105)
+    ]
+    with zipfile.ZipFile(zip_path) as zf:
+        assert zf.read("AnimeDoc_102.xml").decode("utf-8") == corpus.document(102)
+
+
+# ============================================================================
+# Stub and Driver Tests
+# ============================================================================
+
+
+def test_stub_serves_corpus_and_errors():
+    """Test that the stub answers like the AniDB HTTP API."""
+    corpus = Corpus(CorpusConfig(size=3))
+    stub = create_stub_app(corpus)
+
+    with TestClient(stub) as client:
+        hit = client.get("/httpapi", params={"request": "anime", "aid": 2})
+        beyond = client.get("/httpapi", params={"request": "anime", "aid": 99})
+        error = client.get("/httpapi", params={"request": "anime"})
+
+    assert hit.text == corpus.document(2)
+    assert "<relatedanime>" not in beyond.text
+    assert error.text.startswith("<error")
+    assert stub.state.requests == 3
+
+
+def test_percentile_nearest_rank():
+    """Test the nearest-rank percentile."""
+    values = [float(v) for v in range(1, 101)]
+
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile(values, 100) == 100.0
+    assert percentile([3.0], 95) == 3.0
+    assert percentile([], 50) == 0.0
+
+
+def test_plan_requests_against_running_service():
+    """Test that the stale scenarios are left out when the database is not reachable."""
+    corpus = Corpus(CorpusConfig(size=20))
+
+    local = plan_requests(corpus, BenchmarkConfig(requests=5))
+    remote = plan_requests(corpus, BenchmarkConfig(requests=5, url="http://localhost:8000"))
+
+    assert "anime_stale" in local and "anime_stale" not in remote
+    stale = {f"/anime/{aid}" for aid in stale_aids(corpus, BenchmarkConfig())}
+    assert not stale & set(local["anime_hit"])
+    assert local["anime_miss"][0] == "/anime/21"
+
+
+@pytest.mark.asyncio
+async def test_run_benchmark_in_process(tmp_path):
+    """Test a small end-to-end run against the in-process service and the stub."""
+    import main
+
+    saved_db_path = main.DB_PATH
+    config = BenchmarkConfig(
+        corpus=CorpusConfig(size=30),
+        requests=12,
+        concurrency=4,
+        index_workers=1,
+        throttle_seconds=0,
+        stub_latency=0,
+        stale_ratio=0.2,
+    )
+
+    results = await run_benchmark(config, tmp_path)
+
+    assert main.DB_PATH == saved_db_path  # globals restored
+    assert results["seed_indexing"]["indexed"] == 30
+    scenarios = results["scenarios"]
+    assert scenarios["anime_hit"]["cache"] == {"HIT": 12}
+    assert scenarios["anime_hit_mature"]["status"] == {"200": 12}
+    assert scenarios["anime_stale"]["cache"].get("STALE", 0) > 0
+    assert scenarios["anime_miss"]["status"] == {"202": 12}
+    for name in ("search_tags", "tag_by_id", "tags_page"):
+        assert scenarios[name]["status"] == {"200": 12}
+        latency = scenarios[name]["latency_ms"]
+        assert 0 < latency["p50"] <= latency["p95"] <= latency["p99"] <= latency["max"]
+    json.dumps(results)  # the results document is plain JSON
+
+
+# ============================================================================
+# Comparison and CLI Tests
+# ============================================================================
+
+
+def result_doc(p50, rps, files_per_sec=100.0):
+    latency = {"p50": p50, "p95": p50 * 2, "p99": p50 * 3, "mean": p50, "max": p50 * 4}
+    return {
+        "seed_indexing": {"files_per_sec": files_per_sec},
+        "scenarios": {"anime_hit": {"throughput_rps": rps, "latency_ms": latency}},
+    }
+
+
+def test_compare_results():
+    """Test that two runs are paired per scenario and metric."""
+    old = result_doc(10.0, 500.0)
+    new = result_doc(5.0, 0.0, files_per_sec=150.0)
+    new["scenarios"]["new_only"] = new["scenarios"]["anime_hit"]
+
+    rows = compare(old, new)
+
+    by_metric = {(r["scenario"], r["metric"]): r["change_pct"] for r in rows}
+    assert by_metric[("seed_indexing", "files_per_sec")] == 50.0
+    assert by_metric[("anime_hit", "p50_ms")] == -50.0
+    assert by_metric[("anime_hit", "throughput_rps")] == -100.0
+    assert not any(r["scenario"] == "new_only" for r in rows)
+    assert compare(result_doc(0.0, 1.0), result_doc(1.0, 1.0))[1]["change_pct"] is None
+    assert "-50.0%" in format_comparison(rows)
+
+
+def test_cli_corpus_and_compare(tmp_path, capsys):
+    """Test the corpus and compare sub-commands."""
+    (tmp_path / "old.json").write_text(json.dumps(result_doc(10.0, 500.0)), encoding="utf-8")
+    (tmp_path / "new.json").write_text(json.dumps(result_doc(12.0, 400.0)), encoding="utf-8")
+
+    assert benchmark_cli(["corpus", str(tmp_path / "seed"), "--size", "4", "--zip"]) == 0
+    assert benchmark_cli(["compare", str(tmp_path / "old.json"), str(tmp_path / "new.json")]) == 0
+
+    assert (tmp_path / "seed" / "anidb-seed.zip").exists()
+    out = capsys.readouterr().out
+    assert "+20.0%" in out
+    assert "-20.0%" in out
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -1,10 +1,37 @@
 """Tests for common.py utilities."""
 
+import hashlib
+import os
+import time
+import xml.etree.ElementTree as ET
 import zipfile
+from datetime import datetime, timezone
 from unittest.mock import patch
 
+import aiosqlite
 import pytest
-from common import extract_seed_data
+from common import (
+    NotAnimeDocument,
+    atomic_write_text,
+    compress_xml,
+    create_schema,
+    decompress_xml,
+    extract_anime,
+    extract_anime_stream,
+    extract_seed_data,
+    find_mature_markers,
+    read_seed_snapshot,
+    rebuild_franchises,
+    rebuild_tag_stats,
+    record_api_document,
+    restore_seed_snapshot,
+    scan_mature_markers,
+    seed_fingerprint,
+    store_anime,
+    store_xml_blob,
+    sync_seed_data,
+    write_seed_snapshot,
+)
 
 
 @pytest.fixture
@@ -49,6 +76,53 @@ def test_extract_seed_data_success(sample_zip, capsys):
     assert "Extracted 3 XML files" in captured.out
 
 
+def test_extract_seed_data_keeps_member_times(test_dirs):
+    """Test that extracted files carry the modification time stored in the zip."""
+    xml_dir, seed_dir = test_dirs
+    with zipfile.ZipFile(seed_dir / "seed.zip", "w") as zf:
+        zf.writestr(zipfile.ZipInfo("AnimeDoc_1.xml", (2020, 5, 17, 12, 30, 0)), "<anime/>")
+
+    extract_seed_data(xml_dir, seed_dir)
+
+    extracted = datetime.fromtimestamp((xml_dir / "AnimeDoc_1.xml").stat().st_mtime, timezone.utc)
+    assert extracted == datetime(2020, 5, 17, 12, 30, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def local_time_zone(monkeypatch):
+    """Switch the process's local time zone (TZ) for the duration of a test."""
+
+    def switch(zone):
+        monkeypatch.setenv("TZ", zone)
+        time.tzset()
+
+    yield switch
+    monkeypatch.undo()
+    time.tzset()
+
+
+@pytest.mark.asyncio
+async def test_seed_member_times_do_not_depend_on_the_time_zone(test_dirs, local_time_zone):
+    """Test that a snapshot built in UTC still covers files extracted west of UTC."""
+    xml_dir, seed_dir = test_dirs
+    with zipfile.ZipFile(seed_dir / "seed.zip", "w") as zf:
+        zf.writestr(zipfile.ZipInfo("AnimeDoc_1.xml", (2020, 5, 17, 12, 30, 0)), "<anime/>")
+
+    # Snapshot host: extracts in UTC and stamps the newest file time
+    build_dir = xml_dir.with_name("build")
+    local_time_zone("UTC")
+    extract_seed_data(build_dir, seed_dir)
+    indexed_through = (build_dir / "AnimeDoc_1.xml").stat().st_mtime
+
+    # Restoring host, eight hours west: its extracted copy is not newer than the stamp
+    local_time_zone("PST8PDT")
+    async with aiosqlite.connect(":memory:") as db:
+        await create_schema(db)
+        result = await sync_seed_data(db, xml_dir, seed_dir)
+    assert [path.name for path in result.extracted] == ["AnimeDoc_1.xml"]
+    assert (xml_dir / "AnimeDoc_1.xml").stat().st_mtime == indexed_through
+
+
 def test_extract_seed_data_existing_files(sample_zip, capsys):
     """Test that extraction is skipped when files already exist."""
     xml_dir, seed_dir, zip_path = sample_zip
@@ -248,5 +322,704 @@ def test_extract_seed_data_rmdir_failure():
             assert (xml_dir / "AnimeDoc_1.xml").exists()
 
 
+def test_atomic_write_text(tmp_path):
+    """Test that files are replaced whole and a failed write leaves the old file alone."""
+    path = tmp_path / "1.xml"
+    path.write_text("<old/>", encoding="utf-8")
+
+    atomic_write_text(path, "<new/>")
+    assert path.read_text(encoding="utf-8") == "<new/>"
+
+    with patch("common.os.replace", side_effect=OSError("disk full")):
+        with pytest.raises(OSError):
+            atomic_write_text(path, "<newer/>")
+    assert path.read_text(encoding="utf-8") == "<new/>"
+    assert [p.name for p in tmp_path.iterdir()] == ["1.xml"]
+
+
+# ============================================================================
+# Schema and Mature Marker Tests
+# ============================================================================
+
+
+def test_find_mature_markers_tags_and_categories():
+    """Test that mature tags and categories are detected case-insensitively."""
+    root = ET.fromstring(
+        """<anime id="1">
+            <tags>
+                <tag><name>18 Restricted</name></tag>
+                <tag><name>action</name></tag>
+                <tag><name>adult cast</name></tag>
+            </tags>
+            <categories>
+                <category><name>Hentai</name></category>
+            </categories>
+        </anime>"""
+    )
+    assert find_mature_markers(root) == ["18 restricted", "hentai"]
+
+
+def test_find_mature_markers_clean_document():
+    """Test that a family-friendly document has no mature markers."""
+    root = ET.fromstring("<anime id='1'><tags><tag><name>comedy</name></tag></tags></anime>")
+    assert find_mature_markers(root) == []
+
+
+def test_extract_anime_air_dates():
+    """Test that start and end dates are extracted, missing ones as None."""
+    record = extract_anime(
+        ET.fromstring("<anime><startdate>2024-04-05</startdate><enddate> </enddate></anime>")
+    )
+    assert (record.start_date, record.end_date) == ("2024-04-05", None)
+
+
+def test_extract_anime_structured_record():
+    """Test the structured record built for /anime/{aid}.json."""
+    import json
+
+    record = extract_anime(
+        ET.fromstring(
+            """<anime id="1">
+                <type>TV Series</type>
+                <episodecount>26</episodecount>
+                <startdate>1998-04-03</startdate>
+                <titles>
+                    <title xml:lang="x-jat" type="main">Cowboy Bebop</title>
+                    <title xml:lang="ja" type="official">カウボーイビバップ</title>
+                </titles>
+                <relatedanime><anime id="5" type="Side Story">Tengoku no Tobira</anime></relatedanime>
+                <ratings><permanent count="40000">8.75</permanent><review>n/a</review></ratings>
+                <tags><tag id="36" parentid="2604" weight="400"><name>action</name></tag></tags>
+                <categories><category weight="200"><name>Space</name></category></categories>
+            </anime>"""
+        )
+    )
+    data = json.loads(record.record_json)
+
+    assert data["titles"][1] == {"title": "カウボーイビバップ", "type": "official", "lang": "ja"}
+    assert (data["type"], data["episodecount"], data["startdate"], data["enddate"]) == (
+        "TV Series",
+        26,
+        "1998-04-03",
+        None,
+    )
+    assert data["ratings"] == {"permanent": {"value": 8.75, "count": 40000}}
+    assert data["tags"] == [{"id": 36, "name": "action", "weight": 400, "parent_id": 2604}]
+    assert data["categories"] == [{"name": "Space", "weight": 200}]
+    assert data["relations"] == [{"aid": 5, "type": "Side Story", "title": "Tengoku no Tobira"}]
+
+
+STREAMED_DOC = """<?xml version="1.0" encoding="UTF-8"?>
+<anime id="7" restricted="true">
+    <type>OVA</type>
+    <startdate>2001-01-01</startdate>
+    <titles><title xml:lang="en" type="official">Streamed</title></titles>
+    <relatedanime><anime id="8" type="Sequel">Streamed 2</anime></relatedanime>
+    <tags>
+        <tag id="1" weight="600"><name>18 restricted</name><description>x</description></tag>
+        <tag id="2" parentid="1" weight="0"><name>nudity</name></tag>
+    </tags>
+    <categories><category weight="100"><name>Adult Cast</name></category></categories>
+    <episodes>
+        <episode id="1"><type>OVA</type><title xml:lang="en">Not a title</title></episode>
+    </episodes>
+    <characters>
+        <character id="3"><tags><tag id="9"><name>hentai</name></tag></tags></character>
+    </characters>
+</anime>"""
+
+
+def test_extract_anime_stream_matches_tree_extraction(tmp_path):
+    """Test that the streaming pass over text or a file extracts what the tree walk does."""
+    path = tmp_path / "7.xml"
+    path.write_text(STREAMED_DOC, encoding="utf-8")
+
+    expected = extract_anime(ET.fromstring(STREAMED_DOC))
+
+    streamed = extract_anime_stream(STREAMED_DOC)
+    digest = hashlib.sha256(STREAMED_DOC.encode("utf-8")).hexdigest()
+
+    assert streamed._replace(content_hash=None) == expected
+    assert streamed.content_hash == digest
+    assert extract_anime_stream(path) == streamed
+    assert expected.relations == [(8, "Sequel")]
+    assert expected.titles == [("Streamed", "en", "official")]
+    assert [tag_id for tag_id, _, _ in expected.tags] == [1, 2, 9]
+    assert expected.mature_markers == ["18 restricted", "adult cast", "hentai"]
+    assert scan_mature_markers(path) == expected.mature_markers
+    assert find_mature_markers(ET.fromstring(STREAMED_DOC)) == expected.mature_markers
+
+
+def test_extract_anime_stream_rejects_other_documents():
+    """Test that <error> documents and malformed XML are reported, not indexed."""
+    with pytest.raises(NotAnimeDocument) as excinfo:
+        extract_anime_stream("<error code='330'>Anime not found</error>")
+    assert (excinfo.value.tag, excinfo.value.message) == ("error", "Anime not found")
+
+    with pytest.raises(ET.ParseError):
+        extract_anime_stream("<anime><tags>")
+    with pytest.raises(ET.ParseError):
+        scan_mature_markers("")
+
+
+def test_extract_anime_stream_releases_finished_elements(tmp_path):
+    """Test that finished subtrees are dropped while streaming a file (bounded memory)."""
+    import tracemalloc
+
+    episodes = "".join(
+        f'<episode id="{n}"><epno>{n}</epno><title xml:lang="en">Episode {n}</title></episode>'
+        for n in range(20000)
+    )
+    path = tmp_path / "7.xml"
+    path.write_text(STREAMED_DOC.replace("<episodes>", "<episodes>" + episodes), encoding="utf-8")
+
+    def peak_memory(fn):
+        tracemalloc.start()
+        try:
+            result = fn(path)
+            return result, tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    record, streamed_peak = peak_memory(extract_anime_stream)
+    _, tree_peak = peak_memory(ET.parse)
+
+    assert record.titles == [("Streamed", "en", "official")]
+    assert streamed_peak < tree_peak / 10
+
+
+@pytest.mark.asyncio
+async def test_create_schema_backfills_is_mature(tmp_path):
+    """Test that databases from older releases gain a backfilled is_mature column."""
+    db_path = tmp_path / "old.db"
+    async with aiosqlite.connect(db_path) as db:
+        await db.executescript(
+            """
+            CREATE TABLE anime (aid INTEGER PRIMARY KEY, last_updated TEXT NOT NULL);
+            CREATE TABLE tags (aid INTEGER NOT NULL, tag_id INTEGER, name TEXT NOT NULL,
+                               weight INTEGER DEFAULT 0);
+            INSERT INTO anime VALUES (1, '2024-01-01'), (2, '2024-01-01');
+            INSERT INTO tags VALUES (1, 5, 'Hentai', 600), (1, 6, 'action', 300),
+                                    (2, 6, 'action', 300);
+            """
+        )
+        await db.commit()
+
+        await create_schema(db)
+        await create_schema(db)  # idempotent
+
+        cursor = await db.execute(
+            "SELECT aid, is_mature, mature_categories FROM anime ORDER BY aid"
+        )
+        assert await cursor.fetchall() == [(1, 1, "hentai"), (2, 0, None)]
+
+
+@pytest.mark.asyncio
+async def test_create_schema_builds_normalized_tags(tmp_path):
+    """Test that existing tags rows are migrated into tag_dict and anime_tags."""
+    db_path = tmp_path / "old.db"
+    async with aiosqlite.connect(db_path) as db:
+        await db.executescript(
+            """
+            CREATE TABLE anime (aid INTEGER PRIMARY KEY, last_updated TEXT NOT NULL);
+            CREATE TABLE tags (aid INTEGER NOT NULL, tag_id INTEGER, name TEXT NOT NULL,
+                               weight INTEGER DEFAULT 0);
+            INSERT INTO tags VALUES (1, 36, 'Action', 400), (2, 36, 'Action', 200),
+                                    (2, NULL, 'Custom', 100);
+            """
+        )
+        await db.commit()
+
+        await create_schema(db)
+
+        cursor = await db.execute("SELECT tag_id, name, name_folded FROM tag_dict ORDER BY tag_id")
+        assert await cursor.fetchall() == [(-1, "Custom", "custom"), (36, "Action", "action")]
+        cursor = await db.execute("SELECT tag_id, weight, aid FROM anime_tags ORDER BY aid, tag_id")
+        assert await cursor.fetchall() == [(36, 400, 1), (-1, 100, 2), (36, 200, 2)]
+
+
+@pytest.mark.asyncio
+async def test_create_schema_rolls_up_api_logs(tmp_path):
+    """Test that existing api_logs rows are rolled up per hour."""
+    async with aiosqlite.connect(tmp_path / "old.db") as db:
+        await db.executescript(
+            """
+            CREATE TABLE api_logs (timestamp TEXT NOT NULL, aid INTEGER, success INTEGER);
+            INSERT INTO api_logs VALUES ('2026-01-01T10:05:00', 1, 1),
+                                        ('2026-01-01T10:59:59.5', 2, 0),
+                                        ('2026-01-01T11:00:00', 3, 1);
+            """
+        )
+        await db.commit()
+
+        await create_schema(db)
+
+        cursor = await db.execute("SELECT * FROM api_usage_hourly ORDER BY hour")
+        assert await cursor.fetchall() == [
+            ("2026-01-01T10:00:00", 2, 1),
+            ("2026-01-01T11:00:00", 1, 0),
+        ]
+
+
+@pytest.mark.asyncio
+async def test_store_anime_maintains_tag_dictionary(tmp_path):
+    """Test that tag ids, synthetic ids and renames are kept in tag_dict."""
+    async with aiosqlite.connect(tmp_path / "test.db") as db:
+        await create_schema(db)
+
+        await store_anime(
+            db,
+            1,
+            ET.fromstring(
+                """<anime id="1"><tags>
+                    <tag id="36" weight="400"><name>Action</name></tag>
+                    <tag weight="300"><name>Comedy</name></tag>
+                </tags></anime>"""
+            ),
+        )
+        await store_anime(
+            db,
+            2,
+            ET.fromstring(
+                """<anime id="2"><tags>
+                    <tag id="36" weight="500"><name>Action Packed</name></tag>
+                    <tag weight="100"><name>COMEDY</name></tag>
+                </tags></anime>"""
+            ),
+        )
+
+        cursor = await db.execute("SELECT tag_id, name, name_folded FROM tag_dict ORDER BY tag_id")
+        assert await cursor.fetchall() == [
+            (-1, "Comedy", "comedy"),
+            (36, "Action Packed", "action packed"),
+        ]
+
+        # Re-indexing replaces the anime's links instead of duplicating them
+        await store_anime(db, 2, ET.fromstring("<anime id='2'/>"))
+        cursor = await db.execute("SELECT aid, tag_id FROM anime_tags ORDER BY aid, tag_id")
+        assert await cursor.fetchall() == [(1, -1), (1, 36)]
+
+
+@pytest.mark.asyncio
+async def test_store_xml_blob_roundtrip(tmp_path):
+    """Test that blobs are deterministic gzip and replaced on re-store."""
+    import gzip
+
+    data, size = compress_xml("<anime id='1'>Ünïcode</anime>")
+    assert data == compress_xml("<anime id='1'>Ünïcode</anime>")[0]
+    assert gzip.decompress(data) == "<anime id='1'>Ünïcode</anime>".encode("utf-8")
+    assert size == len("<anime id='1'>Ünïcode</anime>".encode("utf-8"))
+
+    async with aiosqlite.connect(tmp_path / "test.db") as db:
+        await create_schema(db)
+        await store_xml_blob(db, 1, data, size)
+        await store_xml_blob(db, 1, *compress_xml("<anime id='1'/>"))
+
+        cursor = await db.execute("SELECT data, size FROM xml_blobs WHERE aid = 1")
+        rows = await cursor.fetchall()
+    assert len(rows) == 1
+    assert decompress_xml(rows[0][0]) == "<anime id='1'/>"
+    assert rows[0][1] == len("<anime id='1'/>")
+
+
+@pytest.mark.asyncio
+async def test_store_anime_maintains_tag_stats(tmp_path):
+    """Test that tag_stats follows re-indexing and matches a full rebuild."""
+
+    def doc(*tags):
+        tag_xml = "".join(
+            f'<tag id="{tag_id}" weight="{weight}"><name>t{tag_id}</name></tag>'
+            for tag_id, weight in tags
+        )
+        return ET.fromstring(f"<anime><tags>{tag_xml}</tags></anime>")
+
+    async def stats(db):
+        cursor = await db.execute(
+            "SELECT tag_id, anime_count, link_count, weight_sum FROM tag_stats ORDER BY tag_id"
+        )
+        return await cursor.fetchall()
+
+    async with aiosqlite.connect(tmp_path / "test.db") as db:
+        await create_schema(db)
+        await store_anime(db, 1, doc((10, 200), (11, 600)))
+        await store_anime(db, 2, doc((10, 400)))
+        assert await stats(db) == [(10, 2, 2, 600), (11, 1, 1, 600)]
+
+        # Re-indexing replaces the old contribution; unused tags disappear
+        await store_anime(db, 1, doc((10, 300)))
+        assert await stats(db) == [(10, 2, 2, 700)]
+
+        incremental = await stats(db)
+        await rebuild_tag_stats(db)
+        assert await stats(db) == incremental
+
+
+@pytest.mark.asyncio
+async def test_create_schema_builds_tag_stats(tmp_path):
+    """Test that tag_stats is computed for an existing anime_tags table."""
+    async with aiosqlite.connect(tmp_path / "old.db") as db:
+        await db.executescript(
+            """
+            CREATE TABLE anime_tags (tag_id INTEGER, weight INTEGER, aid INTEGER);
+            INSERT INTO anime_tags VALUES (36, 400, 1), (36, 200, 2), (7, 100, 2);
+            """
+        )
+        await db.commit()
+
+        await create_schema(db)
+
+        cursor = await db.execute(
+            "SELECT tag_id, anime_count, weight_sum FROM tag_stats ORDER BY tag_id"
+        )
+        assert await cursor.fetchall() == [(7, 1, 100), (36, 2, 600)]
+
+
+@pytest.mark.asyncio
+async def test_store_anime_indexes_titles_for_full_text_search(tmp_path):
+    """Test that titles are searchable and replaced on re-index."""
+
+    async def search(db, match):
+        cursor = await db.execute(
+            "SELECT t.aid, t.title, t.lang, t.type FROM anime_titles_fts f "
+            "JOIN anime_titles t ON t.id = f.rowid WHERE anime_titles_fts MATCH ?",
+            (match,),
+        )
+        return await cursor.fetchall()
+
+    async with aiosqlite.connect(tmp_path / "test.db") as db:
+        await create_schema(db)
+        await store_anime(
+            db,
+            1,
+            ET.fromstring(
+                """<anime id="1"><titles>
+                    <title xml:lang="x-jat" type="main">Shingeki no Kyojin</title>
+                    <title xml:lang="en" type="official">Attack on Titan</title>
+                </titles></anime>"""
+            ),
+        )
+        assert await search(db, "titan") == [(1, "Attack on Titan", "en", "official")]
+        assert await search(db, "kyo*") == [(1, "Shingeki no Kyojin", "x-jat", "main")]
+
+        await store_anime(
+            db,
+            1,
+            ET.fromstring(
+                '<anime id="1"><titles><title type="main">Pokémon</title></titles></anime>'
+            ),
+        )
+        assert await search(db, "titan") == []
+        assert await search(db, "pokemon") == [(1, "Pokémon", None, "main")]
+
+
+@pytest.mark.asyncio
+async def test_create_schema_builds_titles_from_records(tmp_path):
+    """Test that anime_titles is filled from stored records of an older database."""
+    async with aiosqlite.connect(tmp_path / "old.db") as db:
+        await db.executescript(
+            """
+            CREATE TABLE anime (aid INTEGER PRIMARY KEY, last_updated TEXT NOT NULL,
+                                is_mature INTEGER NOT NULL DEFAULT 0, mature_categories TEXT,
+                                start_date TEXT, end_date TEXT, record_json TEXT);
+            INSERT INTO anime (aid, last_updated, record_json) VALUES
+                (1, '2026-01-01', '{"titles": [{"title": "Trigun", "type": "main", "lang": "x-jat"}]}'),
+                (2, '2026-01-01', NULL);
+            """
+        )
+        await db.commit()
+
+        await create_schema(db)
+
+        cursor = await db.execute(
+            "SELECT t.aid, t.lang FROM anime_titles_fts f "
+            "JOIN anime_titles t ON t.id = f.rowid WHERE anime_titles_fts MATCH 'trigun'"
+        )
+        assert await cursor.fetchall() == [(1, "x-jat")]
+
+
+def related_doc(aid, *related):
+    """Anime document with (related_aid, type) relations."""
+    rel_xml = "".join(f'<anime id="{r}" type="{t}"/>' for r, t in related)
+    return ET.fromstring(f'<anime id="{aid}"><relatedanime>{rel_xml}</relatedanime></anime>')
+
+
+async def franchise_map(db):
+    cursor = await db.execute("SELECT aid, franchise_id FROM franchise_members ORDER BY aid")
+    return dict(await cursor.fetchall())
+
+
+@pytest.mark.asyncio
+async def test_store_anime_maintains_franchises(tmp_path):
+    """Test that franchises merge and split as relations are re-indexed."""
+    async with aiosqlite.connect(tmp_path / "test.db") as db:
+        await create_schema(db)
+
+        await store_anime(db, 5, related_doc(5, (6, "Sequel")))
+        await store_anime(db, 9, related_doc(9, (10, "Sequel")))
+        assert await franchise_map(db) == {5: 5, 6: 5, 9: 9, 10: 9}
+
+        # 6 links both chains (reverse edge 5 -> 6 is found via related_aid)
+        await store_anime(db, 6, related_doc(6, (5, "Prequel"), (10, "Side Story")))
+        assert await franchise_map(db) == {5: 5, 6: 5, 9: 5, 10: 5}
+
+        # Dropping 6's relations leaves 5 -> 6, splitting off 9 -> 10
+        await store_anime(db, 6, related_doc(6))
+        assert await franchise_map(db) == {5: 5, 6: 5, 9: 9, 10: 9}
+
+        # The last relation gone, nothing is left of the franchise
+        await store_anime(db, 5, related_doc(5))
+        assert await franchise_map(db) == {9: 9, 10: 9}
+
+        incremental = await franchise_map(db)
+        await rebuild_franchises(db)
+        assert await franchise_map(db) == incremental
+
+
+@pytest.mark.asyncio
+async def test_create_schema_builds_franchises(tmp_path):
+    """Test that franchises are computed for an existing relations table."""
+    async with aiosqlite.connect(tmp_path / "old.db") as db:
+        await db.executescript(
+            """
+            CREATE TABLE relations (aid INTEGER, related_aid INTEGER, type TEXT);
+            INSERT INTO relations VALUES (3, 2, 'Prequel'), (2, 1, 'Prequel'),
+                                         (7, 8, 'Sequel'), (4, 4, 'Other');
+            """
+        )
+        await db.commit()
+
+        await create_schema(db)
+
+        assert await franchise_map(db) == {1: 1, 2: 1, 3: 1, 7: 7, 8: 7}
+
+
+# ============================================================================
+# Seed Snapshot Tests
+# ============================================================================
+
+
+@pytest.mark.asyncio
+async def test_seed_snapshot_round_trip(sample_zip, tmp_path):
+    """Test that a snapshot is stamped, compacted and restored onto a fresh volume only."""
+    _, seed_dir, zip_path = sample_zip
+    source = tmp_path / "source.db"
+    async with aiosqlite.connect(source) as db:
+        await create_schema(db)
+        await store_anime(db, 1, ET.fromstring("<anime id='1'/>"))
+        await db.execute(
+            "INSERT INTO update_jobs (aid, priority, enqueued_at) VALUES (5, 0, 'now')"
+        )
+        await db.execute(
+            "INSERT INTO anime_changes (aid, changed_at, content_hash) VALUES (1, 'now', 'x')"
+        )
+        await db.commit()
+        snapshot = await write_seed_snapshot(db, zip_path, 1234.5)
+
+    assert snapshot == seed_dir / "seed.db"
+    stamp = await read_seed_snapshot(snapshot)
+    assert stamp["seed"] == seed_fingerprint(zip_path)
+    assert stamp["indexed_through"] == "1234.5"
+
+    fresh = tmp_path / "volume" / "anidb.db"
+    assert await restore_seed_snapshot(fresh, seed_dir) == 1234.5
+    async with aiosqlite.connect(fresh) as db:
+        cursor = await db.execute("SELECT (SELECT COUNT(*) FROM anime), COUNT(*) FROM update_jobs")
+        assert await cursor.fetchone() == (1, 0)
+        # The change feed starts over: no cursor is taken yet
+        cursor = await db.execute("SELECT name FROM sqlite_sequence")
+        assert "anime_changes" not in {row[0] for row in await cursor.fetchall()}
+
+    # An existing database is never replaced
+    assert await restore_seed_snapshot(fresh, seed_dir) is None
+    assert await read_seed_snapshot(tmp_path / "missing.db") is None
+    assert await read_seed_snapshot(source) is None
+
+
+@pytest.mark.asyncio
+async def test_seed_snapshot_ignored_for_other_archive(sample_zip, tmp_path, capsys):
+    """Test that a snapshot of a different seed zip (or format) is not restored."""
+    _, seed_dir, zip_path = sample_zip
+    async with aiosqlite.connect(tmp_path / "source.db") as db:
+        await create_schema(db)
+        await write_seed_snapshot(db, zip_path, 0.0)
+    with zipfile.ZipFile(zip_path, "a") as zf:
+        zf.writestr("AnimeDoc_4.xml", "<anime id='4'/>")
+
+    assert await restore_seed_snapshot(tmp_path / "fresh.db", seed_dir) is None
+    assert not (tmp_path / "fresh.db").exists()
+    assert "Ignoring seed.db" in capsys.readouterr().out
+
+
+# ============================================================================
+# Seed Sync Tests
+# ============================================================================
+
+
+def write_seed_zip(path, members):
+    """Write a seed zip of {name: (content, (year, month, day))}."""
+    with zipfile.ZipFile(path, "w") as zf:
+        for name, (content, day) in members.items():
+            zf.writestr(zipfile.ZipInfo(name, (*day, 0, 0, 0)), content)
+
+
+@pytest.mark.asyncio
+async def test_sync_seed_data_extracts_only_new_and_changed_members(test_dirs, tmp_path):
+    """Test that a second sync is a no-op and an updated zip extracts only its changes."""
+    xml_dir, seed_dir = test_dirs
+    zip_path = seed_dir / "seed.zip"
+    write_seed_zip(
+        zip_path,
+        {
+            "AnimeDoc_1.xml": ("<anime id='1'/>", (2020, 1, 1)),
+            "nested/AnimeDoc_2.xml": ("<anime id='2'/>", (2020, 1, 1)),
+        },
+    )
+
+    async with aiosqlite.connect(tmp_path / "test.db") as db:
+        await create_schema(db)
+        first = await sync_seed_data(db, xml_dir, seed_dir)
+        again = await sync_seed_data(db, xml_dir, seed_dir)
+
+        write_seed_zip(
+            zip_path,
+            {
+                "AnimeDoc_1.xml": ("<anime id='1'/>", (2020, 1, 1)),
+                "nested/AnimeDoc_2.xml": ("<anime id='2'>new</anime>", (2021, 1, 1)),
+                "AnimeDoc_3.xml": ("<anime id='3'/>", (2021, 1, 1)),
+            },
+        )
+        update = await sync_seed_data(db, xml_dir, seed_dir)
+        cursor = await db.execute("SELECT aid, source, member FROM document_sources")
+        manifest = await cursor.fetchall()
+
+    assert sorted(p.name for p in first.extracted) == ["AnimeDoc_1.xml", "AnimeDoc_2.xml"]
+    assert (again.extracted, again.unchanged) == ([], 2)
+    assert sorted(p.name for p in update.extracted) == ["AnimeDoc_2.xml", "AnimeDoc_3.xml"]
+    assert update.unchanged == 1
+    assert (xml_dir / "AnimeDoc_2.xml").read_text() == "<anime id='2'>new</anime>"
+    assert sorted(manifest) == [
+        (1, "seed", "AnimeDoc_1.xml"),
+        (2, "seed", "AnimeDoc_2.xml"),
+        (3, "seed", "AnimeDoc_3.xml"),
+    ]
+    assert not list(xml_dir.glob(".*.tmp"))
+
+
+@pytest.mark.asyncio
+async def test_sync_seed_data_keeps_fresher_documents(test_dirs, tmp_path):
+    """Test that API-fetched and other newer documents are never replaced by older seeds."""
+    xml_dir, seed_dir = test_dirs
+    xml_dir.mkdir()
+    (xml_dir / "1.xml").write_text("<anime id='1'>api</anime>")  # recorded as fetched
+    (xml_dir / "2.xml").write_text("<anime id='2'>unknown</anime>")  # written just now
+    (xml_dir / "3.xml").write_text("<anime id='3'>old</anime>")
+    os.utime(xml_dir / "3.xml", (0, 0))
+    (xml_dir / "4.xml").write_text("<anime id='4'/>")  # extracted by an older release
+    write_seed_zip(
+        seed_dir / "seed.zip",
+        {
+            "1.xml": ("<anime id='1'>seed</anime>", (2020, 1, 1)),
+            "2.xml": ("<anime id='2'>seed</anime>", (2020, 1, 1)),
+            "AnimeDoc_3.xml": ("<anime id='3'>seed</anime>", (2020, 1, 1)),
+            "4.xml": ("<anime id='4'/>", (2020, 1, 1)),
+        },
+    )
+
+    async with aiosqlite.connect(tmp_path / "test.db") as db:
+        await create_schema(db)
+        await record_api_document(db, 1)
+        result = await sync_seed_data(db, xml_dir, seed_dir)
+        cursor = await db.execute("SELECT aid, source FROM document_sources ORDER BY aid")
+        sources = await cursor.fetchall()
+
+    assert [p.name for p in result.extracted] == ["AnimeDoc_3.xml"]
+    assert (result.unchanged, result.kept) == (1, 2)
+    assert (xml_dir / "1.xml").read_text() == "<anime id='1'>api</anime>"
+    assert (xml_dir / "2.xml").read_text() == "<anime id='2'>unknown</anime>"
+    assert not (xml_dir / "3.xml").exists()  # the older copy no longer shadows the seed
+    assert sources == [(1, "api"), (2, "api"), (3, "seed"), (4, "seed")]
+
+
+@pytest.mark.asyncio
+async def test_sync_seed_data_never_deletes_a_fresher_api_copy(test_dirs, tmp_path):
+    """Test that a seed copy is only adopted or extracted while no newer copy exists."""
+    xml_dir, seed_dir = test_dirs
+    xml_dir.mkdir()
+    members = {
+        "AnimeDoc_5.xml": ("<anime id='5'>seed</anime>", (2020, 1, 1)),
+        "AnimeDoc_6.xml": ("<anime id='6'>seed</anime>", (2020, 1, 1)),
+    }
+    write_seed_zip(seed_dir / "seed.zip", members)
+    # AID 5: an older release extracted the seed copy, then the API fetched a newer one
+    with zipfile.ZipFile(seed_dir / "seed.zip") as zf:
+        zf.extract("AnimeDoc_5.xml", xml_dir)
+    os.utime(xml_dir / "AnimeDoc_5.xml", (0, 0))
+    (xml_dir / "5.xml").write_text("<anime id='5'>api</anime>")
+
+    async with aiosqlite.connect(tmp_path / "test.db") as db:
+        await create_schema(db)
+        first = await sync_seed_data(db, xml_dir, seed_dir)
+        # AID 6: a newer copy appears without being recorded as fetched
+        (xml_dir / "6.xml").write_text("<anime id='6'>api</anime>")
+        members["AnimeDoc_5.xml"] = ("<anime id='5'>seed v2</anime>", (2021, 1, 1))
+        members["AnimeDoc_6.xml"] = ("<anime id='6'>seed v2</anime>", (2021, 1, 1))
+        write_seed_zip(seed_dir / "seed.zip", members)
+        second = await sync_seed_data(db, xml_dir, seed_dir)
+        cursor = await db.execute("SELECT aid, source FROM document_sources ORDER BY aid")
+        sources = await cursor.fetchall()
+        third = await sync_seed_data(db, xml_dir, seed_dir)
+
+    assert [p.name for p in first.extracted] == ["AnimeDoc_6.xml"]
+    assert first.kept == 1
+    assert (second.extracted, second.kept) == ([], 2)
+    assert (xml_dir / "5.xml").read_text() == "<anime id='5'>api</anime>"
+    assert (xml_dir / "6.xml").read_text() == "<anime id='6'>api</anime>"
+    assert sources == [(5, "api"), (6, "api")]
+    assert (third.extracted, third.kept) == ([], 2)  # decided from the manifest alone
+
+
+@pytest.mark.asyncio
+async def test_sync_seed_data_blob_store_and_no_zip(test_dirs, tmp_path):
+    """Test that seed copies moved into the blob store count as present."""
+    xml_dir, seed_dir = test_dirs
+    write_seed_zip(seed_dir / "seed.zip", {"AnimeDoc_1.xml": ("<anime id='1'/>", (2020, 1, 1))})
+
+    async with aiosqlite.connect(tmp_path / "test.db") as db:
+        await create_schema(db)
+        await sync_seed_data(db, xml_dir, seed_dir, blob_store=True)
+        (xml_dir / "AnimeDoc_1.xml").unlink()  # moved into the blob store
+
+        moved = await sync_seed_data(db, xml_dir, seed_dir, blob_store=True)
+        restored = await sync_seed_data(db, xml_dir, seed_dir)
+        nothing = await sync_seed_data(db, xml_dir, tmp_path / "no_seed")
+
+    assert (moved.extracted, moved.unchanged) == ([], 1)
+    assert [p.name for p in restored.extracted] == ["AnimeDoc_1.xml"]
+    assert (nothing.extracted, nothing.unchanged, nothing.kept) == ([], 0, 0)
+
+
+@pytest.mark.asyncio
+async def test_seed_zip_and_snapshot_work_runs_through_the_blocking_runner(sample_zip, tmp_path):
+    """Test that zip reads, extraction and the snapshot copy are handed to the runner."""
+    xml_dir, seed_dir, zip_path = sample_zip
+    offloaded = []
+
+    async def runner(fn, *args):
+        offloaded.append(fn.__name__)
+        return fn(*args)
+
+    async with aiosqlite.connect(tmp_path / "source.db") as db:
+        await create_schema(db)
+        result = await sync_seed_data(db, xml_dir, seed_dir, run_blocking=runner)
+        await write_seed_snapshot(db, zip_path, 1234.5)
+    assert len(result.extracted) == 3
+    assert offloaded == ["find_seed_zip", "_sync_seed_files"]
+
+    offloaded.clear()
+    restored = await restore_seed_snapshot(tmp_path / "volume" / "anidb.db", seed_dir, runner)
+    assert restored == 1234.5
+    assert offloaded == ["find_seed_zip", "seed_fingerprint", "_install_snapshot"]
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -0,0 +1,302 @@
+"""Tests for indexer.py bulk indexing pipeline."""
+
+from contextlib import asynccontextmanager
+from unittest.mock import patch
+
+import aiosqlite
+import pytest
+from common import create_schema, decompress_xml, extract_anime_stream, store_anime_record
+from indexer import (
+    DEFERRED_INDEXES,
+    bulk_index,
+    parse_anime_file,
+    select_latest_files,
+    single_connection,
+)
+
+
+def anime_xml(aid, tags=(("action", 400),), extra=""):
+    """Build a minimal AniDB document."""
+    tag_xml = "".join(
+        f'<tag id="{i + 1}" weight="{weight}"><name>{name}</name></tag>'
+        for i, (name, weight) in enumerate(tags)
+    )
+    return f'<anime id="{aid}"><tags>{tag_xml}</tags>{extra}</anime>'
+
+
+@pytest.fixture
+async def bulk_env(tmp_path):
+    """Provide an XML directory and an initialized database."""
+    xml_dir = tmp_path / "data"
+    xml_dir.mkdir()
+    db_path = tmp_path / "test.db"
+    async with aiosqlite.connect(db_path) as db:
+        await create_schema(db)
+    return xml_dir, db_path
+
+
+async def index_names(db):
+    cursor = await db.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+    return {row[0] for row in await cursor.fetchall()}
+
+
+# ============================================================================
+# Parsing Tests
+# ============================================================================
+
+
+def test_parse_anime_file_success(tmp_path):
+    """Test that a file is parsed into an AnimeRecord."""
+    path = tmp_path / "AnimeDoc_7.xml"
+    path.write_text(
+        anime_xml(7, extra='<relatedanime><anime id="8" type="Sequel"/></relatedanime>'),
+        encoding="utf-8",
+    )
+
+    name, aid, record, error, blob = parse_anime_file(str(path))
+
+    assert (name, aid, error, blob) == ("AnimeDoc_7.xml", 7, None, None)
+    assert record.tags == [(1, "action", 400)]
+    assert record.relations == [(8, "Sequel")]
+    assert record.mature_markers == []
+
+
+def test_parse_anime_file_compress(tmp_path):
+    """Test that compression returns the gzip document and its uncompressed size."""
+    path = tmp_path / "7.xml"
+    path.write_text(anime_xml(7), encoding="utf-8")
+
+    data, size = parse_anime_file(str(path), compress=True)[4]
+
+    assert decompress_xml(data) == anime_xml(7)
+    assert size == len(anime_xml(7))
+
+
+def test_parse_anime_file_errors(tmp_path):
+    """Test that parse errors and unknown file names are returned, not raised."""
+    broken = tmp_path / "3.xml"
+    broken.write_text("<broken><xml>", encoding="utf-8")
+    unknown = tmp_path / "notes.xml"
+    unknown.write_text(anime_xml(1), encoding="utf-8")
+
+    assert "XML Parse Error" in parse_anime_file(str(broken))[3]
+    assert parse_anime_file(str(unknown))[3] == "Unrecognised file name"
+
+
+def test_select_latest_files_prefers_api_copy(tmp_path):
+    """Test that {aid}.xml wins over AnimeDoc_{aid}.xml for the same AID."""
+    files = [tmp_path / "AnimeDoc_1.xml", tmp_path / "1.xml", tmp_path / "AnimeDoc_2.xml"]
+
+    selected = select_latest_files(files)
+
+    assert sorted(p.name for p in selected) == ["1.xml", "AnimeDoc_2.xml"]
+
+
+# ============================================================================
+# bulk_index Tests
+# ============================================================================
+
+
+@pytest.mark.asyncio
+async def test_bulk_index_fresh_database_with_workers(bulk_env, capsys):
+    """Test a parallel load into an empty database rebuilds deferred indexes."""
+    xml_dir, db_path = bulk_env
+    for aid in range(1, 41):
+        (xml_dir / f"AnimeDoc_{aid}.xml").write_text(anime_xml(aid), encoding="utf-8")
+    (xml_dir / "AnimeDoc_41.xml").write_text("<broken>", encoding="utf-8")
+    (xml_dir / "AnimeDoc_42.xml").write_text(
+        anime_xml(42, tags=(("18 restricted", 600),)), encoding="utf-8"
+    )
+
+    async with aiosqlite.connect(db_path) as db:
+        result = await bulk_index(
+            sorted(xml_dir.glob("*.xml")),
+            single_connection(db),
+            workers=2,
+            batch_size=10,
+            progress_every=10,
+            exclusive=True,
+        )
+
+        assert (result.indexed, result.failed, result.total) == (41, 1, 42)
+        assert result.files_per_sec > 0
+
+        cursor = await db.execute("SELECT COUNT(*), SUM(is_mature) FROM anime")
+        assert await cursor.fetchone() == (41, 1)
+        cursor = await db.execute("SELECT COUNT(*) FROM anime_tags")
+        assert (await cursor.fetchone())[0] == 41
+        cursor = await db.execute("SELECT anime_count, weight_sum FROM tag_stats WHERE tag_id = 1")
+        assert await cursor.fetchone() == (41, 40 * 400 + 600)
+        assert set(DEFERRED_INDEXES) <= await index_names(db)
+
+    out = capsys.readouterr().out
+    assert "Progress:" in out
+    assert "files/sec" in out
+    assert "Failed to index AnimeDoc_41.xml" in out
+
+
+@pytest.mark.asyncio
+async def test_bulk_index_replaces_existing_rows(bulk_env):
+    """Test that re-indexing into a populated database replaces rather than duplicates."""
+    xml_dir, db_path = bulk_env
+    (xml_dir / "1.xml").write_text(anime_xml(1, tags=(("action", 400),)), encoding="utf-8")
+
+    async with aiosqlite.connect(db_path) as db:
+        await bulk_index([xml_dir / "1.xml"], single_connection(db), workers=1)
+
+        (xml_dir / "1.xml").write_text(
+            anime_xml(1, tags=(("drama", 300), ("comedy", 200))), encoding="utf-8"
+        )
+        result = await bulk_index([xml_dir / "1.xml"], single_connection(db), workers=1)
+
+        assert result.indexed == 1
+        cursor = await db.execute("SELECT name FROM tags WHERE aid = 1 ORDER BY name")
+        assert [row[0] for row in await cursor.fetchall()] == ["comedy", "drama"]
+        cursor = await db.execute("SELECT COUNT(*) FROM anime_tags WHERE aid = 1")
+        assert (await cursor.fetchone())[0] == 2
+
+
+@pytest.mark.asyncio
+async def test_bulk_index_alongside_other_writers_keeps_newer_records(bulk_env):
+    """Test that a load next to the API worker keeps its indexes and newer records."""
+    xml_dir, db_path = bulk_env
+    for aid in (1, 2, 3):
+        (xml_dir / f"AnimeDoc_{aid}.xml").write_text(
+            anime_xml(aid, extra=f"<titles><title>Seed {aid}</title></titles>"), encoding="utf-8"
+        )
+    entries = 0
+
+    async with aiosqlite.connect(db_path) as db:
+        seen_indexes = []
+
+        @asynccontextmanager
+        async def writer():
+            nonlocal entries
+            entries += 1
+            seen_indexes.append(await index_names(db))
+            if entries == 2:
+                # The worker indexes AID 2 from the API before the load writes it
+                record = extract_anime_stream(
+                    anime_xml(2, extra="<titles><title>API 2</title></titles>")
+                )
+                await store_anime_record(db, 2, record)
+                await db.commit()
+            yield db
+
+        result = await bulk_index(sorted(xml_dir.glob("*.xml")), writer, workers=1)
+
+        assert (result.indexed, result.skipped) == (2, 1)
+        assert all(set(DEFERRED_INDEXES) <= names for names in seen_indexes)
+        for table in ("tags", "anime_tags", "relations", "anime_titles", "anime"):
+            cursor = await db.execute(f"SELECT COUNT(*) FROM {table} WHERE aid = 2")
+            assert (await cursor.fetchone())[0] <= 1, table
+        cursor = await db.execute("SELECT aid, title FROM anime_titles ORDER BY aid")
+        assert await cursor.fetchall() == [(1, "Seed 1"), (2, "API 2"), (3, "Seed 3")]
+
+
+@pytest.mark.asyncio
+async def test_bulk_index_move_to_blob_store(bulk_env):
+    """Test that documents are stored compressed and their loose files removed."""
+    xml_dir, db_path = bulk_env
+    for aid in range(1, 6):
+        (xml_dir / f"AnimeDoc_{aid}.xml").write_text(anime_xml(aid), encoding="utf-8")
+    (xml_dir / "3.xml").write_text(anime_xml(3, tags=(("drama", 300),)), encoding="utf-8")
+    (xml_dir / "AnimeDoc_6.xml").write_text("<broken>", encoding="utf-8")
+
+    async with aiosqlite.connect(db_path) as db:
+        result = await bulk_index(
+            sorted(xml_dir.glob("*.xml")),
+            single_connection(db),
+            workers=2,
+            batch_size=2,
+            move_to_blob_store=True,
+        )
+
+        assert (result.indexed, result.failed) == (5, 1)
+        cursor = await db.execute("SELECT aid, data FROM xml_blobs ORDER BY aid")
+        blobs = {aid: decompress_xml(data) for aid, data in await cursor.fetchall()}
+
+    assert sorted(blobs) == [1, 2, 3, 4, 5]
+    assert "drama" in blobs[3]  # the API copy won over the seed copy
+    # Only the unparseable file is left behind
+    assert [p.name for p in xml_dir.glob("*.xml")] == ["AnimeDoc_6.xml"]
+
+
+@pytest.mark.asyncio
+async def test_bulk_index_builds_franchises(bulk_env):
+    """Test that franchise membership is computed once the load completes."""
+    xml_dir, db_path = bulk_env
+    for aid, related in ((1, 2), (2, 3), (7, 8)):
+        (xml_dir / f"{aid}.xml").write_text(
+            anime_xml(
+                aid, extra=f'<relatedanime><anime id="{related}" type="Sequel"/></relatedanime>'
+            ),
+            encoding="utf-8",
+        )
+
+    async with aiosqlite.connect(db_path) as db:
+        await bulk_index(sorted(xml_dir.glob("*.xml")), single_connection(db), workers=1)
+
+        cursor = await db.execute("SELECT aid, franchise_id FROM franchise_members ORDER BY aid")
+        assert await cursor.fetchall() == [(1, 1), (2, 1), (3, 1), (7, 7), (8, 7)]
+
+
+@pytest.mark.asyncio
+async def test_bulk_index_into_populated_database_updates_only_touched_rows(bulk_env):
+    """Test that a small load next to live data keeps derived tables up without rebuilds."""
+    xml_dir, db_path = bulk_env
+    for aid, related in ((1, 2), (2, 3), (7, 8)):
+        (xml_dir / f"{aid}.xml").write_text(
+            anime_xml(
+                aid, extra=f'<relatedanime><anime id="{related}" type="Sequel"/></relatedanime>'
+            ),
+            encoding="utf-8",
+        )
+
+    async with aiosqlite.connect(db_path) as db:
+        await bulk_index(sorted(xml_dir.glob("*.xml")), single_connection(db), workers=1)
+
+        # A newly synced document: AID 8 links franchise 7 to franchise 1
+        (xml_dir / "8.xml").write_text(
+            anime_xml(
+                8,
+                tags=(("action", 400), ("drama", 300)),
+                extra='<relatedanime><anime id="3" type="Prequel"/></relatedanime>',
+            ),
+            encoding="utf-8",
+        )
+        with (
+            patch("indexer.rebuild_franchises") as franchises,
+            patch("indexer.rebuild_tag_stats") as tag_stats,
+        ):
+            result = await bulk_index([xml_dir / "8.xml"], single_connection(db), workers=1)
+
+        assert result.indexed == 1
+        # Only the synced document is a change; the initial load is the feed's baseline
+        cursor = await db.execute("SELECT aid FROM anime_changes")
+        assert await cursor.fetchall() == [(8,)]
+        franchises.assert_not_called()
+        tag_stats.assert_not_called()
+        cursor = await db.execute("SELECT aid, franchise_id FROM franchise_members ORDER BY aid")
+        assert await cursor.fetchall() == [(1, 1), (2, 1), (3, 1), (7, 1), (8, 1)]
+        cursor = await db.execute(
+            "SELECT tag_dict.name, anime_count FROM tag_stats "
+            "JOIN tag_dict USING (tag_id) ORDER BY tag_dict.name"
+        )
+        assert await cursor.fetchall() == [("action", 4), ("drama", 1)]
+
+
+@pytest.mark.asyncio
+async def test_bulk_index_no_files(bulk_env):
+    """Test that an empty file list is a no-op."""
+    xml_dir, db_path = bulk_env
+
+    async with aiosqlite.connect(db_path) as db:
+        result = await bulk_index([], single_connection(db))
+
+    assert (result.indexed, result.failed, result.total) == (0, 0, 0)
+    assert result.files_per_sec == 0.0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,92 @@
+"""Tests for the Prometheus metrics primitives in metrics.py."""
+
+import pytest
+from metrics import Counter, Histogram, Metric, Registry
+
+
+def test_counter_and_gauge_samples():
+    """Test that values are kept per label combination and rendered sorted."""
+    registry = Registry()
+    lookups = registry.counter("lookups_total", "Lookups.", ("result",))
+    depth = registry.gauge("depth", "Queue depth.")
+
+    lookups.inc("miss")
+    lookups.inc("hit", amount=2)
+    lookups.inc("hit")
+    depth.set(1.5)
+
+    assert lookups.value("hit") == 3
+    assert lookups.value("stale") == 0
+    assert lookups.samples() == ['lookups_total{result="hit"} 3', 'lookups_total{result="miss"} 1']
+    assert depth.samples() == ["depth 1.5"]
+
+
+def test_label_values_are_checked_and_escaped():
+    """Test that the label count must match and values are escaped."""
+    counter = Counter("requests_total", "Requests.", ("route",))
+
+    with pytest.raises(ValueError):
+        counter.inc()
+    counter.inc('/a"b\\c\n')
+
+    assert counter.samples() == ['requests_total{route="/a\\"b\\\\c\\n"} 1']
+
+
+def test_metric_subclasses_must_render_samples():
+    """Test that a family without samples() fails when created, not when scraped."""
+
+    class Incomplete(Metric):
+        kind = "gauge"
+
+    with pytest.raises(TypeError):
+        Incomplete("broken", "Missing samples().")
+
+
+def test_histogram_buckets_are_cumulative():
+    """Test bucket placement (upper bounds inclusive), sum and count."""
+    histogram = Histogram("latency_seconds", "Latency.", ("stage",), buckets=(0.1, 1))
+
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value, "fetch")
+    with histogram.time("index"):
+        pass
+
+    assert histogram.count("fetch") == 4
+    assert histogram.sum("fetch") == pytest.approx(3.65)
+    assert histogram.count("index") == 1
+    assert histogram.count("write") == 0
+    assert histogram.sum("write") == 0.0
+    lines = [line for line in histogram.samples() if 'stage="fetch"' in line]
+    assert lines == [
+        'latency_seconds_bucket{stage="fetch",le="0.1"} 2',
+        'latency_seconds_bucket{stage="fetch",le="1"} 3',
+        'latency_seconds_bucket{stage="fetch",le="+Inf"} 4',
+        'latency_seconds_sum{stage="fetch"} 3.65',
+        'latency_seconds_count{stage="fetch"} 4',
+    ]
+
+
+@pytest.mark.asyncio
+async def test_registry_render_runs_collectors(capsys):
+    """Test that collectors refresh gauges before rendering and failures are contained."""
+    registry = Registry()
+    depth = registry.gauge("queue_depth", "Queue depth.")
+
+    @registry.collector
+    async def collect_depth():
+        depth.set(7)
+
+    @registry.collector
+    async def broken():
+        raise RuntimeError("database is locked")
+
+    text = await registry.render()
+
+    assert text == "# HELP queue_depth Queue depth.\n# TYPE queue_depth gauge\nqueue_depth 7\n"
+    assert "Metrics collector broken failed: database is locked" in capsys.readouterr().out
+    with pytest.raises(ValueError):
+        registry.counter("queue_depth", "Duplicate.")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -5,6 +5,7 @@ from unittest.mock import patch
 
 import aiosqlite
 import pytest
+from common import create_schema, read_seed_snapshot
 from seed_db import index_xml, main
 
 
@@ -20,32 +21,8 @@ async def test_seed_db_env(tmp_path):
 
     # Initialize database
     async with aiosqlite.connect(db_path) as db:
-        # Mirror the production schema used by seed_db.main and main.init_database
-        await db.executescript(
-            """
-            CREATE TABLE IF NOT EXISTS anime (
-                aid INTEGER PRIMARY KEY,
-                last_updated TEXT NOT NULL
-            );
-            CREATE TABLE IF NOT EXISTS tags (
-                aid INTEGER NOT NULL,
-                tag_id INTEGER,
-                name TEXT NOT NULL,
-                weight INTEGER DEFAULT 0
-            );
-            CREATE TABLE IF NOT EXISTS relations (
-                aid INTEGER NOT NULL,
-                related_aid INTEGER NOT NULL,
-                type TEXT NOT NULL
-            );
-            CREATE TABLE IF NOT EXISTS api_logs (
-                timestamp TEXT NOT NULL,
-                aid INTEGER,
-                success INTEGER DEFAULT 1
-            );
-        """
-        )
-        await db.commit()
+        # Same schema used by seed_db.main and main.init_database
+        await create_schema(db)
 
     yield xml_dir, db_path, seed_dir
 
@@ -109,6 +86,23 @@ async def test_index_xml_success(test_seed_db_env, sample_xml):
         assert result[0] >= 0  # May be 0 or 2 depending on XML structure
 
 
+@pytest.mark.asyncio
+async def test_index_xml_flags_mature(test_seed_db_env):
+    """Test that seed indexing materializes the is_mature flag."""
+    xml_dir, db_path, seed_dir = test_seed_db_env
+
+    mature_xml = """<anime id="5"><tags>
+        <tag weight="600"><name>18 restricted</name></tag>
+    </tags></anime>"""
+
+    async with aiosqlite.connect(db_path) as db:
+        await index_xml("5", mature_xml, db)
+        await db.commit()
+
+        cursor = await db.execute("SELECT is_mature, mature_categories FROM anime WHERE aid = 5")
+        assert await cursor.fetchone() == (1, "18 restricted")
+
+
 @pytest.mark.asyncio
 async def test_index_xml_parse_error(test_seed_db_env, capsys):
     """Test handling of XML parse errors."""
@@ -407,5 +401,29 @@ async def test_main_creates_indexes(test_seed_db_env):
         assert result is not None
 
 
+@pytest.mark.asyncio
+async def test_main_writes_seed_snapshot(test_seed_db_env, sample_xml, capsys):
+    """Test that --snapshot writes a stamped database next to the seed zip."""
+    xml_dir, db_path, seed_dir = test_seed_db_env
+    (xml_dir / "AnimeDoc_1.xml").write_text(sample_xml, encoding="utf-8")
+
+    with patch("seed_db.XML_DIR", xml_dir):
+        with patch("seed_db.DB_PATH", db_path):
+            with patch("seed_db.SEED_DATA_DIR", seed_dir):
+                await main(snapshot=True)
+                assert "No seed zip" in capsys.readouterr().out
+
+                with zipfile.ZipFile(seed_dir / "anidb.zip", "w") as zf:
+                    zf.write(xml_dir / "AnimeDoc_1.xml", "AnimeDoc_1.xml")
+                await main(snapshot=True)
+
+    assert "Wrote seed snapshot" in capsys.readouterr().out
+    stamp = await read_seed_snapshot(seed_dir / "anidb.db")
+    assert float(stamp["indexed_through"]) == (xml_dir / "AnimeDoc_1.xml").stat().st_mtime
+    async with aiosqlite.connect(seed_dir / "anidb.db") as db:
+        cursor = await db.execute("SELECT COUNT(*) FROM anime")
+        assert (await cursor.fetchone())[0] == 1
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])